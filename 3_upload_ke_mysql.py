@@ -35,6 +35,7 @@ def setup_database():
     # Drop tabel lama biar bersih
     cursor.execute("DROP TABLE IF EXISTS master_aset")
     cursor.execute("DROP TABLE IF EXISTS riwayat_log")
+    cursor.execute("DROP TABLE IF EXISTS jurnal_aset")
     
     print("🔨 Membuat Struktur Tabel Baru...")
     
@@ -64,7 +65,23 @@ def setup_database():
         no_registrasi VARCHAR(100),
         no_reg_system VARCHAR(100),
         keterangan TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_log_created (created_at, id),
+        INDEX idx_log_aset (no_reg_system, created_at, id),
+        FULLTEXT INDEX ft_log_aset (nama_mesin, no_registrasi, no_reg_system) WITH PARSER ngram
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE jurnal_aset (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        log_id INT NOT NULL,
+        aset_id INT NOT NULL,
+        jenis_aksi VARCHAR(50),
+        before_image JSON NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uk_jurnal_log (log_id),
+        KEY idx_jurnal_aset (aset_id, id)
     )
     """)
     
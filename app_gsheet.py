@@ -1,14 +1,19 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import profil_startup
+profil = profil_startup.mulai()  # PROFIL_STARTUP=1 -> waktu import & per bagian di sidebar
 import os
 import io
+import re
 import time
 import json
+import random
+import sqlite3
+import threading
+import zlib
+import hashlib
+from collections import Counter, deque
 from datetime import date, timedelta, datetime
 from dotenv import load_dotenv
-import matplotlib.pyplot as plt
 
 # --- 1. KONFIGURASI HALAMAN ---
 st.set_page_config(
@@ -27,10 +32,222 @@ if not os.path.exists("credentials.json"):
     if "gcp_service_account" in st.secrets:
         with open("credentials.json", "w") as f:
             json.dump(dict(st.secrets["gcp_service_account"]), f)
+profil.tanda("Konfigurasi")
+
+# ==========================================
+# 🔐 SISTEM LOGIN
+# ==========================================
+if 'status_login' not in st.session_state:
+    st.session_state['status_login'] = False
+
+def proses_login():
+    user_env = os.getenv("ADMIN_USER", "admin")
+    pass_env = os.getenv("ADMIN_PASS", "admin")
+    
+    if st.session_state['input_user'] == user_env and st.session_state['input_pass'] == pass_env:
+        st.session_state['status_login'] = True
+    else:
+        st.error("❌ Username atau Password salah!")
+
+def proses_logout():
+    st.session_state['status_login'] = False
+    st.rerun()
+
+if not st.session_state['status_login']:
+    st.markdown("## 🔒 Login Sistem Aset (Cloud)")
+    st.info("Silakan login untuk mengakses data perusahaan.")
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.text_input("Username", key="input_user")
+        st.text_input("Password", type="password", key="input_pass")
+        st.button("Masuk", on_click=proses_login)
+    profil.tanda("Form login")
+    profil.laporan()
+    st.stop()
+
+# Modul berat baru dimuat setelah login (form login tidak membutuhkannya)
+import pandas as pd
+import numpy as np
+import gspread
+import requests
+from oauth2client.service_account import ServiceAccountCredentials
+profil.tanda("Import pandas & gspread")
 
 # ==========================================
 # 🔐 KONEKSI GOOGLE SHEETS
 # ==========================================
+KUOTA_PER_MENIT = int(os.getenv("KUOTA_PER_MENIT", "60"))  # Batas request Sheets API per menit per user
+RETRY_MAKS = 5            # Percobaan ulang untuk 429 / 5xx / gangguan jaringan (tulis: hanya 429)
+BACKOFF_DASAR = 1         # Detik, dikali 2 setiap percobaan
+BACKOFF_MAKS = 32
+METODE_BACA = {"get_values", "get_all_values", "get_all_records", "get", "batch_get",
+               "values_batch_get", "get_lastUpdateTime", "col_values", "row_values",
+               "worksheet", "worksheets", "find"}
+
+def _error_sementara(e, baca=True):
+    # 429 (kuota habis), 5xx, atau koneksi putus -> layak dicoba ulang.
+    # Tulis hanya 429: request ditolak sebelum diproses. 5xx/timeout bisa saja sudah diterapkan -> pemanggil yang memutuskan.
+    if isinstance(e, gspread.exceptions.APIError):
+        kode = getattr(e, "code", None)
+        return kode == 429 or (baca and isinstance(kode, int) and kode >= 500)
+    return baca and isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+class KlienSheet:
+    """Pembungkus Spreadsheet gspread yang sadar kuota.
+
+    - Token bucket: maksimal KUOTA_PER_MENIT request per menit (request berikutnya menunggu, bukan gagal).
+    - Baca: 429 / 5xx / gangguan jaringan dicoba ulang dengan exponential backoff + jitter.
+      Tulis: hanya 429; kegagalan ambigu (5xx, timeout) dilempar ke pemanggil.
+    - Baca yang identik dan sedang berjalan digabung (satu request, hasil dibagi).
+    - Handle worksheet di-cache, sehingga sh.worksheet() tidak memanggil API setiap rerun.
+    - Statistik request per endpoint dan per menit.
+    """
+
+    def __init__(self, sh, kuota_per_menit):
+        self._sh = sh
+        self.kapasitas = kuota_per_menit
+        self._laju = kuota_per_menit / 60.0
+        self._token = float(kuota_per_menit)
+        self._isi_terakhir = time.monotonic()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._ws = {}
+        self._stat = {}                  # endpoint -> Counter(panggilan, digabung, retry, error, detik)
+        self._waktu_request = deque()    # timestamp request 60 detik terakhir
+        self._per_menit = Counter()      # menit epoch (int) -> jumlah request; diubah ke waktu saat ditampilkan
+        self.total_tunggu = 0.0
+
+    # --- RATE LIMIT ---
+    def _ambil_token(self):
+        while True:
+            with self._lock:
+                sekarang = time.monotonic()
+                self._token = min(self.kapasitas, self._token + (sekarang - self._isi_terakhir) * self._laju)
+                self._isi_terakhir = sekarang
+                if self._token >= 1:
+                    self._token -= 1
+                    return
+                tunggu = (1 - self._token) / self._laju
+                self.total_tunggu += tunggu
+            time.sleep(tunggu)
+
+    def _catat(self, endpoint, **jumlah):
+        with self._lock:
+            stat = self._stat.setdefault(endpoint, Counter())
+            stat.update(jumlah)
+            if jumlah.get("panggilan"):
+                sekarang = time.time()
+                self._waktu_request.append(sekarang)
+                self._per_menit[int(sekarang // 60)] += 1
+                if len(self._per_menit) > 60:
+                    del self._per_menit[min(self._per_menit)]
+
+    # --- EKSEKUSI ---
+    def _jalankan(self, endpoint, fungsi, args, kwargs):
+        baca = endpoint.rsplit(".", 1)[-1] in METODE_BACA
+        for percobaan in range(RETRY_MAKS + 1):
+            self._ambil_token()
+            mulai = time.monotonic()
+            try:
+                hasil = fungsi(*args, **kwargs)
+                self._catat(endpoint, panggilan=1, detik=time.monotonic() - mulai)
+                return hasil
+            except Exception as e:
+                self._catat(endpoint, panggilan=1, detik=time.monotonic() - mulai)
+                if not _error_sementara(e, baca) or percobaan == RETRY_MAKS:
+                    self._catat(endpoint, error=1)
+                    raise
+                self._catat(endpoint, retry=1)
+                time.sleep(min(BACKOFF_MAKS, BACKOFF_DASAR * 2 ** percobaan) + random.uniform(0, 1))
+
+    def panggil(self, endpoint, fungsi, *args, **kwargs):
+        if endpoint.rsplit(".", 1)[-1] not in METODE_BACA:
+            return self._jalankan(endpoint, fungsi, args, kwargs)
+
+        # Single-flight: baca identik yang sedang berjalan cukup ditunggu hasilnya
+        kunci = (endpoint, repr(args), repr(sorted(kwargs.items())))
+        with self._lock:
+            tugas = self._inflight.get(kunci)
+            pemilik = tugas is None
+            if pemilik:
+                tugas = self._inflight[kunci] = {"selesai": threading.Event()}
+        if not pemilik:
+            tugas["selesai"].wait()
+            self._catat(endpoint, digabung=1)
+            if "error" in tugas:
+                raise tugas["error"]
+            return tugas["hasil"]
+        try:
+            tugas["hasil"] = self._jalankan(endpoint, fungsi, args, kwargs)
+            return tugas["hasil"]
+        except Exception as e:
+            tugas["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(kunci, None)
+            tugas["selesai"].set()
+
+    # --- API SPREADSHEET ---
+    def worksheet(self, nama):
+        if nama not in self._ws:
+            self._ws[nama] = _WorksheetTerkelola(self, self.panggil("worksheet", self._sh.worksheet, nama))
+        return self._ws[nama]
+
+    def add_worksheet(self, title, rows, cols):
+        ws = self.panggil("add_worksheet", self._sh.add_worksheet, title=title, rows=rows, cols=cols)
+        self._ws[title] = _WorksheetTerkelola(self, ws)
+        return self._ws[title]
+
+    def __getattr__(self, nama):
+        # batch_update, get_lastUpdateTime, values_batch_get, dst.
+        if nama.startswith('_'):
+            raise AttributeError(nama)
+        atribut = getattr(self._sh, nama)
+        if not callable(atribut):
+            return atribut
+        return lambda *args, **kwargs: self.panggil(nama, atribut, *args, **kwargs)
+
+    # --- STATISTIK ---
+    def request_menit_ini(self):
+        with self._lock:
+            batas = time.time() - 60
+            while self._waktu_request and self._waktu_request[0] < batas:
+                self._waktu_request.popleft()
+            return len(self._waktu_request)
+
+    def statistik(self):
+        with self._lock:
+            baris = [
+                {"endpoint": ep, "request": st_ep["panggilan"], "digabung": st_ep["digabung"],
+                 "retry": st_ep["retry"], "error": st_ep["error"],
+                 "rata2_ms": round(1000 * st_ep["detik"] / st_ep["panggilan"]) if st_ep["panggilan"] else 0}
+                for ep, st_ep in self._stat.items()
+            ]
+        return pd.DataFrame(baris, columns=["endpoint", "request", "digabung", "retry", "error", "rata2_ms"])
+
+    def per_menit(self):
+        with self._lock:
+            baris = [(datetime.fromtimestamp(menit * 60), jumlah) for menit, jumlah in sorted(self._per_menit.items())]
+        # Kolom waktu (bukan teks "HH:MM") agar grafik tetap urut melewati tengah malam
+        return pd.DataFrame(baris, columns=["menit", "request"])
+
+class _WorksheetTerkelola:
+    """Worksheet yang semua pemanggilan API-nya lewat KlienSheet (atribut biasa seperti id/title langsung)."""
+
+    def __init__(self, klien, ws):
+        self._klien = klien
+        self._ws = ws
+
+    def __getattr__(self, nama):
+        if nama.startswith('_'):
+            raise AttributeError(nama)
+        atribut = getattr(self._ws, nama)
+        if not callable(atribut):
+            return atribut
+        return lambda *args, **kwargs: self._klien.panggil(f"{self._ws.title}.{nama}", atribut, *args, **kwargs)
+
 @st.cache_resource
 def get_gsheet_connection():
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
@@ -44,55 +261,1200 @@ def get_gsheet_connection():
     client = gspread.authorize(creds)
     try:
         sh = client.open("DB_MANAJEMEN_ASET_MESIN") 
-        return sh
+        return KlienSheet(sh, KUOTA_PER_MENIT)
     except Exception as e:
         st.error(f"Gagal koneksi ke Google Sheets: {e}")
         st.stop()
 
+# ==========================================
+# 🗄️ REPLIKA LOKAL (SQLITE) + SYNC BACKGROUND
+# ==========================================
+REPLIKA_DB = os.getenv("REPLIKA_DB", "replika_aset.sqlite")
+SYNC_INTERVAL_DETIK = int(os.getenv("SYNC_INTERVAL_DETIK", "30"))   # Jeda antar cek perubahan spreadsheet
+SYNC_PENUH_DETIK = int(os.getenv("SYNC_PENUH_DETIK", "1800"))       # Sync penuh berkala (tangkap edit di tengah log)
+SYNC_LOG_HARI = int(os.getenv("SYNC_LOG_HARI", "90"))             # Partisi log yang selalu di-sync (beririsan N hari terakhir)
+SHEET_REPLIKA = ["master_aset", "riwayat_log"]
+SHEET_APPEND_ONLY = ["riwayat_log"]  # Boleh sync delta (hanya ambil baris baru)
+TABEL_PARTISI = "riwayat_log"        # Di Sheet dipecah per tahun: riwayat_log_2025, riwayat_log_2026, ...
+VERSI_REPLIKA = 3                    # Naikkan jika struktur tabel replika berubah
+KOMPAKSI_INTERVAL_JAM = float(os.getenv("KOMPAKSI_INTERVAL_JAM", "24"))  # Jeda antar kompaksi otomatis
+KOMPAKSI_JEDA_MENIT = 10             # Kompaksi hanya saat tidak ada simpanan admin selama N menit
+FLUSH_JEDA_DETIK = 1          # Tunggu sebentar agar simpan yang berdekatan terkirim dalam satu batch
+FLUSH_MAKS_AKSI = 50          # Maks aksi admin per batchUpdate
+FLUSH_BACKOFF_MAKS = 300      # Jeda maksimal antar percobaan ulang (detik)
+
+# Rename kolom tanggal manual jika ada variasi nama
+RENAME_KOLOM = {
+    'tgl': 'tanggal',
+    'date': 'tanggal',
+    'tanggal_kejadian': 'tanggal'
+}
+
+# Tipe kolom per worksheet (kolom yang tidak terdaftar dianggap teks)
+SKEMA_SHEET = {
+    "master_aset": {
+        "id": "teks", "lokasi_toko": "teks", "kategori": "teks", "nama_mesin": "teks",
+        "harga_beli": "angka", "no_registrasi": "teks", "status": "teks",
+    },
+    "riwayat_log": {
+        "id": "teks", "lokasi_asal": "teks", "kategori": "teks", "jenis_aksi": "teks", "tanggal": "tanggal",
+        "nama_mesin": "teks", "harga_beli": "angka", "no_registrasi": "teks", "no_reg_system": "teks",
+        "keterangan": "teks",
+    },
+}
+# Soft delete: baris tidak dihapus dari Sheet (nomor baris tetap stabil), hanya ditandai lalu dibuang saat kompaksi
+STATUS_NONAKTIF = "Non-Aktif"
+JENIS_LIKUIDASI = ["Likuidasi (Dijual)", "Rusak/Musnah", "Hilang", "Donasi"]
+SYARAT_MATI = {
+    "master_aset": f"COALESCE(status, '') = '{STATUS_NONAKTIF}'",  # Aset sudah dilikuidasi
+    "riwayat_log": "COALESCE(id, '') = ''",                         # Log dihapus (ID dikosongkan)
+}
+SYARAT_HIDUP = {tabel: f"NOT ({syarat})" for tabel, syarat in SYARAT_MATI.items()}
+
+# Agregat log per bulan (tabel _tren), dijaga trigger SQLite setiap kali baris log masuk/berubah/terhapus
+KUNCI_TREN = ["jenis_aksi", "lokasi_asal", "kategori"]
+# Kolom log yang ikut checksum bulanan _tren.cek (dipakai untuk memeriksa snapshot inventaris masih berlaku)
+KOLOM_JEJAK = ["id", "jenis_aksi", "_tanggal", "lokasi_asal", "kategori", "nama_mesin", "harga_beli",
+               "no_registrasi", "no_reg_system", "keterangan"]
+
+def _cek_log(*nilai):
+    # Checksum 32-bit satu baris log; dijumlah per bulan (tambah saat insert, kurang saat delete)
+    return zlib.crc32("\x1f".join(map(str, nilai)).encode())
+
+def _sql_tren(baris, arah, kolom_cek):
+    """Statement trigger: tambah (arah=1) / kurangi (arah=-1) bucket bulan milik baris NEW/OLD.
+
+    Hanya log hidup (sama dengan SYARAT_HIDUP riwayat_log) yang tanggalnya terbaca.
+    """
+    kunci = ", ".join(f"COALESCE({baris}.{k}, '')" for k in KUNCI_TREN)
+    cek = ", ".join(f"{baris}.{k}" for k in kolom_cek)
+    return (
+        f"INSERT INTO _tren (bulan, {', '.join(KUNCI_TREN)}, jumlah, nilai, cek) "
+        f"SELECT substr({baris}._tanggal, 1, 7), {kunci}, {arah}, {arah} * COALESCE({baris}.harga_beli, 0), "
+        f"{arah} * cek_log({cek}) "
+        f"WHERE {baris}._tanggal IS NOT NULL AND COALESCE({baris}.id, '') <> '' "
+        f"ON CONFLICT (bulan, {', '.join(KUNCI_TREN)}) "
+        f"DO UPDATE SET jumlah = jumlah + excluded.jumlah, nilai = nilai + excluded.nilai, cek = cek + excluded.cek;"
+    )
+
+# Angka mentah (tanpa format Rp/titik ribuan), tanggal tetap teks sesuai tampilan sheet
+OPSI_RENDER = {
+    "value_render_option": gspread.utils.ValueRenderOption.unformatted,
+    "date_time_render_option": gspread.utils.DateTimeOption.formatted_string,
+}
+
+def _kolom_teks(nilai):
+    return pd.Series(nilai, dtype=object).astype(str)
+
+def _kolom_angka(nilai):
+    seri = pd.Series(nilai, dtype=object)
+    angka = pd.to_numeric(seri, errors='coerce')
+    # Sel yang berisi teks harga ("Rp 1.500.000") -> ambil digitnya saja
+    kosong = angka.isna()
+    if kosong.any():
+        angka[kosong] = pd.to_numeric(seri[kosong].astype(str).str.replace(r'[^\d]', '', regex=True), errors='coerce')
+    return angka.fillna(0).round().astype('int64')
+
+KONVERSI_KOLOM = {"teks": _kolom_teks, "tanggal": _kolom_teks, "angka": _kolom_angka}
+
+def bangun_frame(sheet_name, kolom, rows):
+    """List-of-lists (hasil get_values) -> DataFrame bertipe, dibangun per kolom tanpa dict per baris."""
+    lebar = len(kolom)
+    skema = SKEMA_SHEET.get(sheet_name, {})
+    isi_kolom = list(zip(*[(r + [''] * (lebar - len(r)))[:lebar] for r in rows])) if rows else [()] * lebar
+    return pd.DataFrame(
+        {k: KONVERSI_KOLOM[skema.get(k, "teks")](v) for k, v in zip(kolom, isi_kolom)}, columns=kolom
+    )
+
+def tabel_dari_sheet(sheet_name):
+    # riwayat_log (lama, belum dipecah) dan riwayat_log_YYYY masuk ke tabel replika yang sama
+    return TABEL_PARTISI if sheet_name == TABEL_PARTISI or sheet_name.startswith(TABEL_PARTISI + "_") else sheet_name
+
+def nama_partisi(tanggal):
+    return f"{TABEL_PARTISI}_{tanggal.year}"
+
+def normalisasi_header(header):
+    # Standarisasi header jadi huruf kecil semua
+    kolom = [str(h).strip().lower() for h in header]
+    return [RENAME_KOLOM.get(k, k) for k in kolom]
+
+def pola_like(keyword):
+    # Escape wildcard SQL agar keyword dicari apa adanya (LIKE di SQLite case-insensitive)
+    return "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+class ReplikaSheet:
+    """Salinan lokal master_aset & riwayat_log di SQLite.
+
+    Semua baca/filter/rekap berjalan di sini; tulis tetap ke Google Sheets (sumber kebenaran).
+    Kolom internal: _partisi (nama worksheet asal), _baris (nomor baris di worksheet tersebut),
+    _id (id numerik), _tanggal (YYYY-MM-DD, khusus log).
+
+    riwayat_log di Sheet dipecah per tahun (riwayat_log_2025, riwayat_log_2026, ...) tetapi di replika
+    tetap satu tabel. Partisi lama hanya dimuat jika rentang tanggal yang diminta beririsan dengannya.
+
+    Tulis bersifat write-behind: request batchUpdate langsung diterapkan ke replika dan disimpan
+    di tabel _antrian, lalu dikirim ke Sheet oleh worker background. Selama antrian belum kosong
+    replika tidak di-sync agar perubahan lokal tidak tertimpa data lama.
+    """
+
+    def __init__(self, path, sh, meta):
+        self.sh = sh
+        self.meta = meta
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.create_function("cek_log", -1, _cek_log, deterministic=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < VERSI_REPLIKA:
+            # Struktur replika berubah -> buang salinan lama, dimuat ulang dari Sheet
+            for tabel in SHEET_REPLIKA + ["_sync", "_tren", "_snapshot"]:
+                self.conn.execute(f'DROP TABLE IF EXISTS "{tabel}"')
+            self.conn.execute(f"PRAGMA user_version = {VERSI_REPLIKA}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS _sync (sheet TEXT PRIMARY KEY, kolom TEXT, jumlah_baris INTEGER, waktu_penuh REAL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS _antrian (id INTEGER PRIMARY KEY AUTOINCREMENT, requests TEXT, "
+            "dibuat REAL, status TEXT DEFAULT 'menunggu', error TEXT)"
+        )
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS _tren (bulan TEXT, {', '.join(f'{k} TEXT' for k in KUNCI_TREN)}, "
+            f"jumlah INTEGER, nilai INTEGER, cek INTEGER, PRIMARY KEY (bulan, {', '.join(KUNCI_TREN)}))"
+        )
+        self._pasang_tren()
+        self._pasang_index_jejak()
+        self.conn.commit()
+        self._lock = threading.RLock()       # Akses koneksi SQLite
+        self._lock_sync = threading.Lock()   # Satu proses sync dalam satu waktu
+        self._ws = {}
+        self._minta_penuh = set()
+        self._index_baris = {}  # tabel -> {id: (partisi, nomor baris sheet)}
+        self.versi_remote = None
+        self.versi_lokal = {nama: 0 for nama in SHEET_REPLIKA}
+        self.terakhir_sukses = None
+        self.error_terakhir = None
+        self.error_kirim = None
+        self._ada_tulisan = threading.Event()
+        self._terakhir_antri = 0
+        self.terakhir_kompaksi = 0
+
+    # --- BACA ---
+    def query(self, sql, params=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def sheet_termuat(self):
+        with self._lock:
+            return [baris[0] for baris in self.conn.execute("SELECT sheet FROM _sync ORDER BY sheet")]
+
+    def kolom_sheet(self, sheet_name):
+        with self._lock:
+            baris = self.conn.execute("SELECT kolom FROM _sync WHERE sheet = ?", (sheet_name,)).fetchone()
+        return json.loads(baris[0]) if baris else None
+
+    def ada(self, tabel):
+        return any(tabel_dari_sheet(nama) == tabel for nama in self.sheet_termuat())
+
+    def baca(self, tabel, internal=False, semua=False):
+        if not self.ada(tabel):
+            self.sync(paksa=True)
+        if not self.ada(tabel):
+            return pd.DataFrame()
+        # Baris non-aktif / terhapus disembunyikan kecuali diminta semua
+        syarat = "1=1" if semua else SYARAT_HIDUP.get(tabel, "1=1")
+        df = self.query(f'SELECT * FROM "{tabel}" WHERE {syarat} ORDER BY _partisi, _baris')
+        if not internal:
+            df = df.drop(columns=[c for c in df.columns if c.startswith('_')])
+        return df
+
+    def lokasi_untuk(self, tabel, id_cari):
+        """(partisi, nomor baris) untuk ID tertentu dari index lokal (tanpa API). None jika tidak ada."""
+        with self._lock:
+            if tabel not in self._index_baris:
+                if not self.ada(tabel):
+                    return None
+                df = pd.read_sql_query(
+                    f'SELECT id, _partisi, _baris FROM "{tabel}" '
+                    f'ORDER BY {SYARAT_HIDUP.get(tabel, "1")}, _partisi DESC, _baris DESC', self.conn
+                )
+                # Urut terbalik -> jika ada ID ganda, baris teratas yang dipakai (sama seperti find),
+                # baris yang masih hidup didahulukan daripada baris non-aktif yang belum dikompaksi
+                self._index_baris[tabel] = dict(zip(df['id'].astype(str), zip(df['_partisi'], df['_baris'].astype(int))))
+            return self._index_baris[tabel].get(str(id_cari))
+
+    def baris_untuk(self, tabel, id_cari):
+        lokasi = self.lokasi_untuk(tabel, id_cari)
+        return lokasi[1] if lokasi else None
+
+    def jejak(self, id_aset):
+        """Semua log hidup milik satu aset (no_reg_system), terlama dulu. Lewat index jejak, tanpa scan log."""
+        if not self.ada(TABEL_PARTISI) or 'no_reg_system' not in self.query(f'SELECT * FROM "{TABEL_PARTISI}" LIMIT 0'):
+            return pd.DataFrame()
+        return self.query(
+            f'SELECT * FROM "{TABEL_PARTISI}" WHERE no_reg_system = ? AND {SYARAT_HIDUP[TABEL_PARTISI]} '
+            f'ORDER BY _tanggal, _id', [str(id_aset)]
+        )
+
+    # --- SYNC ---
+    def _worksheet(self, sheet_name):
+        if sheet_name not in self._ws:
+            self._ws[sheet_name] = self.sh.worksheet(sheet_name)
+        return self._ws[sheet_name]
+
+    def _sheet_sync(self):
+        # Master + partisi yang sudah dimuat + partisi yang beririsan dengan SYNC_LOG_HARI terakhir
+        panas = self.meta.partisi_beririsan(date.today() - timedelta(days=SYNC_LOG_HARI), None)
+        return ["master_aset"] + sorted(set(self.sheet_termuat() + panas) - {"master_aset"})
+
+    def sync(self, paksa=False):
+        with self._lock_sync:
+            if self.jumlah_antrian():
+                # Replika lebih baru dari Sheet sampai antrian terkirim
+                return False
+            try:
+                versi = self.sh.get_lastUpdateTime()
+                if versi == self.versi_remote and not paksa and not self._minta_penuh:
+                    self.terakhir_sukses = time.time()
+                    return False
+                for sheet_name in self._sheet_sync():
+                    self._sync_sheet(sheet_name)
+                if self.jumlah_antrian():
+                    return False
+                self.versi_remote = versi
+                self.terakhir_sukses = time.time()
+                self.error_terakhir = None
+                return True
+            except Exception as e:
+                # Misal kena limit API (429): replika lama tetap dipakai untuk baca
+                self.error_terakhir = str(e)
+                return False
+
+    def muat_partisi(self, daftar_sheet):
+        """Muat partisi yang belum ada di replika (sekali unduh; selanjutnya ikut sync delta). Return True jika ada yang dimuat."""
+        kurang = [nama for nama in daftar_sheet if nama not in self.sheet_termuat()]
+        if not kurang:
+            return False
+        with self._lock_sync:
+            for sheet_name in kurang:
+                try:
+                    # Partisi baru belum punya tulisan di antrian -> aman dimuat walau antrian belum kosong
+                    self._sync_sheet(sheet_name, cek_antrian=False)
+                except Exception as e:
+                    self.error_terakhir = str(e)
+        return True
+
+    def pastikan_rentang(self, tgl_awal=None, tgl_akhir=None):
+        """Pastikan semua partisi log yang beririsan dengan rentang tanggal (None = tanpa batas) ada di replika."""
+        return self.muat_partisi(self.meta.partisi_beririsan(tgl_awal, tgl_akhir))
+
+    def _sync_sheet(self, sheet_name, cek_antrian=True):
+        ws = self._worksheet(sheet_name)
+        tabel = tabel_dari_sheet(sheet_name)
+        with self._lock:
+            meta = self.conn.execute(
+                "SELECT kolom, jumlah_baris, waktu_penuh FROM _sync WHERE sheet = ?", (sheet_name,)
+            ).fetchone()
+
+        penuh = (
+            meta is None
+            or tabel not in SHEET_APPEND_ONLY
+            or sheet_name in self._minta_penuh
+            or time.time() - meta[2] > SYNC_PENUH_DETIK
+            or meta[1] == 0
+        )
+
+        if not penuh:
+            kolom, n = json.loads(meta[0]), meta[1]
+            # Ambil mulai dari baris data terakhir yang sudah tersimpan (jangkar) sampai akhir sheet
+            kolom_akhir = gspread.utils.rowcol_to_a1(1, len(kolom)).rstrip("1")
+            rows = ws.get_values(f"A{n + 1}:{kolom_akhir}", **OPSI_RENDER)
+            kolom_sql = ", ".join(f'"{k}"' for k in kolom)
+            with self._lock:
+                jangkar = self.conn.execute(
+                    f'SELECT {kolom_sql} FROM "{tabel}" WHERE _partisi = ? AND _baris = ?', (sheet_name, n + 1)
+                ).fetchone()
+            if (rows and jangkar is not None
+                    and [str(v) for v in jangkar] == [str(v) for v in bangun_frame(tabel, kolom, rows[:1]).iloc[0]]):
+                if len(rows) > 1:
+                    self._tulis(sheet_name, kolom, rows[1:], baris_awal=n + 2, ganti=False, cek_antrian=cek_antrian)
+                return
+            # Jangkar berubah (baris diedit/dihapus) -> sync penuh
+
+        values = ws.get_values(**OPSI_RENDER)
+        kolom = normalisasi_header(values[0]) if values else []
+        rows = values[1:]
+        if self._tulis(sheet_name, kolom, rows, baris_awal=2, ganti=True, cek_antrian=cek_antrian):
+            self._minta_penuh.discard(sheet_name)
+
+    @staticmethod
+    def _kolom_internal(df):
+        if 'id' in df.columns:
+            df['_id'] = pd.to_numeric(df['id'], errors='coerce')
+        if 'tanggal' in df.columns:
+            df['_tanggal'] = pd.to_datetime(df['tanggal'], errors='coerce').dt.strftime('%Y-%m-%d')
+        return df
+
+    def _frame_lokal(self, sheet_name, kolom, rows, baris_awal):
+        df = bangun_frame(tabel_dari_sheet(sheet_name), kolom, rows)
+        df.insert(0, '_baris', range(baris_awal, baris_awal + len(df)))
+        df.insert(0, '_partisi', sheet_name)
+        return self._kolom_internal(df)
+
+    def _tulis(self, sheet_name, kolom, rows, baris_awal, ganti, cek_antrian=True):
+        tabel = tabel_dari_sheet(sheet_name)
+        df = self._frame_lokal(sheet_name, kolom, rows, baris_awal)
+
+        with self._lock:
+            if cek_antrian and self.jumlah_antrian():
+                # Ada aksi admin masuk selama data diunduh -> hasil sync ini sudah basi
+                return False
+            if ganti:
+                self._index_baris.pop(tabel, None)
+                ada_tabel = self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabel,)
+                ).fetchone()
+                if tabel == TABEL_PARTISI and ada_tabel:
+                    # Tabel gabungan beberapa partisi: ganti isi partisi ini saja
+                    self.conn.execute(f'DELETE FROM "{tabel}" WHERE _partisi = ?', (sheet_name,))
+                    df.to_sql(tabel, self.conn, if_exists='append', index=False)
+                else:
+                    df.to_sql(tabel, self.conn, if_exists='replace', index=False)
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{tabel}_baris" ON "{tabel}" (_partisi, _baris)')
+                if tabel == TABEL_PARTISI:
+                    self._pasang_tren()
+                    self._pasang_index_jejak()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO _sync (sheet, kolom, jumlah_baris, waktu_penuh) VALUES (?, ?, ?, ?)",
+                    (sheet_name, json.dumps(kolom), len(df), time.time())
+                )
+            else:
+                if tabel in self._index_baris and 'id' in df.columns:
+                    for id_baru, baris in zip(df['id'].astype(str), df['_baris']):
+                        self._index_baris[tabel].setdefault(id_baru, (sheet_name, int(baris)))
+                df.to_sql(tabel, self.conn, if_exists='append', index=False)
+                self.conn.execute(
+                    "UPDATE _sync SET jumlah_baris = jumlah_baris + ? WHERE sheet = ?", (len(df), sheet_name)
+                )
+            self.conn.commit()
+        self.versi_lokal[tabel] += 1
+        return True
+
+    def _pasang_index_jejak(self):
+        # Index jejak aset: no_reg_system -> posisi baris log berurutan waktu. Dibuat sekali per tabel log baru,
+        # selanjutnya dijaga SQLite sendiri di setiap insert/update/delete (sync delta, antrian admin, kompaksi)
+        kolom = {baris[1] for baris in self.conn.execute(f'PRAGMA table_info("{TABEL_PARTISI}")')}
+        if {"no_reg_system", "_tanggal", "_id"} <= kolom:
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{TABEL_PARTISI}_aset" ON "{TABEL_PARTISI}" (no_reg_system, _tanggal, _id)'
+            )
+
+    # --- AGREGAT BULANAN LOG ---
+    def _pasang_tren(self):
+        """Pasang trigger _tren di tabel log (sekali per tabel baru) lalu hitung ulang _tren dari isi tabel.
+
+        Setelah itu _tren ikut berubah per baris (sync delta, antrian admin, kompaksi) tanpa GROUP BY ulang.
+        Dipanggil di dalam transaksi pemanggil.
+        """
+        tabel = TABEL_PARTISI
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'tren_tambah'").fetchone():
+            return
+        kolom = {baris[1] for baris in self.conn.execute(f'PRAGMA table_info("{tabel}")')}
+        if not kolom:
+            return  # Tabel log belum dimuat
+        self.conn.execute("DELETE FROM _tren")
+        if not {"id", "_tanggal", "harga_beli", *KUNCI_TREN} <= kolom:
+            return  # Header log tidak lengkap, tren tidak bisa dihitung
+        kolom_cek = [k for k in KOLOM_JEJAK if k in kolom]
+        self.conn.execute(
+            f'CREATE TRIGGER tren_tambah AFTER INSERT ON "{tabel}" BEGIN {_sql_tren("NEW", 1, kolom_cek)} END'
+        )
+        self.conn.execute(
+            f'CREATE TRIGGER tren_hapus AFTER DELETE ON "{tabel}" BEGIN {_sql_tren("OLD", -1, kolom_cek)} END'
+        )
+        self.conn.execute(
+            f"CREATE TRIGGER tren_ubah AFTER UPDATE OF {', '.join(kolom_cek)} ON \"{tabel}\" "
+            f'BEGIN {_sql_tren("OLD", -1, kolom_cek)} {_sql_tren("NEW", 1, kolom_cek)} END'
+        )
+        kunci = ", ".join(f"COALESCE({k}, '')" for k in KUNCI_TREN)
+        self.conn.execute(
+            f"INSERT INTO _tren (bulan, {', '.join(KUNCI_TREN)}, jumlah, nilai, cek) "
+            f"SELECT substr(_tanggal, 1, 7), {kunci}, COUNT(*), SUM(COALESCE(harga_beli, 0)), "
+            f"SUM(cek_log({', '.join(kolom_cek)})) FROM \"{tabel}\" "
+            f"WHERE _tanggal IS NOT NULL AND {SYARAT_HIDUP[tabel]} GROUP BY 1, 2, 3, 4"
+        )
+
+    # --- ANTRIAN TULIS (WRITE-BEHIND) ---
+    def jumlah_antrian(self, status='menunggu'):
+        # 'menunggu' ikut menghitung 'cek' (kiriman ambigu): keduanya belum pasti ada di Sheet
+        daftar = ('menunggu', 'cek') if status == 'menunggu' else (status,)
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT COUNT(*) FROM _antrian WHERE status IN ({', '.join('?' * len(daftar))})", daftar
+            ).fetchone()[0]
+
+    def antrikan(self, requests):
+        """Terapkan requests batchUpdate ke replika sekarang; pengiriman ke Sheet dilakukan worker."""
+        with self._lock:
+            try:
+                diubah = self._terapkan(requests)
+                self.conn.execute(
+                    "INSERT INTO _antrian (requests, dibuat) VALUES (?, ?)", (json.dumps(requests), time.time())
+                )
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            for sheet_name in diubah:
+                self._index_baris.pop(sheet_name, None)
+                self.versi_lokal[sheet_name] += 1
+            self._terakhir_antri = time.time()
+        self._ada_tulisan.set()
+
+    # --- KOMPAKSI (BUANG BARIS SOFT DELETE) ---
+    def baris_mati(self):
+        """{sheet: [nomor baris]} baris non-aktif / terhapus yang masih ada di Sheet."""
+        hasil = {}
+        for sheet_name in self.sheet_termuat():
+            tabel = tabel_dari_sheet(sheet_name)
+            if tabel not in SYARAT_MATI:
+                continue
+            df = self.query(
+                f'SELECT _baris FROM "{tabel}" WHERE _partisi = ? AND {SYARAT_MATI[tabel]} ORDER BY _baris', [sheet_name]
+            )
+            if not df.empty:
+                hasil[sheet_name] = df['_baris'].astype(int).tolist()
+        return hasil
+
+    def _baris_cocok(self, sheet_name, daftar_baris):
+        """True jika baris-baris ini di Sheet masih sama persis dengan replika (cek terakhir sebelum deleteDimension)."""
+        tabel, kolom = tabel_dari_sheet(sheet_name), self.kolom_sheet(sheet_name)
+        values = self._worksheet(sheet_name).get_values(**OPSI_RENDER)
+        with self._lock:
+            n = self.conn.execute("SELECT jumlah_baris FROM _sync WHERE sheet = ?", (sheet_name,)).fetchone()[0]
+            kolom_sql = ", ".join(f'"{k}"' for k in kolom)
+            lokal = self.conn.execute(
+                f'SELECT {kolom_sql} FROM "{tabel}" WHERE _partisi = ? AND _baris IN ({", ".join("?" * len(daftar_baris))}) '
+                f'ORDER BY _baris', [sheet_name, *daftar_baris]
+            ).fetchall()
+        if not values or normalisasi_header(values[0]) != kolom or len(values) - 1 != n or len(lokal) != len(daftar_baris):
+            return False
+        remote = bangun_frame(tabel, kolom, [values[baris - 1] for baris in daftar_baris])
+        return ([[str(v) for v in baris] for baris in lokal]
+                == [[str(v) for v in baris] for baris in remote.itertuples(index=False)])
+
+    def kompaksi(self):
+        """Hapus semua baris mati dalam satu batchUpdate (lewat antrian, jadi urutan dengan simpanan lain tetap terjaga).
+
+        Nomor baris hanya bergeser di sini; di antara dua kompaksi nomor baris tetap stabil.
+        Hapus baris tidak bisa dibatalkan, jadi kompaksi ditunda (return None) jika sync barusan gagal,
+        antrian belum kosong, atau isi baris di Sheet tidak lagi sama dengan replika.
+        """
+        mulai = time.time()
+        self.sync()
+        if (self.terakhir_sukses or 0) < mulai or self.jumlah_antrian():
+            return None  # Replika belum pasti sama dengan Sheet
+        mati = self.baris_mati()
+        berubah = [sheet_name for sheet_name, daftar_baris in mati.items() if not self._baris_cocok(sheet_name, daftar_baris)]
+        if berubah:
+            # Sheet diubah dari luar sejak sync -> muat ulang penuh dulu, kompaksi dicoba lagi nanti
+            self._minta_penuh.update(berubah)
+            self.error_terakhir = f"Kompaksi ditunda: {', '.join(berubah)} berubah di luar aplikasi"
+            return None
+        with self._lock:
+            if self.jumlah_antrian() or self.baris_mati() != mati:
+                return None  # Ada simpanan baru selama pengecekan
+            requests = [
+                req for sheet_name, daftar_baris in mati.items()
+                for req in req_hapus_banyak_baris(self._worksheet(sheet_name), daftar_baris)
+            ]
+            if requests:
+                self.antrikan(requests)
+            self.terakhir_kompaksi = time.time()
+        return sum(len(daftar_baris) for daftar_baris in mati.values())
+
+    @staticmethod
+    def _nilai_sel(sel):
+        # Kebalikan _sel: nilai mentah seperti hasil get_values UNFORMATTED_VALUE
+        nilai = sel.get("userEnteredValue", {})
+        if "numberValue" in nilai:
+            angka = nilai["numberValue"]
+            return int(angka) if float(angka).is_integer() else angka
+        return str(nilai.get("stringValue", ""))
+
+    def _terapkan(self, requests):
+        # Jalankan appendCells / updateCells / deleteDimension di SQLite (dalam transaksi pemanggil)
+        peta = {self._worksheet(nama).id: nama for nama in self.sheet_termuat()}
+        diubah = set()
+        for req in requests:
+            jenis, isi = next(iter(req.items()))
+            sheet_id = (isi.get("start") or isi.get("range") or isi).get("sheetId")
+            sheet_name = peta.get(sheet_id)
+            if sheet_name is None:
+                continue  # Misal _meta: tidak direplikasi
+            tabel = tabel_dari_sheet(sheet_name)
+            kolom_json, n = self.conn.execute(
+                "SELECT kolom, jumlah_baris FROM _sync WHERE sheet = ?", (sheet_name,)
+            ).fetchone()
+            kolom = json.loads(kolom_json)
+
+            if jenis == "appendCells":
+                rows = [[self._nilai_sel(sel) for sel in r.get("values", [])] for r in isi["rows"]]
+                df = self._frame_lokal(sheet_name, kolom, rows, baris_awal=n + 2)
+                df = df.astype(object).where(df.notna(), None)
+                kolom_sql = ", ".join(f'"{k}"' for k in df.columns)
+                self.conn.executemany(
+                    f'INSERT INTO "{tabel}" ({kolom_sql}) VALUES ({", ".join("?" * len(df.columns))})',
+                    df.values.tolist()
+                )
+                self.conn.execute("UPDATE _sync SET jumlah_baris = ? WHERE sheet = ?", (n + len(df), sheet_name))
+
+            elif jenis == "updateCells":
+                baris_awal = isi["start"]["rowIndex"] + 1
+                kolom_awal = isi["start"]["columnIndex"]
+                for i, r in enumerate(isi["rows"]):
+                    nilai = {
+                        kolom[kolom_awal + j]: self._nilai_sel(sel)
+                        for j, sel in enumerate(r.get("values", [])) if kolom_awal + j < len(kolom)
+                    }
+                    if not nilai:
+                        continue
+                    df_baris = self._kolom_internal(bangun_frame(tabel, list(nilai), [list(nilai.values())]))
+                    nilai = {k: (None if pd.isna(v) else v.item() if hasattr(v, 'item') else v)
+                             for k, v in df_baris.iloc[0].items()}
+                    set_sql = ", ".join(f'"{k}" = ?' for k in nilai)
+                    self.conn.execute(
+                        f'UPDATE "{tabel}" SET {set_sql} WHERE _partisi = ? AND _baris = ?',
+                        [*nilai.values(), sheet_name, baris_awal + i]
+                    )
+
+            elif jenis == "deleteDimension":
+                awal, akhir = isi["range"]["startIndex"] + 1, isi["range"]["endIndex"]
+                terhapus = self.conn.execute(
+                    f'DELETE FROM "{tabel}" WHERE _partisi = ? AND _baris BETWEEN ? AND ?', (sheet_name, awal, akhir)
+                ).rowcount
+                self.conn.execute(
+                    f'UPDATE "{tabel}" SET _baris = _baris - ? WHERE _partisi = ? AND _baris > ?',
+                    (akhir - awal + 1, sheet_name, akhir)
+                )
+                self.conn.execute("UPDATE _sync SET jumlah_baris = ? WHERE sheet = ?", (n - terhapus, sheet_name))
+            diubah.add(tabel)
+        return diubah
+
+    @staticmethod
+    def _gabung_requests(daftar):
+        # Satukan appendCells berurutan ke sheet yang sama jadi satu request
+        hasil = []
+        for req in daftar:
+            if (hasil and "appendCells" in req and "appendCells" in hasil[-1]
+                    and req["appendCells"]["sheetId"] == hasil[-1]["appendCells"]["sheetId"]):
+                hasil[-1] = {"appendCells": {**hasil[-1]["appendCells"],
+                                             "rows": hasil[-1]["appendCells"]["rows"] + req["appendCells"]["rows"]}}
+            else:
+                hasil.append(req)
+        return hasil
+
+    def _kirim(self, antrian):
+        requests = self._gabung_requests([req for _, isi in antrian for req in json.loads(isi)])
+        self.sh.batch_update({"requests": requests})
+        with self._lock:
+            self.conn.executemany("DELETE FROM _antrian WHERE id = ?", [(id_antrian,) for id_antrian, _ in antrian])
+            self.conn.commit()
+
+    def _tandai(self, antrian, status, error=None):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE _antrian SET status = ?, error = ? WHERE id = ?",
+                [(status, error, id_antrian) for id_antrian, _ in antrian]
+            )
+            self.conn.commit()
+        if status == 'gagal':
+            # Replika sudah menyimpang dari Sheet -> muat ulang penuh setelah antrian kosong
+            self._minta_penuh.update(self.sheet_termuat())
+
+    def _sudah_mendarat(self, antrian):
+        """Apakah batch yang kirimnya ambigu (5xx/timeout) ternyata sudah diterapkan Sheet.
+
+        batchUpdate atomik, jadi cukup cocokkan ID baris appendCells dengan ekor kolom ID tiap sheet tujuan.
+        Batch yang hanya berisi updateCells idempoten -> dianggap belum (aman dikirim ulang).
+        True = sudah, False = belum, None = tidak bisa dipastikan (deleteDimension tanpa appendCells / ekor tidak cocok).
+        """
+        peta = {self._worksheet(nama).id: nama for nama in self.sheet_termuat()}
+        tambahan, ada_hapus = {}, False
+        for _, isi in antrian:
+            for req in json.loads(isi):
+                ada_hapus = ada_hapus or "deleteDimension" in req
+                if "appendCells" not in req:
+                    continue
+                nama = peta.get(req["appendCells"]["sheetId"])
+                if nama is None:
+                    return None
+                tambahan.setdefault(nama, []).extend(
+                    str(self._nilai_sel(r["values"][0])) for r in req["appendCells"]["rows"]
+                )
+        if not tambahan:
+            return None if ada_hapus else False
+        hasil = set()
+        for nama, ids in tambahan.items():
+            kolom_id = [
+                str(v) for v in self._worksheet(nama).col_values(1, value_render_option=OPSI_RENDER["value_render_option"])
+            ]
+            if kolom_id[-len(ids):] == ids:
+                hasil.add(True)
+            elif not set(ids) & set(kolom_id):
+                hasil.add(False)
+            else:
+                return None
+        return hasil.pop() if len(hasil) == 1 else None
+
+    def _periksa_ambigu(self):
+        # Kiriman ambigu tidak dikirim ulang begitu saja: cek dulu apakah sudah mendarat (bisa melempar -> dicoba lagi nanti)
+        with self._lock:
+            antrian = self.conn.execute("SELECT id, requests FROM _antrian WHERE status = 'cek' ORDER BY id").fetchall()
+        if not antrian:
+            return 0
+        mendarat = self._sudah_mendarat(antrian)
+        if mendarat:
+            with self._lock:
+                self.conn.executemany("DELETE FROM _antrian WHERE id = ?", [(id_antrian,) for id_antrian, _ in antrian])
+                self.conn.commit()
+        elif mendarat is False:
+            self._tandai(antrian, 'menunggu')
+        else:
+            self._tandai(antrian, 'gagal', "Status kirim tidak pasti (koneksi/server error); replika dimuat ulang penuh")
+        return len(antrian)
+
+    def _kirim_aman(self, antrian):
+        # _kirim; jika ditolak permanen -> gagal, jika ambigu -> ditandai 'cek' lalu diperiksa sebelum dikirim ulang
+        try:
+            self._kirim(antrian)
+        except Exception as e:
+            if _error_ambigu(e):
+                self._tandai(antrian, 'cek', str(e))
+                self._periksa_ambigu()
+            raise
+
+    def flush(self):
+        """Kirim satu batch antrian ke Sheet. Return jumlah aksi yang terkirim/ditolak."""
+        diperiksa = self._periksa_ambigu()
+        if diperiksa:
+            return diperiksa
+        with self._lock:
+            antrian = self.conn.execute(
+                "SELECT id, requests FROM _antrian WHERE status = 'menunggu' ORDER BY id LIMIT ?", (FLUSH_MAKS_AKSI,)
+            ).fetchall()
+        if not antrian:
+            return 0
+        try:
+            self._kirim_aman(antrian)
+        except gspread.exceptions.APIError as e:
+            if not _error_permanen(e):
+                raise
+            # Ada aksi yang ditolak Google (misal baris sudah tidak ada) -> kirim satu per satu
+            for item in antrian:
+                try:
+                    self._kirim_aman([item])
+                except gspread.exceptions.APIError as e_item:
+                    if not _error_permanen(e_item):
+                        raise
+                    self._tandai([item], 'gagal', str(e_item))
+        return len(antrian)
+
+    def daftar_gagal(self):
+        return self.query("SELECT id, datetime(dibuat, 'unixepoch', 'localtime') AS waktu, error FROM _antrian WHERE status = 'gagal' ORDER BY id")
+
+    def hapus_gagal(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM _antrian WHERE status = 'gagal'")
+            self.conn.commit()
+
+    def _loop_flush(self):
+        percobaan = 0
+        while True:
+            # Bangun saat ada tulisan baru, atau berkala (antrian sisa dari proses sebelumnya)
+            self._ada_tulisan.wait(timeout=SYNC_INTERVAL_DETIK)
+            time.sleep(FLUSH_JEDA_DETIK)
+            self._ada_tulisan.clear()
+            try:
+                terkirim = 0
+                while self.jumlah_antrian():
+                    terkirim += self.flush()
+                percobaan = 0
+                self.error_kirim = None
+                if terkirim:
+                    self.sync()
+            except Exception as e:
+                # 429 / 5xx / jaringan: antrian tetap di disk, coba lagi dengan backoff
+                percobaan += 1
+                self.error_kirim = str(e)
+                time.sleep(min(FLUSH_BACKOFF_MAKS, 2 ** percobaan) + random.uniform(0, 1))
+                self._ada_tulisan.set()
+
+    def _loop_background(self):
+        while True:
+            time.sleep(SYNC_INTERVAL_DETIK)
+            self.sync()
+            sekarang = time.time()
+            if (sekarang - self.terakhir_kompaksi >= KOMPAKSI_INTERVAL_JAM * 3600
+                    and sekarang - self._terakhir_antri >= KOMPAKSI_JEDA_MENIT * 60):
+                try:
+                    self.kompaksi()
+                except Exception as e:
+                    self.error_terakhir = f"Kompaksi gagal: {e}"
+
+    def mulai_sync_background(self):
+        threading.Thread(target=self._loop_background, name="sync-replika", daemon=True).start()
+        threading.Thread(target=self._loop_flush, name="flush-antrian", daemon=True).start()
+
+def _error_ambigu(e):
+    # 5xx / timeout / koneksi putus saat tulis: batch mungkin sudah diterapkan, tidak aman dikirim ulang buta
+    return _error_sementara(e) and not _error_sementara(e, baca=False)
+
+def _error_permanen(e):
+    # 4xx selain 429 (limit) tidak akan berhasil walau diulang
+    kode = getattr(e, "code", None)
+    return isinstance(kode, int) and 400 <= kode < 500 and kode != 429
+
+@st.cache_resource
+def get_replika():
+    replika = ReplikaSheet(REPLIKA_DB, get_gsheet_connection(), get_meta_sheet())
+    replika.mulai_sync_background()
+    return replika
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _baca_replika(sheet_name, versi_lokal):
+    return get_replika().baca(sheet_name)
+
+def simpan_batch(requests, pesan):
+    """Simpan aksi admin: langsung tampil di replika, dikirim ke Sheet di background (satu batchUpdate)."""
+    get_replika().antrikan(requests)
+    st.session_state['pesan_simpan'] = pesan
+
+def cari_banyak_baris(sheet_name, daftar_id):
+    """Pengganti worksheet.find: cari nomor baris lewat index ID lokal (hanya kolom ID, tanpa API).
+
+    Kesegaran dijaga sync background + antrian (tulisan sendiri langsung tampil di replika).
+    """
+    replika = get_replika()
+    hasil = [replika.baris_untuk(sheet_name, id_cari) for id_cari in daftar_id]
+    hilang = [str(i) for i, baris in zip(daftar_id, hasil) if baris is None]
+    if hilang:
+        raise ValueError(f"ID {', '.join(hilang)} tidak ditemukan di {sheet_name}")
+    return hasil
+
+def cari_baris(sheet_name, id_cari):
+    return cari_banyak_baris(sheet_name, [id_cari])[0]
+
+def baris_aset(id_aset):
+    """(nomor baris, masih aktif) aset di master_aset, termasuk yang non-aktif tapi belum dikompaksi. None jika tidak ada."""
+    replika = get_replika()
+    lokasi = replika.lokasi_untuk("master_aset", id_aset)
+    if lokasi is None:
+        return None
+    df = replika.query(
+        f'SELECT {SYARAT_HIDUP["master_aset"]} AS aktif FROM master_aset WHERE _baris = ?', [lokasi[1]]
+    )
+    return lokasi[1], bool(df['aktif'].iloc[0])
+
+# --- JEJAK ASET (LOG PER ID SYSTEM) ---
+AKSI_MENGUBAH_POSISI = ["Input Baru", "Mutasi", "Batal Mutasi", "Restore Aset"] + JENIS_LIKUIDASI
+# Awal keterangan log Edit Detail / Batal Mutasi yang kolom asetnya berisi data SEBELUM aksi.
+# Log lama tanpa penanda: Edit Detail berisi nama/harga/no_reg SESUDAH edit, Batal Mutasi berlokasi "System Restore".
+PENANDA_SEBELUM = "[Data sebelum aksi] "
+
+def log_sebelum(keterangan):
+    return str(keterangan).startswith(PENANDA_SEBELUM)
+
+def id_untuk_jejak(teks):
+    """ID System yang dimaksud teks: cocok persis dengan ID atau No Registrasi di master; jika tidak ada, teks itu sendiri."""
+    teks = teks.strip()
+    df = get_replika().query(
+        "SELECT DISTINCT id FROM master_aset WHERE id = ? OR no_registrasi = ? COLLATE NOCASE", [teks, teks]
+    ) if pastikan_tabel("master_aset") else pd.DataFrame(columns=['id'])
+    return df['id'].astype(str).tolist() or [teks]
+
+def aksi_sesudah(df_jejak, id_log):
+    """Log aset yang tercatat sesudah log id_log dan mengubah lokasi/status aset."""
+    posisi = df_jejak.index[df_jejak['id'].astype(str) == str(id_log)]
+    if posisi.empty:
+        return df_jejak.iloc[0:0]
+    sesudah = df_jejak.loc[posisi[-1]:].iloc[1:]
+    return sesudah[sesudah['jenis_aksi'].isin(AKSI_MENGUBAH_POSISI)]
+
+def tampilkan_jejak(df_jejak, sorot=None):
+    # Timeline satu aset, terlama di atas; sorot = ID log yang sedang dipilih
+    for row in df_jejak.to_dict('records'):
+        role = "user" if row['jenis_aksi'] == "Mutasi" else "assistant"
+        with st.chat_message(role):
+            tanda = "👉 " if sorot is not None and str(row['id']) == str(sorot) else ""
+            st.markdown(f"{tanda}**{row['_tanggal'] or row['tanggal']}** - **{row['jenis_aksi']}** - {row['nama_mesin']} (ID Log: {row['id']})")
+            sebelum = " (sebelum aksi)" if log_sebelum(row['keterangan']) else ""
+            st.markdown(f"📍 Lokasi{sebelum}: `{row['lokasi_asal']}` | Kat: `{row['kategori']}`")
+            st.markdown(f"📝 *{row['keterangan']}*")
+
+# --- PARTISI RIWAYAT LOG (PER TAHUN) ---
+def cari_log(id_log):
+    """(worksheet partisi, nomor baris) untuk satu ID log."""
+    replika = get_replika()
+    lokasi = replika.lokasi_untuk(TABEL_PARTISI, id_log)
+    if lokasi is None:
+        raise ValueError(f"ID {id_log} tidak ditemukan di {TABEL_PARTISI}")
+    return get_gsheet_connection().worksheet(lokasi[0]), lokasi[1]
+
+def kondisi_log(tgl_awal=None, tgl_akhir=None, kondisi=(), nilai=()):
+    """(where_sql, nilai) riwayat_log pada rentang tanggal (None = tanpa batas), setelah partisi yang beririsan dimuat."""
+    get_replika().pastikan_rentang(tgl_awal, tgl_akhir)
+    kondisi, nilai = [SYARAT_HIDUP[TABEL_PARTISI], *kondisi], list(nilai)
+    if tgl_awal:
+        kondisi.append("_tanggal >= ?")
+        nilai.append(tgl_awal.strftime('%Y-%m-%d'))
+    if tgl_akhir:
+        kondisi.append("_tanggal <= ?")
+        nilai.append(tgl_akhir.strftime('%Y-%m-%d'))
+    return " AND ".join(kondisi), nilai
+
+def query_log(tgl_awal=None, tgl_akhir=None, kondisi=(), nilai=(), urut="_id DESC"):
+    """SELECT riwayat_log pada rentang tanggal (None = tanpa batas). Hanya partisi yang beririsan yang diunduh."""
+    where_sql, nilai = kondisi_log(tgl_awal, tgl_akhir, kondisi, nilai)
+    if not get_replika().ada(TABEL_PARTISI):
+        return pd.DataFrame()
+    return get_replika().query(f"SELECT * FROM {TABEL_PARTISI} WHERE {where_sql} ORDER BY {urut}", nilai)
+
+def ws_log_aktif():
+    """Partisi tujuan log baru (tahun berjalan). Rollover otomatis: dibuat saat tulisan pertama di tahun baru."""
+    nama = nama_partisi(date.today())
+    replika, meta = get_replika(), get_meta_sheet()
+    if nama not in meta.daftar_partisi():
+        # Header mengikuti partisi yang sudah ada agar urutan kolom baris log tetap sama
+        header = next(
+            (replika.kolom_sheet(p) for p in replika.sheet_termuat() if tabel_dari_sheet(p) == TABEL_PARTISI),
+            None
+        ) or list(SKEMA_SHEET[TABEL_PARTISI])
+        meta.buat_partisi(nama, header)
+    replika.muat_partisi([nama])
+    return get_gsheet_connection().worksheet(nama)
+
+def req_tambah_log(rows_log):
+    """appendCells baris log ke partisi aktif + perbarui rentang tanggal partisi di manifest."""
+    ws = ws_log_aktif()
+    req_rentang = get_meta_sheet().req_rentang(ws.title, [baris[4] for baris in rows_log])  # kolom 5 = tanggal
+    return [req_tambah_baris(ws, rows_log)] + ([req_rentang] if req_rentang else [])
+
 # --- FUNGSI BANTUAN (HELPER) ---
+def pastikan_tabel(sheet_name):
+    # Sync penuh sekali jika tabel belum pernah dimuat ke replika
+    replika = get_replika()
+    if not replika.ada(sheet_name):
+        replika.sync(paksa=True)
+    return replika.ada(sheet_name)
+
 def load_data(sheet_name):
-    sh = get_gsheet_connection()
-    worksheet = sh.worksheet(sheet_name)
-    data = worksheet.get_all_records()
-    df = pd.DataFrame(data)
-    
-    # Standarisasi header jadi huruf kecil semua
-    df.columns = df.columns.str.lower()
-    
-    # Rename kolom tanggal manual jika ada variasi nama
-    rename_map = {
-        'tgl': 'tanggal',
-        'date': 'tanggal',
-        'tanggal_kejadian': 'tanggal'
-    }
-    df.rename(columns=rename_map, inplace=True)
-
-    # Pastikan ID jadi string
-    if not df.empty and 'id' in df.columns:
-        df['id'] = df['id'].astype(str)
-        
-    return df
-
-def generate_id(sheet_name="master_aset"):
-    """Generate ID numerik baru berdasarkan sheet tertentu"""
-    sh = get_gsheet_connection()
-    worksheet = sh.worksheet(sheet_name)
-    ids = worksheet.col_values(1)  # Ambil kolom pertama (ID)
-    
-    # Bersihkan header 'id' jika ikut terambil
-    if ids and ids[0].lower() == 'id':
-        ids.pop(0)
-        
-    if not ids:
-        return "1"
-        
-    # Cari angka terbesar
-    numeric_ids = [int(x) for x in ids if str(x).isdigit()]
-    if not numeric_ids:
-        return "1"
-        
-    new_id = max(numeric_ids) + 1
-    return str(new_id)
+    # Baca dari replika lokal; cache dibagi semua sesi dan ikut berganti saat replika berubah
+    pastikan_tabel(sheet_name)
+    return _baca_replika(sheet_name, get_replika().versi_lokal.get(sheet_name, 0))
+
+def harga_ke_int(nilai):
+    # Ambil angka saja dari teks harga ("Rp 1.500.000" -> 1500000)
+    angka = ''.join(filter(str.isdigit, str(nilai)))
+    return int(angka) if angka else 0
+
+# --- BATCH UPDATE (SATU REQUEST API PER AKSI ADMIN) ---
+def _sel(nilai):
+    # Sama seperti append_row mode RAW: angka tetap angka, selain itu teks apa adanya
+    if hasattr(nilai, 'item'):
+        nilai = nilai.item()
+    if isinstance(nilai, (int, float)) and not isinstance(nilai, bool):
+        return {"userEnteredValue": {"numberValue": nilai}}
+    return {"userEnteredValue": {"stringValue": "" if nilai is None else str(nilai)}}
+
+def req_ubah_sel(ws, baris, kolom_awal, nilai):
+    """Request updateCells: tulis list nilai mulai dari (baris, kolom_awal), nomor 1-based seperti update_cell."""
+    return {"updateCells": {
+        "start": {"sheetId": ws.id, "rowIndex": baris - 1, "columnIndex": kolom_awal - 1},
+        "rows": [{"values": [_sel(v) for v in nilai]}],
+        "fields": "userEnteredValue"
+    }}
+
+def req_tambah_baris(ws, daftar_baris):
+    """Request appendCells: tambah baris di bawah data terakhir (setara append_row/append_rows)."""
+    return {"appendCells": {
+        "sheetId": ws.id,
+        "rows": [{"values": [_sel(v) for v in baris]} for baris in daftar_baris],
+        "fields": "userEnteredValue"
+    }}
+
+def req_hapus_baris(ws, baris):
+    """Request deleteDimension untuk satu baris (1-based)."""
+    return {"deleteDimension": {
+        "range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": baris - 1, "endIndex": baris}
+    }}
+
+def req_hapus_banyak_baris(ws, daftar_baris):
+    """deleteDimension per blok baris berurutan, dari bawah ke atas agar nomor baris di atasnya tidak bergeser."""
+    requests = []
+    for baris in sorted(set(daftar_baris), reverse=True):
+        if requests and requests[-1]["deleteDimension"]["range"]["startIndex"] == baris:
+            requests[-1]["deleteDimension"]["range"]["startIndex"] = baris - 1
+        else:
+            requests.append(req_hapus_baris(ws, baris))
+    return requests
+
+# --- WORKSHEET _meta: ALOKASI ID (HIGH-WATER MARK) & MANIFEST PARTISI LOG ---
+SHEET_META = "_meta"
+META_BARIS_CADANGAN = 50  # Baris kosong minimal di _meta untuk kunci baru (partisi:*, id_terakhir:*)
+
+class MetaSheet:
+    """Isi worksheet _meta (kolom kunci | nilai), dibaca sekali lalu di-cache di memori.
+
+    - id_terakhir:<sheet>  : ID terakhir yang sudah dipakai, agar ID baru tidak perlu scan kolom ID.
+      Hanya unik dalam SATU proses aplikasi (lock threading + nilai ikut antrian tulis): dua proses/server
+      yang menulis ke spreadsheet yang sama bisa membagikan ID yang sama sebelum antrian terkirim.
+    - partisi:<worksheet>  : partisi riwayat_log beserta rentang tanggal isinya ("YYYY-MM-DD|YYYY-MM-DD").
+    Perubahan nilai dikembalikan sebagai request batchUpdate agar ikut terkirim bersama aksi admin.
+    """
+
+    def __init__(self, sh):
+        self.sh = sh
+        self._lock = threading.RLock()
+        self._ws_meta = None
+        self._isi = {}          # kunci -> (nomor baris di _meta, nilai teks)
+        self._hwm = {}          # sheet -> ID terbesar yang sudah dipakai/dicadangkan
+        self._ada_log_lama = None
+
+    def _muat_meta(self):
+        # Cache miss: baca _meta sekali (buat jika belum ada)
+        try:
+            self._ws_meta = self.sh.worksheet(SHEET_META)
+        except gspread.WorksheetNotFound:
+            self._ws_meta = self.sh.add_worksheet(title=SHEET_META, rows=100, cols=2)
+            self._ws_meta.update([["kunci", "nilai"]], "A1")
+        values = self._ws_meta.get_all_values()
+        if self._ws_meta.row_count - len(values) < META_BARIS_CADANGAN:
+            # Kunci baru ditulis lewat updateCells di baris kosong berikutnya -> grid harus cukup panjang
+            self._ws_meta.add_rows(META_BARIS_CADANGAN * 2)
+        self._isi = {}
+        for i, baris in enumerate(values[1:], start=2):
+            if baris and baris[0]:
+                self._isi[baris[0]] = (i, str(baris[1]) if len(baris) > 1 else "")
+
+    def _req_tulis(self, kunci, nilai):
+        # Panggil dengan self._lock dipegang
+        if self._ws_meta is None:
+            self._muat_meta()
+        baris = self._isi.get(kunci, (None, ""))[0]
+        if baris is None:
+            baris = max([b for b, _ in self._isi.values()] + [1]) + 1
+        self._isi[kunci] = (baris, str(nilai))
+        return req_ubah_sel(self._ws_meta, baris, 1, [kunci, nilai])
+
+    def cadangkan(self, sheet_name, jumlah=1):
+        """Cadangkan `jumlah` ID berurutan. Return (list ID string, request update _meta untuk simpan_batch).
+
+        Aman antar sesi dalam satu proses (self._lock); tidak mengunci proses aplikasi lain (lihat docstring kelas).
+        """
+        kunci = f"id_terakhir:{sheet_name}"
+        with self._lock:
+            if self._ws_meta is None:
+                self._muat_meta()
+            nilai_meta = self._isi.get(kunci, (None, ""))[1]
+            nilai_meta = int(nilai_meta) if nilai_meta.isdigit() else 0
+
+            # ID terbesar di replika lokal (query lokal, tanpa API) -> aman terhadap input dari luar aplikasi
+            df_max = get_replika().query(f'SELECT MAX(_id) AS m FROM "{sheet_name}"') if get_replika().ada(sheet_name) else pd.DataFrame()
+            max_lokal = int(df_max['m'].iloc[0]) if not df_max.empty and pd.notna(df_max['m'].iloc[0]) else 0
+
+            awal = max(self._hwm.get(sheet_name, 0), nilai_meta, max_lokal) + 1
+            self._hwm[sheet_name] = awal + jumlah - 1
+            ids = [str(i) for i in range(awal, awal + jumlah)]
+            return ids, self._req_tulis(kunci, self._hwm[sheet_name])
+
+    # --- MANIFEST PARTISI LOG ---
+    def daftar_partisi(self):
+        """{nama worksheet: (tgl_min, tgl_max)}. Rentang kosong = belum diketahui (selalu dianggap beririsan)."""
+        with self._lock:
+            if self._ws_meta is None:
+                self._muat_meta()
+            partisi = {
+                kunci.split(":", 1)[1]: tuple((nilai.split("|") + [""])[:2])
+                for kunci, (_, nilai) in self._isi.items() if kunci.startswith("partisi:")
+            }
+            if TABEL_PARTISI not in partisi:
+                # Sheet riwayat_log lama (sebelum dipecah per tahun) tetap dibaca jika masih ada
+                if self._ada_log_lama is None:
+                    try:
+                        self.sh.worksheet(TABEL_PARTISI)
+                        self._ada_log_lama = True
+                    except gspread.WorksheetNotFound:
+                        self._ada_log_lama = False
+                if self._ada_log_lama:
+                    partisi[TABEL_PARTISI] = ("", "")
+            return partisi
+
+    def partisi_beririsan(self, tgl_awal=None, tgl_akhir=None):
+        awal = tgl_awal.strftime('%Y-%m-%d') if tgl_awal else None
+        akhir = tgl_akhir.strftime('%Y-%m-%d') if tgl_akhir else None
+        return sorted(
+            nama for nama, (tgl_min, tgl_max) in self.daftar_partisi().items()
+            if not tgl_min or not tgl_max
+            or ((akhir is None or tgl_min <= akhir) and (awal is None or tgl_max >= awal))
+        )
+
+    def req_rentang(self, nama, daftar_tanggal):
+        """Perlebar rentang tanggal partisi setelah ditambah/diedit. None jika tidak berubah."""
+        tanggal = sorted(str(t)[:10] for t in daftar_tanggal if t)
+        if not tanggal or nama == TABEL_PARTISI:
+            return None  # Rentang sheet lama tidak dilacak
+        kunci = f"partisi:{nama}"
+        with self._lock:
+            if self._ws_meta is None:
+                self._muat_meta()
+            tgl_min, tgl_max = (self._isi.get(kunci, (None, ""))[1].split("|") + [""])[:2]
+            baru = (min(filter(None, [tgl_min, tanggal[0]])), max(filter(None, [tgl_max, tanggal[-1]])))
+            if baru == (tgl_min, tgl_max):
+                return None
+            return self._req_tulis(kunci, "|".join(baru))
+
+    def buat_partisi(self, nama, header):
+        """Rollover: buat worksheet partisi baru dan daftarkan di manifest (langsung, tidak lewat antrian)."""
+        with self._lock:
+            if nama in self.daftar_partisi():
+                return
+            try:
+                ws = self.sh.add_worksheet(title=nama, rows=1000, cols=len(header))
+                ws.update([header], "A1")
+            except gspread.exceptions.APIError:
+                self.sh.worksheet(nama)  # Sudah dibuat proses lain
+            requests = [self._req_tulis(f"partisi:{nama}", "")]
+            if self._ada_log_lama and f"partisi:{TABEL_PARTISI}" not in self._isi:
+                requests.append(self._req_tulis(f"partisi:{TABEL_PARTISI}", ""))
+            self.sh.batch_update({"requests": requests})
+
+@st.cache_resource
+def get_meta_sheet():
+    return MetaSheet(get_gsheet_connection())
+
+def cadangkan_id(sheet_name, jumlah=1):
+    return get_meta_sheet().cadangkan(sheet_name, jumlah)
+
+OPSI_MAKS = 200  # Opsi per halaman selectbox; data lebih banyak dipecah per halaman
+
+def pilih_id(label, df, susun_label, key):
+    """Selectbox atas ID (format_func), bukan atas teks label.
+
+    Label disusun vektor (susun_label: frame -> Series) hanya untuk opsi di halaman aktif,
+    dan baris terpilih diambil lewat frame ber-index ID. Return Series baris terpilih atau None.
+    """
+    if df.empty:
+        return None
+    df_id = df.set_index(df['id'].astype(str))
+    df_id = df_id[~df_id.index.duplicated()]
+    if len(df_id) > OPSI_MAKS:
+        jumlah_hal = -(-len(df_id) // OPSI_MAKS)
+        if st.session_state.get(f"{key}_hal", 1) > jumlah_hal:
+            st.session_state[f"{key}_hal"] = jumlah_hal
+        hal = st.number_input(
+            f"Halaman pilihan (dari {jumlah_hal}, total {len(df_id)} data)", min_value=1, max_value=jumlah_hal, key=f"{key}_hal"
+        )
+        df_hal = df_id.iloc[(hal - 1) * OPSI_MAKS:hal * OPSI_MAKS]
+    else:
+        df_hal = df_id
+    label_id = susun_label(df_hal.astype(str))
+    id_pilih = st.selectbox(label, df_hal.index, format_func=label_id.get, key=key)
+    return df_id.loc[id_pilih] if id_pilih is not None else None
+
+def label_aset(df):
+    return df['nama_mesin'] + " | " + df['id'] + " | " + df['lokasi_toko']
+
+def pilih_aset_banyak(df_master, key):
+    """Pilihan aset massal: multiselect, tempel daftar ID, atau upload CSV/Excel. Return baris master yang valid."""
+    label = dict(zip(df_master['id'], df_master['nama_mesin'] + " | " + df_master['id'] + " | " + df_master['lokasi_toko']))
+    ids = list(st.multiselect("Pilih Aset:", df_master['id'], format_func=label.get, key=f"multi_{key}"))
+
+    teks = st.text_area("Atau tempel daftar ID System (pisahkan dengan koma / baris baru):", key=f"tempel_{key}")
+    ids += [i for i in re.split(r"[\s,;]+", teks) if i]
+
+    file = st.file_uploader("Atau upload CSV/Excel berisi kolom 'id':", type=["csv", "xlsx"], key=f"file_{key}")
+    if file is not None:
+        df_up = pd.read_csv(file, dtype=str) if file.name.endswith(".csv") else pd.read_excel(file, dtype=str)
+        df_up.columns = normalisasi_header(df_up.columns)
+        kolom_id = 'id' if 'id' in df_up.columns else df_up.columns[0]
+        ids += df_up[kolom_id].dropna().str.strip().tolist()
+
+    ids = list(dict.fromkeys(ids))  # Buang duplikat, urutan tetap
+    tidak_ada = [i for i in ids if i not in label]
+    if tidak_ada:
+        st.error(f"{len(tidak_ada)} ID tidak ada di Master Aset dan diabaikan: {', '.join(tidak_ada[:20])}{' ...' if len(tidak_ada) > 20 else ''}")
+
+    df_pilih = df_master[df_master['id'].isin(ids)]
+    if not df_pilih.empty:
+        st.caption(f"{len(df_pilih)} aset terpilih")
+        st.dataframe(df_pilih[['id', 'nama_mesin', 'lokasi_toko', 'kategori']], hide_index=True)
+    return df_pilih
+
+def reset_pilihan_banyak(key):
+    # Kosongkan pilihan setelah tersimpan agar ID yang sudah diproses tidak terkirim dua kali
+    for prefix in ("multi_", "tempel_", "file_"):
+        st.session_state.pop(f"{prefix}{key}", None)
+
+def baris_log_aset(log_id, aset, jenis_aksi, tanggal, keterangan):
+    # Susunan kolom riwayat_log untuk aksi atas satu baris master
+    return [
+        log_id,
+        aset['lokasi_toko'],
+        aset['kategori'],
+        jenis_aksi,
+        tanggal,
+        aset['nama_mesin'],
+        harga_ke_int(aset['harga_beli']),
+        str(aset['no_registrasi']),
+        aset['id'],
+        keterangan
+    ]
+
+# --- IMPORT MASSAL ASET BARU ---
+KOLOM_IMPORT = ['lokasi_toko', 'kategori', 'nama_mesin', 'harga_beli', 'no_registrasi']
+ALIAS_IMPORT = {'lokasi': 'lokasi_toko', 'toko': 'lokasi_toko', 'nama': 'nama_mesin', 'harga': 'harga_beli', 'no_reg': 'no_registrasi'}
+
+def validasi_import(df_up, df_master, izinkan_baru):
+    """Validasi & normalisasi file import secara vektor. Return (df_valid, df_error)."""
+    df = df_up.copy()
+    df.columns = [ALIAS_IMPORT.get(k, k) for k in normalisasi_header(df.columns)]
+    for kolom in KOLOM_IMPORT:
+        if kolom not in df.columns:
+            df[kolom] = ''
+    df = df[KOLOM_IMPORT].fillna('').astype(str).apply(lambda s: s.str.strip())
+    df.insert(0, 'baris_file', df.index + 2)  # Nomor baris di Excel (baris 1 = header)
+
+    # Samakan penulisan lokasi/kategori dengan yang sudah ada (tidak peka huruf besar/kecil)
+    baru = {}
+    for kolom in ['lokasi_toko', 'kategori']:
+        peta = {v.lower(): v for v in df_master[kolom].unique()} if not df_master.empty else {}
+        kanonik = df[kolom].str.lower().map(peta)
+        baru[kolom] = kanonik.isna() & (df[kolom] != '')
+        df[kolom] = kanonik.fillna(df[kolom])
+
+    harga_angka = df['harga_beli'].str.replace(r'[^\d]', '', regex=True)
+    noreg = df['no_registrasi'].str.upper()
+    noreg_master = set(df_master['no_registrasi'].astype(str).str.strip().str.upper()) - {''} if not df_master.empty else set()
+
+    aturan = [
+        (df['nama_mesin'] == '', "Nama mesin kosong"),
+        (df['lokasi_toko'] == '', "Lokasi kosong"),
+        (df['kategori'] == '', "Kategori kosong"),
+        ((df['harga_beli'] != '') & (harga_angka == ''), "Harga beli bukan angka"),
+        ((noreg != '') & noreg.duplicated(keep=False), "No registrasi ganda di dalam file"),
+        ((noreg != '') & noreg.isin(noreg_master), "No registrasi sudah ada di Master Aset"),
+    ]
+    if not izinkan_baru:
+        aturan += [
+            (baru['lokasi_toko'], "Lokasi belum terdaftar"),
+            (baru['kategori'], "Kategori belum terdaftar"),
+        ]
+    df_error = pd.concat(
+        [pd.DataFrame({'baris_file': df.loc[mask, 'baris_file'], 'masalah': pesan}) for mask, pesan in aturan],
+        ignore_index=True
+    ).sort_values('baris_file', kind='stable')
+
+    df['harga_beli'] = pd.to_numeric(harga_angka, errors='coerce').fillna(0).astype(int)
+    df_valid = df[~df['baris_file'].isin(df_error['baris_file'])]
+    return df_valid, df_error
 
 def convert_df_to_excel(df):
     output = io.BytesIO()
@@ -101,35 +1463,340 @@ def convert_df_to_excel(df):
     processed_data = output.getvalue()
     return processed_data
 
-# ==========================================
-# 🔐 SISTEM LOGIN
-# ==========================================
-if 'status_login' not in st.session_state:
-    st.session_state['status_login'] = False
+def excel_dari_query(sql, nilai=()):
+    # Export penuh (dipanggil hanya saat tombol download diklik)
+    df = get_replika().query(sql, nilai)
+    return convert_df_to_excel(df.drop(columns=[c for c in df.columns if c.startswith('_')]))
 
-def proses_login():
-    user_env = os.getenv("ADMIN_USER", "admin")
-    pass_env = os.getenv("ADMIN_PASS", "admin")
-    
-    if st.session_state['input_user'] == user_env and st.session_state['input_pass'] == pass_env:
-        st.session_state['status_login'] = True
-    else:
-        st.error("❌ Username atau Password salah!")
+# --- PENCARIAN ASET (INDEX TOKEN & PREFIX) ---
+KOLOM_CARI = ["nama_mesin", "id", "no_registrasi"]
+POLA_TOKEN = re.compile(r'[^\W_]+')
 
-def proses_logout():
-    st.session_state['status_login'] = False
-    st.rerun()
+def tokenisasi(teks):
+    # "REG-001 Mesin" -> ["reg", "001", "mesin"]
+    return POLA_TOKEN.findall(str(teks).lower())
 
-if not st.session_state['status_login']:
-    st.markdown("## 🔒 Login Sistem Aset (Cloud)")
-    st.info("Silakan login untuk mengakses data perusahaan.")
-    
-    col1, col2, col3 = st.columns([1, 1, 2])
-    with col1:
-        st.text_input("Username", key="input_user")
-        st.text_input("Password", type="password", key="input_pass")
-        st.button("Masuk", on_click=proses_login)
-    st.stop()
+class IndeksCari:
+    """Index token & prefix untuk pencarian aset di KOLOM_CARI.
+
+    Pasangan (token, posisi baris) disimpan urut per token, sehingga semua token berawalan q
+    berada di satu potongan array (dua binary search). Query banyak kata = irisan hasil per kata.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        kolom = [k for k in KOLOM_CARI if k in self.df.columns]
+        teks = pd.concat([self.df[k].astype(str).str.lower() for k in kolom]) if kolom else pd.Series(dtype=object)
+        pasangan = teks.str.findall(POLA_TOKEN).explode().dropna()
+        pasangan = pd.DataFrame({"token": pasangan.to_numpy(dtype=str), "posisi": pasangan.index.to_numpy()})
+        pasangan = pasangan.drop_duplicates().sort_values(["token", "posisi"])
+        self.token = pasangan["token"].to_numpy(dtype=str)
+        self.posisi = pasangan["posisi"].to_numpy(dtype=np.int64)
+        self.id = self.df['id'].astype(str).to_numpy() if 'id' in self.df.columns else np.empty(0, dtype=str)
+
+    def _rentang(self, kata):
+        awal = np.searchsorted(self.token, kata, side='left')
+        return awal, np.searchsorted(self.token, kata + "\U0010ffff", side='left')
+
+    def cari(self, teks):
+        """Posisi baris (urut) yang setiap kata di teks-nya menjadi awalan salah satu token."""
+        rentang = sorted((self._rentang(kata) for kata in dict.fromkeys(tokenisasi(teks))), key=lambda r: r[1] - r[0])
+        if not rentang:
+            return np.empty(0, dtype=np.int64)
+        # Mulai dari kata paling selektif, lalu saring kandidat dengan binary search di kata berikutnya
+        awal, akhir = rentang[0]
+        hasil = np.unique(self.posisi[awal:akhir])
+        for awal, akhir in rentang[1:]:
+            if not len(hasil):
+                break
+            posisi = self.posisi[awal:akhir]
+            if awal < akhir and self.token[awal] != self.token[akhir - 1]:
+                posisi = np.unique(posisi)  # Beberapa token berawalan sama -> gabung dulu
+            letak = np.minimum(np.searchsorted(posisi, hasil), max(len(posisi) - 1, 0))
+            hasil = hasil[posisi[letak] == hasil] if len(posisi) else posisi
+        return hasil
+
+    def id_cocok(self, teks):
+        return self.id[self.cari(teks)]
+
+    def baris(self, teks):
+        return self.df.iloc[self.cari(teks)]
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def indeks_master(versi_lokal):
+    # Dibangun sekali per versi replika master_aset (hanya aset aktif), dibagi semua sesi
+    return IndeksCari(_baca_replika("master_aset", versi_lokal))
+
+def indeks_aset():
+    """Index pencarian master_aset versi terbaru."""
+    pastikan_tabel("master_aset")
+    return indeks_master(get_replika().versi_lokal.get("master_aset", 0))
+
+# --- TABEL BERHALAMAN (HANYA HALAMAN AKTIF YANG DIAMBIL & DIFORMAT) ---
+UKURAN_HALAMAN = [25, 50, 100, 250]
+
+def format_rupiah(seri):
+    # Dipanggil untuk satu halaman saja (paling banyak beberapa ratus baris)
+    angka = pd.to_numeric(seri, errors='coerce').fillna(0)
+    return pd.Series([f"Rp {x:,.0f}".replace(",", ".") for x in angka], index=seri.index, dtype=object)
+
+def tabel_halaman(key, sumber, nilai, kolom, urut_awal, turun_awal=False, ekspresi_urut=None):
+    """Tampilkan SELECT ... FROM <sumber> per halaman (LIMIT/OFFSET di replika).
+
+    kolom = {nama tampil: ekspresi SQL}. Kolom urut, arah, ukuran & nomor halaman disimpan di session_state
+    (key widget), jadi hanya baris halaman aktif yang diambil, diformat, dan dikirim ke browser.
+    """
+    replika = get_replika()
+    ekspresi_urut = {**kolom, **(ekspresi_urut or {})}
+    total = int(replika.query(f"SELECT COUNT(*) AS n FROM {sumber}", nilai)['n'].iloc[0])
+
+    c_urut, c_arah, c_ukuran, c_hal = st.columns([2, 1, 1, 1])
+    urut = c_urut.selectbox("Urutkan", list(kolom), index=list(kolom).index(urut_awal), key=f"{key}_urut")
+    arah = "DESC" if c_arah.selectbox("Arah", ["Naik", "Turun"], index=int(turun_awal), key=f"{key}_arah") == "Turun" else "ASC"
+    ukuran = c_ukuran.selectbox("Baris / halaman", UKURAN_HALAMAN, index=1, key=f"{key}_ukuran")
+    jumlah_hal = max(1, -(-total // ukuran))
+    tanda_sumber = (sumber, tuple(nilai))
+    if st.session_state.get(f"{key}_sumber") != tanda_sumber:
+        st.session_state[f"{key}_sumber"] = tanda_sumber
+        st.session_state[f"{key}_hal"] = 1  # Filter berubah -> kembali ke halaman pertama
+    elif st.session_state.get(f"{key}_hal", 1) > jumlah_hal:
+        st.session_state[f"{key}_hal"] = jumlah_hal  # Data berkurang (mis. aset dilikuidasi)
+    hal = c_hal.number_input(f"Halaman (dari {jumlah_hal})", min_value=1, max_value=jumlah_hal, key=f"{key}_hal")
+
+    select_sql = ", ".join(f'{ekspresi} AS "{nama}"' for nama, ekspresi in kolom.items())
+    df = replika.query(
+        f"SELECT {select_sql} FROM {sumber} "
+        f"ORDER BY {ekspresi_urut[urut]} {arah}, _partisi {arah}, _baris {arah} LIMIT ? OFFSET ?",
+        [*nilai, ukuran, (hal - 1) * ukuran]
+    )
+    # Format Rupiah hanya untuk baris di halaman ini
+    if 'harga_beli' in df.columns:
+        df['harga_beli'] = format_rupiah(df['harga_beli'])
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption(f"Baris {(hal - 1) * ukuran + 1 if total else 0}–{min(hal * ukuran, total)} dari {total}")
+    return total
+
+# --- REKAP: KUBUS LOKASI x KATEGORI ---
+REKAP_BARIS_PER_HALAMAN = 50  # Lokasi per halaman tabel heatmap
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def kubus_rekap(versi_lokal):
+    """Jumlah aset aktif per lokasi x kategori, dihitung sekali per versi replika (dibagi semua sesi)."""
+    df = get_replika().query(
+        f"SELECT lokasi_toko, kategori, COUNT(*) AS jumlah FROM master_aset "
+        f"WHERE {SYARAT_HIDUP['master_aset']} GROUP BY lokasi_toko, kategori"
+    )
+    if df.empty:
+        return pd.DataFrame(dtype='int64')
+    return df.pivot(index='lokasi_toko', columns='kategori', values='jumlah').fillna(0).astype('int64')
+
+def potong_kubus(kubus, sel_lokasi, sel_kategori):
+    """Irisan kubus sesuai filter (kosong = semua), tanpa lokasi/kategori yang jumlahnya nol."""
+    pivot = kubus.reindex(index=sel_lokasi or kubus.index, columns=sel_kategori or kubus.columns, fill_value=0)
+    return pivot.loc[pivot.sum(axis=1) > 0, pivot.sum(axis=0) > 0]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def excel_rekap(versi_lokal, sel_lokasi, sel_kategori):
+    pivot = potong_kubus(kubus_rekap(versi_lokal), list(sel_lokasi), list(sel_kategori))
+    pivot["TOTAL"] = pivot.sum(axis=1)
+    pivot.loc["TOTAL"] = pivot.sum(axis=0)
+    return convert_df_to_excel(pivot.rename_axis("lokasi_toko").reset_index())
+
+TREN_GARIS_MAKS = 10  # Garis terbanyak di grafik tren; sisanya digabung jadi "Lainnya"
+DIMENSI_TREN = {"Jenis Aksi": "jenis_aksi", "Lokasi Asal": "lokasi_asal", "Kategori": "kategori"}
+UKURAN_TREN = {"Jumlah Transaksi": "jumlah", "Nilai (Rp)": "nilai"}
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def tren_bulanan(versi_lokal):
+    """Bucket bulanan log (sudah teragregasi di _tren), dibaca sekali per versi replika log."""
+    return get_replika().query(f"SELECT bulan, {', '.join(KUNCI_TREN)}, jumlah, nilai FROM _tren WHERE jumlah <> 0 ORDER BY bulan")
+
+def pivot_tren(df, dimensi, ukuran, bulan_awal, bulan_akhir):
+    """Bulan x nilai dimensi; bulan tanpa transaksi tetap muncul (nol)."""
+    pivot = df.pivot_table(index='bulan', columns=dimensi, values=ukuran, aggfunc='sum', fill_value=0)
+    semua_bulan = pd.period_range(bulan_awal, bulan_akhir, freq='M').strftime('%Y-%m')
+    return pivot.reindex(semua_bulan, fill_value=0).rename_axis('bulan').astype('int64')
+
+# --- INVENTARIS PER TANGGAL (SNAPSHOT AKHIR BULAN + REPLAY LOG MUNDUR) ---
+KOLOM_INVENTARIS = ["id", "lokasi_toko", "kategori", "nama_mesin", "harga_beli", "no_registrasi"]
+POLA_LOG_ID = re.compile(r"Log ID (\d+)")
+
+def akhir_bulan(tanggal):
+    return (tanggal.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+class SnapshotInventaris:
+    """Isi master_aset pada tanggal lampau: mulai dari snapshot terdekat lalu batalkan log sesudah tanggal itu.
+
+    Snapshot disimpan per akhir bulan di tabel _snapshot replika (JSON per kolom, dikompres zlib).
+    Snapshot terbaru diturunkan dari master saat ini, yang lebih lama dari snapshot bulan sesudahnya,
+    jadi satu query paling banyak me-replay log satu bulan.
+
+    Snapshot dianggap masih berlaku jika `dasar`-nya sama: tanda snapshot sesudahnya + checksum log
+    bulan itu (_tren.cek). Log yang dikoreksi, dihapus, atau ditulis mundur tanggal membuat snapshot
+    bulan terkait (dan yang lebih lama) dihitung ulang saat dibutuhkan.
+    """
+
+    def __init__(self, replika):
+        self.replika = replika
+        with replika._lock:
+            replika.conn.execute(
+                "CREATE TABLE IF NOT EXISTS _snapshot (tanggal TEXT PRIMARY KEY, dasar TEXT, tanda TEXT, isi BLOB)"
+            )
+            replika.conn.commit()
+
+    # --- FORMAT SIMPAN ---
+    @staticmethod
+    def _kode(inventaris):
+        """{id: [kolom...]} -> (tanda, blob). Urut ID agar tanda sama untuk isi yang sama."""
+        ids = sorted(inventaris)
+        kolom = [ids] + [list(nilai) for nilai in zip(*(inventaris[i] for i in ids))] if ids else []
+        mentah = json.dumps(kolom, separators=(",", ":")).encode()
+        return hashlib.sha1(mentah).hexdigest(), zlib.compress(mentah)
+
+    @staticmethod
+    def _buka(blob):
+        kolom = json.loads(zlib.decompress(blob))
+        return {i: list(nilai) for i, *nilai in zip(*kolom)} if kolom else {}
+
+    def _simpan(self, tanggal, dasar, inventaris):
+        tanda, blob = self._kode(inventaris)
+        with self.replika._lock:
+            self.replika.conn.execute(
+                "INSERT OR REPLACE INTO _snapshot (tanggal, dasar, tanda, isi) VALUES (?, ?, ?, ?)",
+                (tanggal.isoformat(), dasar, tanda, blob)
+            )
+            self.replika.conn.commit()
+        return tanda
+
+    def _muat(self, tanggal):
+        return self._buka(self.replika.query(
+            "SELECT isi FROM _snapshot WHERE tanggal = ?", [tanggal.isoformat()]
+        )['isi'].iloc[0])
+
+    # --- REPLAY ---
+    def _master(self):
+        df = self.replika.baca("master_aset")
+        if df.empty:
+            return {}
+        df = df.reindex(columns=KOLOM_INVENTARIS, fill_value="").astype(str)
+        return {baris[0]: list(baris[1:]) for baris in df.itertuples(index=False)}
+
+    def _log(self, setelah, sampai=None):
+        """Log hidup dengan setelah < tanggal <= sampai, terbaru dulu (urutan pembatalan)."""
+        kondisi, nilai = ["_tanggal > ?", SYARAT_HIDUP["riwayat_log"]], [setelah.isoformat()]
+        if sampai:
+            kondisi.append("_tanggal <= ?")
+            nilai.append(sampai.isoformat())
+        return self.replika.query(
+            f"SELECT * FROM riwayat_log WHERE {' AND '.join(kondisi)} ORDER BY _tanggal DESC, _id DESC", nilai
+        )
+
+    def _tujuan_mutasi(self, keterangan):
+        # Log "Batal Mutasi" lama: lokasi sebelum dibatalkan = tujuan log Mutasi yang dirujuk ("Pindah ke X. ...").
+        # Dicocokkan dengan lokasi yang dikenal (terpanjang dulu), karena nama lokasi boleh mengandung ". "
+        cocok = POLA_LOG_ID.search(str(keterangan))
+        if not cocok:
+            return None
+        df = self.replika.query("SELECT keterangan FROM riwayat_log WHERE id = ? LIMIT 1", [cocok.group(1)])
+        if df.empty:
+            return None
+        teks = str(df['keterangan'].iloc[0])
+        lokasi = self.replika.query(
+            "SELECT lokasi_toko AS lokasi FROM master_aset UNION SELECT lokasi_asal FROM riwayat_log"
+        )['lokasi'].dropna().astype(str)
+        return next(
+            (lok for lok in sorted(lokasi, key=len, reverse=True)
+             if teks == f"Pindah ke {lok}." or teks.startswith(f"Pindah ke {lok}. ")),
+            None
+        )
+
+    def _mundur(self, inventaris, df_log):
+        """Batalkan log (terbaru dulu) terhadap inventaris {id: [lokasi, kategori, nama, harga, no_reg]}.
+
+        Kolom aset di log Mutasi/Likuidasi dan log bertanda PENANDA_SEBELUM = keadaan aset SEBELUM aksi,
+        jadi membatalkannya cukup memasang kolom itu kembali. Log lama tanpa penanda:
+        - Edit Detail: nama/harga/no_reg di log = nilai baru -> hanya lokasi & kategori yang dipulihkan.
+        - Batal Mutasi: lokasi sebelum dibatalkan = tujuan log Mutasi yang dirujuk.
+        """
+        # Semua nilai disimpan sebagai teks (sama dengan _master) agar tanda snapshot stabil
+        df_log = df_log.reindex(columns=KOLOM_JEJAK).fillna("").astype(str)
+        for log in df_log.to_dict('records'):
+            id_aset, aksi = log['no_reg_system'], log['jenis_aksi']
+            if not id_aset:
+                continue
+            if aksi in ("Input Baru", "Restore Aset"):
+                # Sebelum aksi ini aset belum ada / masih non-aktif
+                inventaris.pop(id_aset, None)
+            elif aksi in ["Mutasi", "Edit Detail", "Batal Mutasi"] + JENIS_LIKUIDASI:
+                sebelum = [log['lokasi_asal'], log['kategori'], log['nama_mesin'], log['harga_beli'], log['no_registrasi']]
+                if aksi == "Edit Detail" and not log_sebelum(log['keterangan']) and id_aset in inventaris:
+                    sebelum[2:] = inventaris[id_aset][2:]
+                elif aksi == "Batal Mutasi" and not log_sebelum(log['keterangan']):
+                    if id_aset not in inventaris:
+                        continue
+                    sebelum = list(inventaris[id_aset])
+                    sebelum[0] = self._tujuan_mutasi(log['keterangan']) or sebelum[0]
+                inventaris[id_aset] = sebelum
+        return inventaris
+
+    # --- QUERY ---
+    def pada(self, tanggal):
+        """DataFrame inventaris aktif pada akhir hari `tanggal`."""
+        hari_ini = date.today()
+        if tanggal >= hari_ini:
+            inventaris = self._master()
+        else:
+            self.replika.pastikan_rentang(tanggal, None)  # Semua log sesudah tanggal harus ada di replika
+            titik = hari_ini.replace(day=1) - timedelta(days=1)  # Akhir bulan lalu (snapshot terbaru)
+            if tanggal > titik:
+                inventaris = self._mundur(self._master(), self._log(tanggal))
+            else:
+                inventaris = self._dari_snapshot(tanggal, titik)
+        df = pd.DataFrame(
+            [[id_aset, *nilai] for id_aset, nilai in inventaris.items()], columns=KOLOM_INVENTARIS
+        )
+        df['harga_beli'] = pd.to_numeric(df['harga_beli'], errors='coerce').fillna(0).astype('int64')
+        urut = pd.to_numeric(df['id'], errors='coerce')
+        return df.assign(_urut=urut).sort_values(['lokasi_toko', '_urut']).drop(columns='_urut').reset_index(drop=True)
+
+    def _dari_snapshot(self, tanggal, titik):
+        target = akhir_bulan(tanggal)
+        tersimpan = self.replika.query("SELECT tanggal, dasar, tanda FROM _snapshot").set_index('tanggal')
+        cek = self.replika.query("SELECT bulan, SUM(cek) AS cek FROM _tren GROUP BY bulan").set_index('bulan')['cek']
+
+        # Snapshot terbaru selalu dihitung dari master (log sesudahnya paling banyak sebulan)
+        inventaris = self._mundur(self._master(), self._log(titik))
+        tanda, posisi = self._kode(inventaris)[0], titik
+        if tersimpan['tanda'].get(titik.isoformat()) != tanda:
+            self._simpan(titik, "master", inventaris)
+
+        # Turun per bulan sampai akhir bulan target; snapshot yang dasarnya sama tidak dihitung ulang
+        while titik > target:
+            sebelumnya = titik.replace(day=1) - timedelta(days=1)
+            dasar = f"{tanda}:{int(cek.get(f'{titik:%Y-%m}', 0))}"
+            if tersimpan['dasar'].get(sebelumnya.isoformat()) == dasar:
+                tanda = tersimpan['tanda'][sebelumnya.isoformat()]
+            else:
+                if posisi != titik:
+                    inventaris, posisi = self._muat(titik), titik
+                inventaris, posisi = self._mundur(inventaris, self._log(sebelumnya, titik)), sebelumnya
+                tanda = self._simpan(sebelumnya, dasar, inventaris)
+            titik = sebelumnya
+
+        if posisi != target:
+            inventaris = self._muat(target)
+        return self._mundur(inventaris, self._log(tanggal, target))
+
+@st.cache_resource
+def get_snapshot():
+    return SnapshotInventaris(get_replika())
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def inventaris_pada(tanggal, versi_master, versi_log):
+    """Hasil per versi replika: tanggal yang sama tidak di-replay ulang selama data tidak berubah."""
+    return get_snapshot().pada(tanggal)
+
+profil.tanda("Definisi helper")
 
 # ==========================================
 # APLIKASI UTAMA
@@ -140,31 +1807,62 @@ st.sidebar.write(f"Login sebagai: **{os.getenv('ADMIN_USER')}**")
 if st.sidebar.button("🚪 Logout"):
     proses_logout()
 
+# Status replika lokal
+replika_status = get_replika()
+if replika_status.error_terakhir:
+    waktu_sync = datetime.fromtimestamp(replika_status.terakhir_sukses).strftime('%H:%M:%S') if replika_status.terakhir_sukses else "-"
+    st.sidebar.warning(f"⚠️ Google Sheets sedang tidak bisa diakses. Menampilkan data lokal (sync terakhir {waktu_sync}).")
+
+# Status antrian tulis (write-behind)
+jumlah_menunggu = replika_status.jumlah_antrian()
+if jumlah_menunggu:
+    st.sidebar.info(f"⏳ {jumlah_menunggu} perubahan menunggu dikirim ke Google Sheets.")
+    if replika_status.error_kirim:
+        st.sidebar.caption(f"Akan dicoba ulang otomatis. Error terakhir: {replika_status.error_kirim}")
+if replika_status.jumlah_antrian('gagal'):
+    with st.sidebar.expander("❌ Perubahan ditolak Google Sheets", expanded=True):
+        st.caption("Perubahan berikut tidak tersimpan di Sheet. Data lokal akan dimuat ulang dari Sheet.")
+        st.dataframe(replika_status.daftar_gagal(), hide_index=True)
+        if st.button("Tutup pemberitahuan"):
+            replika_status.hapus_gagal()
+            st.rerun()
+
+# Pesan sukses dari aksi admin sebelum rerun
+if 'pesan_simpan' in st.session_state:
+    st.toast(st.session_state.pop('pesan_simpan'), icon="✅")
+
 st.sidebar.markdown("---")
 menu = st.sidebar.radio("Pilih Halaman:", [
     "Master Aset (Aktif)", 
     "Riwayat Log (History)",
     "⚡ Kelola Aset (Admin)",
-    "📊 Rekap Aset Aktif"
+    "📊 Rekap Aset Aktif",
+    "📈 Tren Bulanan",
+    "🕰️ Inventaris per Tanggal"
 ])
 st.sidebar.markdown("---")
 
 # ==========================================
 # HALAMAN 1: MASTER ASET (DENGAN SIDEBAR FORM)
 # ==========================================
+profil.tanda("Sidebar & status replika")
+
 if menu == "Master Aset (Aktif)":
     st.title("🏭 Sistem Manajemen Aset Mesin (Cloud)")
     
-    # Ambil Data Master Aset
-    df_master = load_data("master_aset")
+    # Data Master Aset (query langsung ke replika lokal)
+    replika = get_replika()
+    ada_master = pastikan_tabel("master_aset") and int(replika.query(
+        f"SELECT COUNT(*) AS n FROM master_aset WHERE {SYARAT_HIDUP['master_aset']}"
+    )['n'].iloc[0]) > 0
 
     # --- 1. FILTER FORM (SIDEBAR) ---
     with st.sidebar.form("filter_master_form"):
         st.header("🎛️ Filter Master Aset")
         
         # Siapkan opsi filter
-        opt_lokasi = sorted(df_master['lokasi_toko'].unique().tolist()) if not df_master.empty else []
-        opt_kategori = sorted(df_master['kategori'].unique().tolist()) if not df_master.empty else []
+        opt_lokasi = replika.query(f"SELECT DISTINCT lokasi_toko FROM master_aset WHERE {SYARAT_HIDUP['master_aset']} ORDER BY lokasi_toko")['lokasi_toko'].tolist() if ada_master else []
+        opt_kategori = replika.query(f"SELECT DISTINCT kategori FROM master_aset WHERE {SYARAT_HIDUP['master_aset']} ORDER BY kategori")['kategori'].tolist() if ada_master else []
         
         # Input Filter
         sel_lokasi = st.multiselect("Lokasi (Kosong = Semua)", opt_lokasi, default=[])
@@ -175,46 +1873,39 @@ if menu == "Master Aset (Aktif)":
         btn_filter_master = st.form_submit_button("🚀 Terapkan Filter")
 
     # --- 2. LOGIKA FILTERING ---
-    if not df_master.empty:
-        # Mulai dengan semua data
-        df_tampil = df_master.copy()
+    if ada_master:
+        # Filter dijalankan sebagai query di replika lokal (aset non-aktif tidak ikut)
+        kondisi, nilai = [SYARAT_HIDUP["master_aset"]], []
         
         # Filter Lokasi (Jika dipilih)
         if sel_lokasi:
-            df_tampil = df_tampil[df_tampil['lokasi_toko'].isin(sel_lokasi)]
+            kondisi.append(f"lokasi_toko IN ({', '.join('?' * len(sel_lokasi))})")
+            nilai.extend(sel_lokasi)
             
         # Filter Kategori (Jika dipilih)
         if sel_kategori:
-            df_tampil = df_tampil[df_tampil['kategori'].isin(sel_kategori)]
+            kondisi.append(f"kategori IN ({', '.join('?' * len(sel_kategori))})")
+            nilai.extend(sel_kategori)
             
-        # Filter Pencarian (Keyword)
+        # Filter Pencarian (Keyword): ID hasil index token dikirim sebagai satu parameter JSON
         if keyword:
-            df_tampil = df_tampil[
-                df_tampil['nama_mesin'].str.contains(keyword, case=False, na=False) |
-                df_tampil['id'].str.contains(keyword, case=False, na=False) |
-                df_tampil['no_registrasi'].astype(str).str.contains(keyword, case=False, na=False)
-            ]
-        
-        # --- 3. KPI DASHBOARD ---
-        total_unit = len(df_tampil)
-        # Hitung Estimasi Aset (Handling Error Data Kotor)
-        try:
-            if 'harga_beli' in df_tampil.columns:
-                series_harga = df_tampil['harga_beli'].astype(str).str.replace(r'[^\d]', '', regex=True)
-                series_harga = pd.to_numeric(series_harga, errors='coerce').fillna(0)
-                total_nilai = series_harga.sum()
-            else:
-                total_nilai = 0
-        except:
-            total_nilai = 0
+            kondisi.append("id IN (SELECT value FROM json_each(?))")
+            nilai.append(json.dumps(indeks_aset().id_cocok(keyword).tolist()))
 
-        str_nilai = f"Rp {total_nilai:,.0f}".replace(",", ".")
+        where_sql = " AND ".join(kondisi)
+        
+        # --- 3. KPI DASHBOARD (agregat SQL, tanpa memuat semua baris) ---
+        kpi = replika.query(
+            f"SELECT COUNT(*) AS unit, COALESCE(SUM(harga_beli), 0) AS nilai, COUNT(DISTINCT lokasi_toko) AS lokasi "
+            f"FROM master_aset WHERE {where_sql}", nilai
+        ).iloc[0]
+        str_nilai = f"Rp {int(kpi['nilai']):,.0f}".replace(",", ".")
         
         # Tampilkan KPI
         k1, k2, k3 = st.columns(3)
-        k1.metric("📦 Unit Tampil", f"{total_unit} Unit")
+        k1.metric("📦 Unit Tampil", f"{int(kpi['unit'])} Unit")
         k2.metric("💰 Nilai Estimasi", str_nilai)
-        k3.metric("📍 Lokasi Terkait", f"{df_tampil['lokasi_toko'].nunique()} Titik")
+        k3.metric("📍 Lokasi Terkait", f"{int(kpi['lokasi'])} Titik")
         st.markdown("---")
 
         # --- 4. TABEL DATA ---
@@ -223,21 +1914,20 @@ if menu == "Master Aset (Aktif)":
             if btn_filter_master:
                 st.success("Filter berhasil diterapkan.")
         with col_kanan:
-            excel_data = convert_df_to_excel(df_tampil)
-            st.download_button("📥 Download Excel", data=excel_data, file_name='data_aset_filtered.xlsx')
+            # File Excel baru disusun saat tombol diklik (xlsxwriter tidak dimuat di setiap rerun)
+            st.download_button(
+                "📥 Download Excel",
+                data=lambda: excel_dari_query(f"SELECT * FROM master_aset WHERE {where_sql} ORDER BY _baris", nilai),
+                file_name='data_aset_filtered.xlsx'
+            )
 
-        # Formatting Tampilan (Rupiah)
-        df_display = df_tampil.copy()
-        if 'harga_beli' in df_display.columns:
-            try:
-                # Bersihkan & Format
-                clean_series = df_display['harga_beli'].astype(str).str.replace(r'[^\d]', '', regex=True)
-                df_display['harga_beli'] = pd.to_numeric(clean_series, errors='coerce').fillna(0)
-                df_display['harga_beli'] = df_display['harga_beli'].apply(lambda x: f"Rp {x:,.0f}".replace(",", "."))
-            except:
-                pass
-
-        st.dataframe(df_display, use_container_width=True, hide_index=True, height=600)
+        # Hanya halaman aktif yang diambil & diformat Rupiah
+        kolom_master = [k for k in replika.kolom_sheet("master_aset") if not k.startswith('_')]
+        tabel_halaman(
+            "tabel_master", f"master_aset WHERE {where_sql}", nilai,
+            {k: f'"{k}"' for k in kolom_master}, urut_awal="id",
+            ekspresi_urut={"id": "CAST(id AS INTEGER)"}
+        )
     else:
         st.warning("Data Master Aset kosong.")
 # ==========================================
@@ -246,14 +1936,12 @@ if menu == "Master Aset (Aktif)":
 elif menu == "Riwayat Log (History)":
     st.title("📜 Riwayat Mutasi & Likuidasi Mesin")
     
-    # Load Data
-    df_base = load_data("riwayat_log")
+    # Data log (query langsung ke replika lokal)
+    replika = get_replika()
+    kolom_log = replika.query("SELECT * FROM riwayat_log LIMIT 0").columns if pastikan_tabel("riwayat_log") else []
     
-    if not df_base.empty:
-        # Pre-processing Tanggal untuk filter
-        if 'tanggal' in df_base.columns:
-            df_base['tanggal_filter'] = pd.to_datetime(df_base['tanggal'], errors='coerce')
-        else:
+    if len(kolom_log):
+        if 'tanggal' not in kolom_log:
             st.error("Kolom 'tanggal' hilang dari data log.")
             st.stop()
 
@@ -272,9 +1960,9 @@ elif menu == "Riwayat Log (History)":
             
             # Filter Lokasi & Aksi
             # Ambil opsi unik
-            col_lok = 'lokasi_asal' if 'lokasi_asal' in df_base.columns else 'lokasi'
-            opt_lokasi = sorted(df_base[col_lok].astype(str).unique().tolist())
-            opt_aksi = sorted(df_base['jenis_aksi'].astype(str).unique().tolist())
+            col_lok = 'lokasi_asal' if 'lokasi_asal' in kolom_log else 'lokasi'
+            opt_lokasi = replika.query(f'SELECT DISTINCT "{col_lok}" AS v FROM riwayat_log WHERE {SYARAT_HIDUP["riwayat_log"]} ORDER BY v')['v'].tolist()
+            opt_aksi = replika.query(f"SELECT DISTINCT jenis_aksi AS v FROM riwayat_log WHERE {SYARAT_HIDUP['riwayat_log']} ORDER BY v")['v'].tolist()
             
             sel_lokasi_hist = st.multiselect("Lokasi Asal (Kosong = Semua)", opt_lokasi, default=[])
             sel_aksi = st.multiselect("Jenis Aksi (Kosong = Semua)", opt_aksi, default=[])
@@ -285,72 +1973,77 @@ elif menu == "Riwayat Log (History)":
             # Tombol Eksekusi
             btn_filter_hist = st.form_submit_button("🚀 Terapkan Filter")
 
-        # --- 2. LOGIKA FILTERING ---
-        df_history = df_base.copy()
+        # --- 2. LOGIKA FILTERING (QUERY REPLIKA LOKAL) ---
+        kondisi, nilai = [], []
         
-        # A. Filter Tanggal
+        # A. Filter Tanggal (_tanggal = tanggal yang sudah dinormalisasi YYYY-MM-DD)
+        start_date = end_date = None
         if not tampil_semua:
             if isinstance(filter_tgl, tuple) and len(filter_tgl) == 2:
                 start_date, end_date = filter_tgl
-                start_ts = pd.Timestamp(start_date)
-                end_ts = pd.Timestamp(end_date)
-                
-                df_history = df_history[
-                    (df_history['tanggal_filter'] >= start_ts) & 
-                    (df_history['tanggal_filter'] <= end_ts)
-                ]
         
         # B. Filter Lokasi (Jika dipilih)
         if sel_lokasi_hist:
-            df_history = df_history[df_history[col_lok].isin(sel_lokasi_hist)]
+            kondisi.append(f'"{col_lok}" IN ({", ".join("?" * len(sel_lokasi_hist))})')
+            nilai.extend(sel_lokasi_hist)
             
         # C. Filter Aksi (Jika dipilih)
         if sel_aksi:
-            df_history = df_history[df_history['jenis_aksi'].isin(sel_aksi)]
+            kondisi.append(f"jenis_aksi IN ({', '.join('?' * len(sel_aksi))})")
+            nilai.extend(sel_aksi)
             
         # D. Filter Keyword
         if keyword_hist:
-            df_history = df_history[
-                df_history['nama_mesin'].str.contains(keyword_hist, case=False, na=False) |
-                df_history['no_registrasi'].astype(str).str.contains(keyword_hist, case=False, na=False)
-            ]
+            kondisi.append("(nama_mesin LIKE ? ESCAPE '\\' OR no_registrasi LIKE ? ESCAPE '\\')")
+            nilai.extend([pola_like(keyword_hist)] * 2)
+
+        # Partisi tahun lain hanya diunduh jika rentang tanggal menyentuhnya
+        where_sql, nilai = kondisi_log(start_date, end_date, kondisi, nilai)
+        jumlah_log = int(replika.query(f"SELECT COUNT(*) AS n FROM riwayat_log WHERE {where_sql}", nilai)['n'].iloc[0])
             
         # --- 3. TAMPILAN TABEL ---
-        # Rapikan Tanggal untuk View
-        df_history['tanggal'] = df_history['tanggal_filter'].dt.strftime('%Y-%m-%d').fillna("-")
-        
-        # Sorting (Terbaru di atas)
-        if 'id' in df_history.columns:
-            df_history['id_num'] = pd.to_numeric(df_history['id'], errors='coerce')
-            df_history = df_history.sort_values(by='id_num', ascending=False).drop(columns=['id_num'])
-
-        if not df_history.empty:
-            # Kolom yang akan ditampilkan
+        if jumlah_log:
+            # Kolom yang akan ditampilkan (tanggal = _tanggal yang sudah dinormalisasi)
             target_cols = ['tanggal', 'jenis_aksi', 'nama_mesin', 'lokasi_asal', 'keterangan', 'harga_beli', 'no_registrasi', 'no_reg_system']
-            final_cols = [c for c in target_cols if c in df_history.columns]
+            kolom_tampil = {
+                c: "COALESCE(_tanggal, '-')" if c == 'tanggal' else f'"{c}"'
+                for c in target_cols if c in kolom_log
+            }
             
             # Header Info & Download
             c_info, c_btn = st.columns([4, 1])
             with c_info:
-                st.info(f"Menampilkan **{len(df_history)}** catatan sejarah.")
+                st.info(f"Menampilkan **{jumlah_log}** catatan sejarah.")
             with c_btn:
-                excel_hist = convert_df_to_excel(df_history[final_cols])
-                st.download_button("📥 Download Excel", data=excel_hist, file_name='riwayat_log.xlsx')
+                select_sql = ", ".join(f'{ekspresi} AS "{nama}"' for nama, ekspresi in kolom_tampil.items())
+                st.download_button(
+                    "📥 Download Excel",
+                    data=lambda: excel_dari_query(f"SELECT {select_sql} FROM riwayat_log WHERE {where_sql} ORDER BY _id DESC", nilai),
+                    file_name='riwayat_log.xlsx'
+                )
             
-            # Formatting Rupiah untuk View
-            df_hist_display = df_history[final_cols].copy()
-            if 'harga_beli' in df_hist_display.columns:
-                try:
-                    clean_s = df_hist_display['harga_beli'].astype(str).str.replace(r'[^\d]', '', regex=True)
-                    df_hist_display['harga_beli'] = pd.to_numeric(clean_s, errors='coerce').fillna(0)
-                    df_hist_display['harga_beli'] = df_hist_display['harga_beli'].apply(lambda x: f"Rp {x:,.0f}".replace(",", "."))
-                except:
-                    pass
-
-            st.dataframe(df_hist_display, use_container_width=True, hide_index=True)
+            # Terbaru di atas; hanya halaman aktif yang diambil & diformat Rupiah
+            tabel_halaman(
+                "tabel_riwayat", f"riwayat_log WHERE {where_sql}", nilai, kolom_tampil,
+                urut_awal="tanggal", turun_awal=True, ekspresi_urut={"tanggal": "_tanggal"}
+            )
         else:
             st.warning("Tidak ada data history yang cocok dengan filter ini.")
 
+        # --- 4. JEJAK SATU ASET ---
+        st.markdown("---")
+        st.subheader("🕵️ Jejak Aset")
+        cari_jejak = st.text_input("ID System / No Registrasi (persis):", placeholder="Contoh: 1024 atau REG-005", key="cari_jejak")
+        if cari_jejak:
+            replika.pastikan_rentang()  # Jejak lengkap butuh semua partisi tahun
+            for id_aset in id_untuk_jejak(cari_jejak):
+                df_jejak = replika.jejak(id_aset)
+                if df_jejak.empty:
+                    st.warning(f"Belum ada riwayat untuk ID System `{id_aset}`.")
+                    continue
+                st.write(f"ID System `{id_aset}`: **{len(df_jejak)}** catatan")
+                tampilkan_jejak(df_jejak)
+
     else:
         st.warning("Data History Kosong.")
 
@@ -362,8 +2055,42 @@ elif menu == "⚡ Kelola Aset (Admin)":
     
     sh = get_gsheet_connection()
     ws_master = sh.worksheet("master_aset")
-    ws_log = sh.worksheet("riwayat_log")
-    
+
+    with st.expander("📈 Pemakaian Kuota Google Sheets"):
+        q1, q2, q3 = st.columns(3)
+        q1.metric("Request 60 Detik Terakhir", f"{sh.request_menit_ini()} / {sh.kapasitas}")
+        df_stat_api = sh.statistik()
+        q2.metric("Retry (429/5xx)", int(df_stat_api['retry'].sum()))
+        q3.metric("Baca Digabung", int(df_stat_api['digabung'].sum()))
+        st.caption(f"Total waktu menunggu rate limiter: {sh.total_tunggu:.1f} detik.")
+        if not df_stat_api.empty:
+            st.dataframe(df_stat_api.sort_values('request', ascending=False), hide_index=True)
+            st.bar_chart(sh.per_menit().set_index('menit'))
+
+    with st.expander("🧹 Kompaksi Sheet (Buang Baris Non-Aktif)"):
+        replika_admin = get_replika()
+        baris_mati = replika_admin.baris_mati()
+        st.caption(
+            f"Likuidasi & hapus log hanya menandai baris; kompaksi otomatis tiap {KOMPAKSI_INTERVAL_JAM:g} jam "
+            f"saat tidak ada simpanan selama {KOMPAKSI_JEDA_MENIT} menit."
+        )
+        if replika_admin.terakhir_kompaksi:
+            st.caption(f"Kompaksi terakhir: {datetime.fromtimestamp(replika_admin.terakhir_kompaksi):%d-%m-%Y %H:%M}")
+        if baris_mati:
+            st.dataframe(
+                pd.DataFrame({"sheet": list(baris_mati), "baris_mati": [len(b) for b in baris_mati.values()]}),
+                hide_index=True
+            )
+            if st.button("🧹 Kompaksi Sekarang"):
+                jumlah_buang = replika_admin.kompaksi()
+                st.session_state['pesan_simpan'] = (
+                    f"{jumlah_buang} baris non-aktif dibuang dari Sheet." if jumlah_buang is not None
+                    else "Kompaksi ditunda: replika belum pasti sama dengan Sheet. Coba lagi setelah sync berikutnya."
+                )
+                st.rerun()
+        else:
+            st.write("Tidak ada baris non-aktif.")
+
     tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "➕ Input Baru", 
         "✏️ Edit Detail Mesin Aktif",     
@@ -412,14 +2139,13 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         with st.spinner("Menyimpan ke Cloud..."):
                             try:
                                 # 1. Generate ID Baru (Master)
-                                new_id = generate_id("master_aset")
+                                [new_id], req_id_master = cadangkan_id("master_aset")
                                 
-                                # 2. Append ke Master Aset
+                                # 2. Baris Master Aset
                                 row_master = [new_id, final_lokasi, final_kategori, input_nama, input_harga, input_noreg, "Aktif"]
-                                ws_master.append_row(row_master)
                                 
-                                # 3. Append ke Log (INPUT BARU)
-                                log_id = generate_id("riwayat_log")
+                                # 3. Baris Log (INPUT BARU)
+                                [log_id], req_id_log = cadangkan_id("riwayat_log")
                                 tgl_skrg = datetime.now().strftime("%Y-%m-%d")
                                 
                                 row_log = [
@@ -434,16 +2160,81 @@ elif menu == "⚡ Kelola Aset (Admin)":
                                     new_id,             # 9. no_reg_system
                                     "Penambahan aset baru" # 10. keterangan
                                 ]
-                                ws_log.append_row(row_log)
-                                
-                                st.success(f"Berhasil! Aset '{input_nama}' ditambahkan dengan ID {new_id}")
-                                time.sleep(1)
-                                st.cache_data.clear()
+                                simpan_batch([
+                                    req_tambah_baris(ws_master, [row_master]),
+                                    *req_tambah_log([row_log]),
+                                    req_id_master,
+                                    req_id_log,
+                                ], f"Berhasil! Aset '{input_nama}' ditambahkan dengan ID {new_id}")
                                 st.rerun()
                                 
                             except Exception as e:
                                 st.error(f"Terjadi kesalahan: {e}")
 
+        with st.expander("📥 Import Massal dari CSV/Excel"):
+            st.caption(f"Kolom file: {', '.join(KOLOM_IMPORT)}. Harga boleh ditulis dengan titik/Rp.")
+            st.download_button(
+                "📄 Download Template", pd.DataFrame(columns=KOLOM_IMPORT).to_csv(index=False),
+                file_name="template_import_aset.csv", mime="text/csv"
+            )
+            file_import = st.file_uploader("Upload file aset baru", type=["csv", "xlsx"], key="file_import")
+            izinkan_baru = st.checkbox("Izinkan lokasi / kategori baru", key="izinkan_baru_import")
+
+            if file_import is not None:
+                try:
+                    df_up = pd.read_csv(file_import, dtype=str) if file_import.name.endswith(".csv") else pd.read_excel(file_import, dtype=str)
+                except Exception as e:
+                    st.error(f"File tidak bisa dibaca: {e}")
+                    df_up = None
+
+                if df_up is not None:
+                    df_valid, df_error = validasi_import(df_up, df_master, izinkan_baru)
+
+                    m1, m2, m3 = st.columns(3)
+                    m1.metric("Baris di File", len(df_up))
+                    m2.metric("Siap Diimport", len(df_valid))
+                    m3.metric("Bermasalah", df_error['baris_file'].nunique())
+
+                    if not df_error.empty:
+                        st.error("Baris berikut tidak akan diimport:")
+                        st.dataframe(df_error, hide_index=True)
+                        st.download_button(
+                            "📥 Download Laporan Error", convert_df_to_excel(df_error),
+                            file_name="error_import_aset.xlsx"
+                        )
+
+                    if not df_valid.empty:
+                        st.markdown("**Preview data yang akan diimport:**")
+                        st.dataframe(df_valid, hide_index=True)
+
+                        if st.button(f"💾 Import {len(df_valid)} Aset", type="primary"):
+                            try:
+                                n = len(df_valid)
+                                new_ids, req_id_master = cadangkan_id("master_aset", n)
+                                log_ids, req_id_log = cadangkan_id("riwayat_log", n)
+                                tgl_skrg = datetime.now().strftime("%Y-%m-%d")
+
+                                rows_master = [
+                                    [new_id, r['lokasi_toko'], r['kategori'], r['nama_mesin'], r['harga_beli'], r['no_registrasi'], "Aktif"]
+                                    for new_id, r in zip(new_ids, df_valid.to_dict('records'))
+                                ]
+                                rows_log = [
+                                    [log_id, r['lokasi_toko'], r['kategori'], "Input Baru", tgl_skrg, r['nama_mesin'],
+                                     r['harga_beli'], r['no_registrasi'], new_id, "Penambahan aset baru (import massal)"]
+                                    for log_id, new_id, r in zip(log_ids, new_ids, df_valid.to_dict('records'))
+                                ]
+                                # Satu appendCells per worksheet, semuanya dalam satu batchUpdate
+                                simpan_batch([
+                                    req_tambah_baris(ws_master, rows_master),
+                                    *req_tambah_log(rows_log),
+                                    req_id_master,
+                                    req_id_log,
+                                ], f"Berhasil! {n} aset diimport dengan ID {new_ids[0]} s/d {new_ids[-1]}")
+                                st.session_state.pop("file_import", None)
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Terjadi kesalahan: {e}")
+
     # --- TAB 2: EDIT DETAIL (SAFE MODE) ---
     with tab2:
         st.subheader("✏️ Edit Detail Aset")
@@ -456,11 +2247,9 @@ elif menu == "⚡ Kelola Aset (Admin)":
         aset_ditemukan = pd.DataFrame()
         
         if cari_noreg:
-            # Cari di kolom No Registrasi ATAU ID (Case Insensitive)
-            aset_ditemukan = df_master[
-                df_master['no_registrasi'].astype(str).str.contains(cari_noreg, case=False, na=False) |
-                df_master['id'].astype(str).str.contains(cari_noreg, case=False, na=False)
-            ]
+            # Cari lewat index token (No Registrasi / ID / Nama, tidak peka huruf besar/kecil)
+            indeks = indeks_aset()
+            aset_ditemukan = indeks.df.iloc[indeks.cari(cari_noreg)]
         
         id_pilih = None
         
@@ -469,24 +2258,20 @@ elif menu == "⚡ Kelola Aset (Admin)":
             st.success(f"Ditemukan {len(aset_ditemukan)} aset.")
             
             # Format tampilan dropdown: Nama | Lokasi | Reg | ID
-            opsi_aset = aset_ditemukan.apply(
-                lambda x: f"{x['nama_mesin']} | {x['lokasi_toko']} | Reg: {x['no_registrasi']} | ID: {x['id']}", axis=1
+            data_lama = pilih_id(
+                "Pilih Aset yang akan diedit:", aset_ditemukan,
+                lambda d: d['nama_mesin'] + " | " + d['lokasi_toko'] + " | Reg: " + d['no_registrasi'] + " | ID: " + d['id'],
+                key="sel_edit"
             )
             
-            pilih_aset = st.selectbox("Pilih Aset yang akan diedit:", opsi_aset)
-            
-            if pilih_aset:
-                # Ambil ID dari string pilihan (Elemen terakhir setelah "| ID: ")
-                id_pilih = pilih_aset.split("| ID: ")[1].strip()
+            if data_lama is not None:
+                id_pilih = str(data_lama['id'])
         
         elif cari_noreg and aset_ditemukan.empty:
             st.warning("Data tidak ditemukan.")
 
         # 3. Form Edit (Muncul setelah aset dipilih)
         if id_pilih:
-            # Ambil data eksisting dari DataFrame
-            data_lama = df_master[df_master['id'] == id_pilih].iloc[0]
-            
             st.markdown("---")
             with st.form("form_edit_safe"):
                 st.write(f"Sedang Mengedit: **{data_lama['nama_mesin']}**")
@@ -538,39 +2323,31 @@ elif menu == "⚡ Kelola Aset (Admin)":
                     else:
                         try:
                             # Cari baris di Google Sheet berdasarkan ID
-                            cell = ws_master.find(str(id_pilih))
-                            r = cell.row
+                            r = cari_baris("master_aset", id_pilih)
                             
                             # UPDATE DATA (Kolom 1 ID dilewati)
                             # Urutan Kolom GSheet: 1.ID, 2.Lokasi, 3.Kategori, 4.Nama, 5.Harga, 6.NoReg
-                            
-                            ws_master.update_cell(r, 2, new_lokasi)   # Update Lokasi
-                            ws_master.update_cell(r, 3, new_kategori) # Update Kategori
-                            ws_master.update_cell(r, 4, new_nama)     # Update Nama
-                            ws_master.update_cell(r, 5, new_harga)    # Update Harga
-                            ws_master.update_cell(r, 6, new_noreg)    # Update No Reg Manual
+                            req_master = req_ubah_sel(ws_master, r, 2, [new_lokasi, new_kategori, new_nama, new_harga, new_noreg])
                             
                             # CATAT LOG HISTORY
-                            log_id = generate_id("riwayat_log")
+                            [log_id], req_id_log = cadangkan_id("riwayat_log")
                             tgl_skrg = datetime.now().strftime("%Y-%m-%d")
                             
-                            row_log = [
-                                log_id,
-                                data_lama['lokasi_toko'], # Lokasi SEBELUM edit
-                                data_lama['kategori'],
-                                "Edit Detail",
-                                tgl_skrg,
-                                new_nama,
-                                new_harga,
-                                new_noreg,
-                                id_pilih,                 # ID System Tetap
-                                f"Update Data. {ket_edit}"
-                            ]
-                            ws_log.append_row(row_log)
-                            
-                            st.success(f"Data aset {new_nama} berhasil diperbarui!")
-                            time.sleep(1)
-                            st.cache_data.clear()
+                            # Kolom aset di log = data SEBELUM edit (bisa dipulihkan); nilai baru dicatat di keterangan
+                            perubahan = "; ".join(
+                                f"{label}: {lama} -> {baru}" for label, lama, baru in [
+                                    ("Lokasi", data_lama['lokasi_toko'], new_lokasi),
+                                    ("Kategori", data_lama['kategori'], new_kategori),
+                                    ("Nama", data_lama['nama_mesin'], new_nama),
+                                    ("Harga", harga_ke_int(data_lama['harga_beli']), new_harga),
+                                    ("No Reg", data_lama['no_registrasi'], new_noreg),
+                                ] if str(lama) != str(baru)
+                            )
+                            row_log = baris_log_aset(
+                                log_id, data_lama, "Edit Detail", tgl_skrg,
+                                f"{PENANDA_SEBELUM}Update Data. {perubahan + '. ' if perubahan else ''}{ket_edit}"
+                            )
+                            simpan_batch([req_master, *req_tambah_log([row_log]), req_id_log], f"Data aset {new_nama} berhasil diperbarui!")
                             st.rerun()
                             
                         except Exception as e:
@@ -579,13 +2356,14 @@ elif menu == "⚡ Kelola Aset (Admin)":
     # --- TAB 3: MUTASI ---
     with tab3:
         st.subheader("Mutasi (Pindah Lokasi)")
-        pilih_aset_mutasi = st.selectbox("Pilih Aset untuk Dipindah:", 
-                                         df_master['nama_mesin'] + " | " + df_master['id'] + " | " + df_master['lokasi_toko'],
-                                         key="sel_mutasi")
+        cari_mutasi = st.text_input("🔍 Saring aset (Nama / ID / No Reg):", key="cari_mutasi")
+        data_asal = pilih_id(
+            "Pilih Aset untuk Dipindah:", indeks_aset().baris(cari_mutasi) if cari_mutasi else df_master,
+            label_aset, key="sel_mutasi"
+        )
         
-        if pilih_aset_mutasi:
-            id_mutasi = pilih_aset_mutasi.split(" | ")[1]
-            data_asal = df_master[df_master['id'] == id_mutasi].iloc[0]
+        if data_asal is not None:
+            id_mutasi = str(data_asal['id'])
             
             st.info(f"Lokasi Saat Ini: **{data_asal['lokasi_toko']}**")
             
@@ -602,10 +2380,9 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         st.error("Lokasi tujuan tidak valid atau sama dengan lokasi asal.")
                     else:
                         try:
-                            cell = ws_master.find(id_mutasi)
-                            ws_master.update_cell(cell.row, 2, final_tujuan)
+                            baris_mutasi = cari_baris("master_aset", id_mutasi)
                             
-                            log_id = generate_id("riwayat_log")
+                            [log_id], req_id_log = cadangkan_id("riwayat_log")
                             row_log = [
                                 log_id,
                                 data_asal['lokasi_toko'], # Lokasi ASAL
@@ -613,43 +2390,82 @@ elif menu == "⚡ Kelola Aset (Admin)":
                                 "Mutasi",
                                 tgl_mutasi.strftime("%Y-%m-%d"),
                                 data_asal['nama_mesin'],
-                                int(data_asal['harga_beli']) if pd.notna(data_asal['harga_beli']) else 0,
+                                harga_ke_int(data_asal['harga_beli']),
                                 str(data_asal['no_registrasi']),
                                 id_mutasi,
                                 f"Pindah ke {final_tujuan}. {ket_mutasi}"
                             ]
-                            ws_log.append_row(row_log)
-                            
-                            st.success(f"Berhasil dipindah ke {final_tujuan}")
-                            st.cache_data.clear()
-                            time.sleep(1)
+                            simpan_batch([
+                                req_ubah_sel(ws_master, baris_mutasi, 2, [final_tujuan]),
+                                *req_tambah_log([row_log]),
+                                req_id_log,
+                            ], f"Berhasil dipindah ke {final_tujuan}")
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error: {e}")
 
+        with st.expander("📦 Mutasi Massal (Banyak Aset Sekaligus)"):
+            df_pilih_mutasi = pilih_aset_banyak(df_master, "mutasi")
+
+            if not df_pilih_mutasi.empty:
+                with st.form("form_mutasi_massal"):
+                    tujuan_massal = st.selectbox("Pilih Lokasi Tujuan", list_lok + ["++ Tambah Baru ++"], key="tuj_massal")
+                    input_tujuan_massal = st.text_input("Lokasi Baru (Opsional)", key="in_tuj_massal")
+                    tgl_mutasi_massal = st.date_input("Tanggal Pindah", value=date.today(), key="tgl_mutasi_massal")
+                    ket_mutasi_massal = st.text_area("Keterangan", "Rotasi mesin reguler", key="ket_mutasi_massal")
+
+                    if st.form_submit_button(f"🚚 Proses Mutasi {len(df_pilih_mutasi)} Aset"):
+                        final_tujuan = input_tujuan_massal if tujuan_massal == "++ Tambah Baru ++" else tujuan_massal
+                        df_pindah = df_pilih_mutasi[df_pilih_mutasi['lokasi_toko'] != final_tujuan]
+
+                        if not final_tujuan:
+                            st.error("Lokasi tujuan tidak valid.")
+                        elif df_pindah.empty:
+                            st.error("Semua aset terpilih sudah berada di lokasi tujuan.")
+                        else:
+                            try:
+                                daftar_baris = cari_banyak_baris("master_aset", df_pindah['id'].tolist())
+                                log_ids, req_id_log = cadangkan_id("riwayat_log", len(df_pindah))
+                                tgl = tgl_mutasi_massal.strftime("%Y-%m-%d")
+                                rows_log = [
+                                    baris_log_aset(log_id, aset, "Mutasi", tgl, f"Pindah ke {final_tujuan}. {ket_mutasi_massal}")
+                                    for log_id, aset in zip(log_ids, df_pindah.to_dict('records'))
+                                ]
+                                # Semua perubahan master + log dalam satu batchUpdate
+                                simpan_batch([
+                                    *[req_ubah_sel(ws_master, baris, 2, [final_tujuan]) for baris in daftar_baris],
+                                    *req_tambah_log(rows_log),
+                                    req_id_log,
+                                ], f"Berhasil memindah {len(df_pindah)} aset ke {final_tujuan}"
+                                   + (f" ({len(df_pilih_mutasi) - len(df_pindah)} sudah di lokasi tujuan, dilewati)" if len(df_pindah) < len(df_pilih_mutasi) else ""))
+                                reset_pilihan_banyak("mutasi")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Error: {e}")
+
     # --- TAB 4: LIKUIDASI ---
     with tab4:
         st.subheader("Likuidasi (Hapus/Jual Aset)")
-        pilih_aset_hapus = st.selectbox("Pilih Aset:", 
-                                        df_master['nama_mesin'] + " | " + df_master['id'] + " | " + df_master['lokasi_toko'],
-                                        key="sel_hapus")
+        cari_hapus = st.text_input("🔍 Saring aset (Nama / ID / No Reg):", key="cari_hapus")
+        data_hapus = pilih_id(
+            "Pilih Aset:", indeks_aset().baris(cari_hapus) if cari_hapus else df_master,
+            label_aset, key="sel_hapus"
+        )
         
-        if pilih_aset_hapus:
-            id_hapus = pilih_aset_hapus.split(" | ")[1]
-            data_hapus = df_master[df_master['id'] == id_hapus].iloc[0]
+        if data_hapus is not None:
+            id_hapus = str(data_hapus['id'])
             
             st.warning(f"⚠️ Anda akan menghapus **{data_hapus['nama_mesin']}** secara permanen dari Master Aset.")
             
             with st.form("form_hapus"):
-                alasan_hapus = st.selectbox("Jenis Aksi", ["Likuidasi (Dijual)", "Rusak/Musnah", "Hilang", "Donasi"])
+                alasan_hapus = st.selectbox("Jenis Aksi", JENIS_LIKUIDASI)
                 ket_hapus = st.text_area("Detail Keterangan", "Mesin sudah tua/rusak")
                 
                 if st.form_submit_button("🗑️ Konfirmasi Hapus"):
                     try:
-                        cell = ws_master.find(id_hapus)
-                        ws_master.delete_rows(cell.row)
+                        baris_hapus = cari_baris("master_aset", id_hapus)
                         
-                        log_id = generate_id("riwayat_log")
+                        [log_id], req_id_log = cadangkan_id("riwayat_log")
                         tgl_skrg = datetime.now().strftime("%Y-%m-%d")
                         row_log = [
                             log_id,
@@ -658,20 +2474,48 @@ elif menu == "⚡ Kelola Aset (Admin)":
                             alasan_hapus,
                             tgl_skrg,
                             data_hapus['nama_mesin'],
-                            int(data_hapus['harga_beli']) if pd.notna(data_hapus['harga_beli']) else 0,
+                            harga_ke_int(data_hapus['harga_beli']),
                             str(data_hapus['no_registrasi']),
                             id_hapus,
                             ket_hapus
                         ]
-                        ws_log.append_row(row_log)
-                        
-                        st.success("Data berhasil dihapus dari Master dan dicatat di History.")
-                        st.cache_data.clear()
-                        time.sleep(1)
+                        simpan_batch([
+                            req_ubah_sel(ws_master, baris_hapus, 7, [STATUS_NONAKTIF]),  # status (soft delete)
+                            *req_tambah_log([row_log]),
+                            req_id_log,
+                        ], "Data berhasil dihapus dari Master dan dicatat di History.")
                         st.rerun()
                     except Exception as e:
                         st.error(f"Error: {e}")
 
+        with st.expander("📦 Likuidasi Massal (Banyak Aset Sekaligus)"):
+            df_pilih_hapus = pilih_aset_banyak(df_master, "hapus")
+
+            if not df_pilih_hapus.empty:
+                st.warning(f"⚠️ Anda akan menghapus **{len(df_pilih_hapus)} aset** secara permanen dari Master Aset.")
+                with st.form("form_hapus_massal"):
+                    alasan_massal = st.selectbox("Jenis Aksi", JENIS_LIKUIDASI, key="alasan_massal")
+                    ket_hapus_massal = st.text_area("Detail Keterangan", "Mesin sudah tua/rusak", key="ket_hapus_massal")
+
+                    if st.form_submit_button(f"🗑️ Konfirmasi Hapus {len(df_pilih_hapus)} Aset"):
+                        try:
+                            daftar_baris = cari_banyak_baris("master_aset", df_pilih_hapus['id'].tolist())
+                            log_ids, req_id_log = cadangkan_id("riwayat_log", len(df_pilih_hapus))
+                            tgl_skrg = datetime.now().strftime("%Y-%m-%d")
+                            rows_log = [
+                                baris_log_aset(log_id, aset, alasan_massal, tgl_skrg, ket_hapus_massal)
+                                for log_id, aset in zip(log_ids, df_pilih_hapus.to_dict('records'))
+                            ]
+                            simpan_batch([
+                                *[req_ubah_sel(ws_master, baris, 7, [STATUS_NONAKTIF]) for baris in daftar_baris],
+                                *req_tambah_log(rows_log),
+                                req_id_log,
+                            ], f"{len(df_pilih_hapus)} aset berhasil dihapus dari Master dan dicatat di History.")
+                            reset_pilihan_banyak("hapus")
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+
     # --- TAB 5: KOREKSI LOG (UNDO) ---
     with tab5:
         st.subheader("🛠️ Koreksi / Edit Riwayat Log")
@@ -680,22 +2524,18 @@ elif menu == "⚡ Kelola Aset (Admin)":
         # 1. Filter Tanggal
         tgl_filter_log = st.date_input("Pilih Tanggal Kejadian", value=date.today())
         
-        # 2. Ambil Data Log
-        df_log = load_data("riwayat_log")
-        
-        # Filter berdasarkan tanggal string
-        df_log['tanggal_str'] = pd.to_datetime(df_log['tanggal'], errors='coerce').dt.strftime('%Y-%m-%d')
-        df_target = df_log[df_log['tanggal_str'] == tgl_filter_log.strftime('%Y-%m-%d')]
+        # 2. Ambil Data Log pada tanggal tersebut (hanya partisi yang memuat tanggal itu)
+        df_target = query_log(tgl_filter_log, tgl_filter_log, urut="_partisi, _baris")
         
         if not df_target.empty:
             # 3. Pilih ID Log
-            pilihan_log = st.selectbox("Pilih Log untuk Diedit:", 
-                df_target['id'].astype(str) + " | " + df_target['nama_mesin'] + " | " + df_target['jenis_aksi'])
+            data_log = pilih_id(
+                "Pilih Log untuk Diedit:", df_target,
+                lambda d: d['id'] + " | " + d['nama_mesin'] + " | " + d['jenis_aksi'], key="sel_koreksi"
+            )
             
-            if pilihan_log:
-                id_log_pilih = pilihan_log.split(" | ")[0]
-                # Ambil data spesifik
-                data_log = df_target[df_target['id'].astype(str) == id_log_pilih].iloc[0]
+            if data_log is not None:
+                id_log_pilih = str(data_log['id'])
                 
                 with st.form("form_edit_log"):
                     st.write(f"**ID Log:** {id_log_pilih}")
@@ -716,31 +2556,24 @@ elif menu == "⚡ Kelola Aset (Admin)":
                     
                     if save_btn:
                         try:
-                            # Cari baris berdasarkan ID Log
-                            cell = ws_log.find(id_log_pilih)
-                            r = cell.row
-                            
-                            # Update kolom spesifik
-                            ws_log.update_cell(r, 2, edit_lokasi) # lokasi_asal
-                            ws_log.update_cell(r, 4, edit_aksi)   # jenis_aksi
-                            ws_log.update_cell(r, 5, edit_tgl.strftime("%Y-%m-%d")) # tanggal
-                            ws_log.update_cell(r, 6, edit_nama)   # nama_mesin
-                            ws_log.update_cell(r, 10, edit_ket)   # keterangan
+                            # Cari partisi & baris berdasarkan ID Log
+                            ws_partisi, r = cari_log(id_log_pilih)
+                            req_rentang = get_meta_sheet().req_rentang(ws_partisi.title, [edit_tgl.strftime("%Y-%m-%d")])
                             
-                            st.success("Log berhasil dikoreksi!")
-                            time.sleep(1)
-                            st.cache_data.clear()
+                            # Update kolom spesifik (satu batch)
+                            simpan_batch([
+                                req_ubah_sel(ws_partisi, r, 2, [edit_lokasi]),  # lokasi_asal
+                                req_ubah_sel(ws_partisi, r, 4, [edit_aksi, edit_tgl.strftime("%Y-%m-%d"), edit_nama]),  # jenis_aksi, tanggal, nama_mesin
+                                req_ubah_sel(ws_partisi, r, 10, [edit_ket]),    # keterangan
+                            ] + ([req_rentang] if req_rentang else []), "Log berhasil dikoreksi!")
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error: {e}")
                             
                     if delete_btn:
                         try:
-                            cell = ws_log.find(id_log_pilih)
-                            ws_log.delete_rows(cell.row)
-                            st.success("Log berhasil dihapus permanen!")
-                            time.sleep(1)
-                            st.cache_data.clear()
+                            # ID dikosongkan = log dihapus; barisnya dibuang saat kompaksi
+                            simpan_batch([req_ubah_sel(*cari_log(id_log_pilih), 1, [""])], "Log berhasil dihapus permanen!")
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error hapus: {e}")
@@ -752,11 +2585,14 @@ elif menu == "⚡ Kelola Aset (Admin)":
         st.subheader("♻️ Restore & Batalkan Aksi")
         st.info("Fitur ini mengembalikan kondisi aset ke status sebelum aksi dilakukan (Revert Transaction).")
 
-        # 1. Load Data Log Full
+        # 1. Load Data Log (partisi yang beririsan dengan rentang filter terakhir)
+        rentang_restore = st.session_state.get("tgl_restore", (date.today() - timedelta(days=90), date.today()))
+        if isinstance(rentang_restore, tuple) and len(rentang_restore) == 2:
+            get_replika().pastikan_rentang(*rentang_restore)
         df_log_full = load_data("riwayat_log")
         
         # Filter awal: Hanya ambil jenis aksi yang valid untuk di-revert
-        aksi_revertable = ["Mutasi", "Likuidasi (Dijual)", "Rusak/Musnah", "Hilang", "Donasi"]
+        aksi_revertable = ["Mutasi"] + JENIS_LIKUIDASI
         
         # Pastikan kolom tanggal ada dan bertipe datetime
         if 'tanggal' in df_log_full.columns:
@@ -774,7 +2610,7 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         # Filter Tanggal
                         today = date.today()
                         last_month = today - timedelta(days=90) # Default 3 bulan
-                        input_tgl = st.date_input("Rentang Tanggal Kejadian", (last_month, today))
+                        input_tgl = st.date_input("Rentang Tanggal Kejadian", (last_month, today), key="tgl_restore")
                         
                         # Filter Lokasi
                         opt_lok = sorted(df_revert['lokasi_asal'].astype(str).unique().tolist())
@@ -821,18 +2657,15 @@ elif menu == "⚡ Kelola Aset (Admin)":
             if not df_display_rev.empty:
                 st.markdown(f"**Ditemukan {len(df_display_rev)} riwayat transaksi.**")
                 
-                pilih_log_revert = st.selectbox(
-                    "Pilih Transaksi yang akan dibatalkan:",
-                    df_display_rev.apply(
-                        lambda x: f"{x['tanggal']} | {x['jenis_aksi']} | {x['nama_mesin']} (ID Log: {x['id']})", 
-                        axis=1
-                    )
+                data_log = pilih_id(
+                    "Pilih Transaksi yang akan dibatalkan:", df_display_rev,
+                    lambda d: d['tanggal'] + " | " + d['jenis_aksi'] + " | " + d['nama_mesin'] + " (ID Log: " + d['id'] + ")",
+                    key="sel_restore"
                 )
                 
-                if pilih_log_revert:
+                if data_log is not None:
                     # Ambil ID Log
-                    id_log_rev = pilih_log_revert.split("(ID Log: ")[1].replace(")", "")
-                    data_log = df_display_rev[df_display_rev['id'].astype(str) == id_log_rev].iloc[0]
+                    id_log_rev = str(data_log['id'])
                     
                     # 5. TAMPILAN DETAIL (Update: Ada No Registrasi)
                     st.markdown("---")
@@ -854,11 +2687,25 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         st.write(f"- **Harga Beli:** Rp {int(data_log['harga_beli'] if pd.notna(data_log['harga_beli']) and str(data_log['harga_beli']).isdigit() else 0):,.0f}")
                         st.write(f"- **Keterangan:** {data_log['keterangan']}")
                     
+                    # Jejak aset: aksi yang lebih baru harus dibatalkan dulu agar restore tepat sasaran
+                    get_replika().pastikan_rentang(pd.Timestamp(data_log['tanggal_dt']).date() if pd.notna(data_log['tanggal_dt']) else None, None)
+                    df_jejak = get_replika().jejak(data_log['no_reg_system'])
+                    df_lebih_baru = aksi_sesudah(df_jejak, id_log_rev)
+                    with st.expander(f"🕵️ Jejak Aset ID {data_log['no_reg_system']} ({len(df_jejak)} catatan)", expanded=not df_lebih_baru.empty):
+                        tampilkan_jejak(df_jejak, sorot=id_log_rev)
+
                     st.markdown("---")
-                    st.warning(f"⚠️ Apakah Anda yakin ingin membatalkan aksi **{data_log['jenis_aksi']}** ini?")
+                    if not df_lebih_baru.empty:
+                        st.error(
+                            f"⛔ Ada {len(df_lebih_baru)} aksi lebih baru pada aset ini "
+                            f"(terakhir: {df_lebih_baru['jenis_aksi'].iloc[-1]}, ID Log {df_lebih_baru['id'].iloc[-1]}). "
+                            "Batalkan aksi yang lebih baru terlebih dahulu."
+                        )
+                    else:
+                        st.warning(f"⚠️ Apakah Anda yakin ingin membatalkan aksi **{data_log['jenis_aksi']}** ini?")
                     
                     # Tombol Eksekusi (Harus di luar form filter)
-                    btn_revert = st.button("♻️ Proses Pemulihan (Restore)")
+                    btn_revert = st.button("♻️ Proses Pemulihan (Restore)", disabled=not df_lebih_baru.empty)
                     
                     if btn_revert:
                         try:
@@ -867,52 +2714,54 @@ elif menu == "⚡ Kelola Aset (Admin)":
                             
                             # --- SKENARIO 1: BATAL MUTASI ---
                             if "Mutasi" in data_log['jenis_aksi']:
-                                cell = ws_master.find(id_aset_target)
-                                if cell:
-                                    ws_master.update_cell(cell.row, 2, data_log['lokasi_asal'])
+                                aset_target = baris_aset(id_aset_target)
+                                if aset_target is not None and aset_target[1]:
+                                    baris_target = aset_target[0]
                                     
-                                    log_id_new = generate_id("riwayat_log")
-                                    row_log = [
-                                        log_id_new, "System Restore", data_log['kategori'], "Batal Mutasi",
-                                        tgl_skrg, data_log['nama_mesin'], data_log['harga_beli'],
-                                        data_log['no_registrasi'], id_aset_target,
-                                        f"Mengembalikan mutasi Log ID {id_log_rev}. Kembali ke {data_log['lokasi_asal']}."
-                                    ]
-                                    ws_log.append_row(row_log)
-                                    st.success(f"Berhasil! Aset dikembalikan ke lokasi: {data_log['lokasi_asal']}")
-                                    time.sleep(2)
-                                    st.cache_data.clear()
+                                    # Kolom aset di log = keadaan master SEBELUM dibatalkan (lokasi tujuan mutasi)
+                                    aset_kini = get_replika().query(
+                                        "SELECT * FROM master_aset WHERE _baris = ?", [baris_target]
+                                    ).iloc[0]
+                                    [log_id_new], req_id_log = cadangkan_id("riwayat_log")
+                                    row_log = baris_log_aset(
+                                        log_id_new, aset_kini, "Batal Mutasi", tgl_skrg,
+                                        f"{PENANDA_SEBELUM}Mengembalikan mutasi Log ID {id_log_rev}. Kembali ke {data_log['lokasi_asal']}."
+                                    )
+                                    simpan_batch([
+                                        req_ubah_sel(ws_master, baris_target, 2, [data_log['lokasi_asal']]),
+                                        *req_tambah_log([row_log]),
+                                        req_id_log,
+                                    ], f"Berhasil! Aset dikembalikan ke lokasi: {data_log['lokasi_asal']}")
                                     st.rerun()
                                 else:
                                     st.error("Gagal: Aset tidak ditemukan di Master (mungkin sudah dihapus).")
 
                             # --- SKENARIO 2: BATAL LIKUIDASI ---
                             else:
-                                try:
-                                    cek_duplikat = ws_master.find(id_aset_target)
-                                    if cek_duplikat:
-                                        st.error(f"Gagal: Aset ID {id_aset_target} SUDAH AKTIF. Tidak perlu restore.")
-                                        st.stop()
-                                except gspread.exceptions.CellNotFound:
-                                    pass 
+                                aset_target = baris_aset(id_aset_target)
+                                if aset_target is not None and aset_target[1]:
+                                    st.error(f"Gagal: Aset ID {id_aset_target} SUDAH AKTIF. Tidak perlu restore.")
+                                    st.stop()
                                 
                                 row_restore = [
                                     id_aset_target, data_log['lokasi_asal'], data_log['kategori'],
                                     data_log['nama_mesin'], data_log['harga_beli'], data_log['no_registrasi'], "Aktif"
                                 ]
-                                ws_master.append_row(row_restore)
                                 
-                                log_id_new = generate_id("riwayat_log")
+                                [log_id_new], req_id_log = cadangkan_id("riwayat_log")
                                 row_log = [
                                     log_id_new, "Non-Aktif", data_log['kategori'], "Restore Aset",
                                     tgl_skrg, data_log['nama_mesin'], data_log['harga_beli'],
                                     data_log['no_registrasi'], id_aset_target,
                                     f"Pembatalan {data_log['jenis_aksi']} (Log ID {id_log_rev}). Aset aktif kembali."
                                 ]
-                                ws_log.append_row(row_log)
-                                st.success(f"Berhasil! Aset {data_log['nama_mesin']} telah dipulihkan.")
-                                time.sleep(2)
-                                st.cache_data.clear()
+                                # Baris non-aktif yang belum dikompaksi cukup diaktifkan lagi di tempat
+                                simpan_batch([
+                                    req_ubah_sel(ws_master, aset_target[0], 1, row_restore) if aset_target
+                                    else req_tambah_baris(ws_master, [row_restore]),
+                                    *req_tambah_log([row_log]),
+                                    req_id_log,
+                                ], f"Berhasil! Aset {data_log['nama_mesin']} telah dipulihkan.")
                                 st.rerun()
 
                         except Exception as e:
@@ -925,16 +2774,19 @@ elif menu == "⚡ Kelola Aset (Admin)":
 # HALAMAN 4: REKAP ASET (UX BARU)
 # ==========================================
 elif menu == "📊 Rekap Aset Aktif":
-    # 1. Load Data
-    df = load_data("master_aset")
+    # 1. Load Data (kubus lokasi x kategori di-cache per versi replika)
+    replika = get_replika()
+    load_data("master_aset")
+    versi_master = replika.versi_lokal.get("master_aset", 0)
+    kubus = kubus_rekap(versi_master)
 
     # --- SIDEBAR FILTER (GAYA DASHBOARD) ---
     with st.sidebar.form("filter_rekap_form"):
         st.header("🎛️ Filter Rekap")
         
-        # Ambil list unik (Sorted)
-        opt_lokasi = sorted(df['lokasi_toko'].unique().tolist()) if not df.empty else []
-        opt_kategori = sorted(df['kategori'].unique().tolist()) if not df.empty else []
+        # Ambil list unik dari kubus (sudah urut)
+        opt_lokasi = kubus.index.tolist()
+        opt_kategori = kubus.columns.tolist()
         
         # Multiselect dengan placeholder "Kosong = Semua"
         # Kita biarkan default=[] (kosong) agar UX-nya bersih
@@ -945,15 +2797,8 @@ elif menu == "📊 Rekap Aset Aktif":
         btn_terapkan = st.form_submit_button("🚀 Terapkan Filter")
 
     # --- LOGIKA FILTERING ---
-    # Jika tombol ditekan atau halaman baru dimuat
-    df_filtered = df.copy()
-    
-    # Logika: Jika list TIDAK kosong, maka filter. Jika kosong, abaikan (ambil semua).
-    if sel_lokasi:
-        df_filtered = df_filtered[df_filtered['lokasi_toko'].isin(sel_lokasi)]
-    
-    if sel_kategori:
-        df_filtered = df_filtered[df_filtered['kategori'].isin(sel_kategori)]
+    # Filter = irisan kubus (tanpa GROUP BY ulang). Jika list kosong, ambil semua.
+    pivot_data = potong_kubus(kubus, sel_lokasi, sel_kategori) if not kubus.empty else kubus
 
     # --- TAMPILAN UTAMA ---
     st.title("📊 Dashboard Rekapitulasi Aset")
@@ -963,11 +2808,13 @@ elif menu == "📊 Rekap Aset Aktif":
     lbl_kat = "Semua Kategori" if not sel_kategori else f"{len(sel_kategori)} Kategori Terpilih"
     st.caption(f"Filter Aktif: **{lbl_lok}** | **{lbl_kat}**")
 
-    if not df_filtered.empty:
+    if not pivot_data.empty:
         # --- METRIK RINGKAS (TANPA NILAI RUPIAH) ---
-        total_aset_view = len(df_filtered)
-        total_lokasi_view = df_filtered['lokasi_toko'].nunique()
-        total_kategori_view = df_filtered['kategori'].nunique()
+        total_per_lokasi = pivot_data.sum(axis=1)
+        total_per_kategori = pivot_data.sum(axis=0)
+        total_aset_view = int(total_per_lokasi.sum())
+        total_lokasi_view = len(pivot_data.index)
+        total_kategori_view = len(pivot_data.columns)
         
         m1, m2, m3 = st.columns(3)
         m1.metric("📦 Total Unit Aset", f"{total_aset_view}")
@@ -978,25 +2825,30 @@ elif menu == "📊 Rekap Aset Aktif":
         # --- PIVOT TABLE (HEATMAP) ---
         st.subheader("📋 Peta Persebaran Aset")
         
-        # Buat Pivot Table
-        pivot_data = pd.crosstab(
-            index=df_filtered['lokasi_toko'], 
-            columns=df_filtered['kategori'],
-            margins=True,
-            margins_name="TOTAL"
-        )
+        # Heatmap hanya di-style untuk halaman yang tampil; skala warna tetap dari seluruh data terfilter
+        jumlah_halaman = max(1, -(-total_lokasi_view // REKAP_BARIS_PER_HALAMAN))
+        halaman = 1
+        if jumlah_halaman > 1:
+            halaman = st.number_input(f"Halaman (dari {jumlah_halaman})", 1, jumlah_halaman, 1, key="hal_rekap")
+        awal = (halaman - 1) * REKAP_BARIS_PER_HALAMAN
+        tampil = pivot_data.iloc[awal:awal + REKAP_BARIS_PER_HALAMAN].copy()
+        tampil["TOTAL"] = total_per_lokasi.iloc[awal:awal + REKAP_BARIS_PER_HALAMAN]
+        tampil.loc["TOTAL"] = pd.concat([total_per_kategori, pd.Series({"TOTAL": total_aset_view})])
         
-        # Tampilkan dengan Heatmap (Warna Biru)
+        # Tampilkan dengan Heatmap (Warna Biru): skala = sel terbesar di cube, baris/kolom TOTAL tidak diwarnai
+        sel_maks = int(pivot_data.to_numpy().max()) if pivot_data.size else 0
         st.dataframe(
-            pivot_data.style.background_gradient(cmap="Blues", axis=None).format("{:.0f}"),
+            tampil.style.background_gradient(
+                cmap="Blues", axis=None, vmin=0, vmax=max(sel_maks, 1),
+                subset=pd.IndexSlice[tampil.index[:-1], tampil.columns[:-1]]
+            ).format("{:.0f}"),
             use_container_width=True
         )
         
         # --- DOWNLOAD BUTTON ---
-        excel_data = convert_df_to_excel(pivot_data)
         st.download_button(
             label="📥 Download Rekap Excel",
-            data=excel_data,
+            data=lambda: excel_rekap(versi_master, tuple(sel_lokasi), tuple(sel_kategori)),
             file_name='rekap_aset_dashboard.xlsx',
             mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
@@ -1005,11 +2857,147 @@ elif menu == "📊 Rekap Aset Aktif":
         st.markdown("---")
         st.subheader("📊 Grafik Komposisi")
         
-        # Hapus baris/kolom 'TOTAL' agar grafik tidak rusak
-        chart_data = pivot_data.drop("TOTAL", axis=0, errors='ignore').drop("TOTAL", axis=1, errors='ignore')
-        
-        # Tampilkan Bar Chart
-        st.bar_chart(chart_data)
+        # Grafik dari irisan kubus (tanpa baris/kolom TOTAL)
+        st.bar_chart(pivot_data)
+
+    else:
+        st.warning("Data tidak ditemukan dengan kombinasi filter tersebut.")
+
+# ==========================================
+# HALAMAN 5: TREN BULANAN (MUTASI & LIKUIDASI)
+# ==========================================
+elif menu == "📈 Tren Bulanan":
+    st.title("📈 Tren Bulanan Mutasi & Likuidasi")
+    replika = get_replika()
+
+    with st.sidebar.form("filter_tren_form"):
+        st.header("🎛️ Filter Tren")
+        tampil_semua = st.checkbox("Tampilkan Semua Bulan", value=False)
+        today = date.today()
+        filter_tgl = st.date_input("Rentang Bulan", (today.replace(day=1) - timedelta(days=334), today))
+        st.markdown("---")
+        dimensi_label = st.selectbox("Rincian per", list(DIMENSI_TREN))
+        ukuran_label = st.radio("Ukuran", list(UKURAN_TREN), horizontal=True)
+        btn_tren = st.form_submit_button("🚀 Terapkan Filter")
+
+    # Partisi log yang dibutuhkan rentang ini dimuat dulu; agregat _tren ikut terisi saat dimuat
+    start_date = end_date = None
+    if not tampil_semua and isinstance(filter_tgl, tuple) and len(filter_tgl) == 2:
+        start_date, end_date = filter_tgl
+    if pastikan_tabel("riwayat_log"):
+        replika.pastikan_rentang(start_date, end_date)
+    df_tren = tren_bulanan(replika.versi_lokal.get("riwayat_log", 0))
+    if start_date:
+        df_tren = df_tren[df_tren['bulan'].between(f"{start_date:%Y-%m}", f"{end_date:%Y-%m}")]
+
+    dimensi, ukuran = DIMENSI_TREN[dimensi_label], UKURAN_TREN[ukuran_label]
+    if not df_tren.empty:
+        # Filter nilai dimensi (di luar form agar opsi mengikuti rentang bulan)
+        c1, c2, c3 = st.columns(3)
+        sel_aksi = c1.multiselect("Jenis Aksi (Kosong = Semua)", sorted(df_tren['jenis_aksi'].unique()), key="tren_aksi")
+        sel_lokasi = c2.multiselect("Lokasi Asal (Kosong = Semua)", sorted(df_tren['lokasi_asal'].unique()), key="tren_lokasi")
+        sel_kategori = c3.multiselect("Kategori (Kosong = Semua)", sorted(df_tren['kategori'].unique()), key="tren_kategori")
+        for kolom, pilihan in [('jenis_aksi', sel_aksi), ('lokasi_asal', sel_lokasi), ('kategori', sel_kategori)]:
+            if pilihan:
+                df_tren = df_tren[df_tren[kolom].isin(pilihan)]
+
+    if not df_tren.empty:
+        bulan_awal = f"{start_date:%Y-%m}" if start_date else df_tren['bulan'].min()
+        bulan_akhir = f"{end_date:%Y-%m}" if end_date else df_tren['bulan'].max()
+        pivot = pivot_tren(df_tren, dimensi, ukuran, bulan_awal, bulan_akhir)
 
+        m1, m2, m3 = st.columns(3)
+        m1.metric("🔁 Total Transaksi", f"{int(df_tren['jumlah'].sum())}")
+        m2.metric("💰 Total Nilai", format_rupiah(pd.Series([df_tren['nilai'].sum()])).iloc[0])
+        m3.metric("🗓️ Jumlah Bulan", f"{len(pivot)}")
+        st.markdown("---")
+
+        # Grafik: dimensi terbesar saja agar tetap terbaca
+        st.subheader(f"📈 {ukuran_label} per {dimensi_label}")
+        total_kolom = pivot.sum(axis=0).sort_values(ascending=False)
+        grafik = pivot[total_kolom.index[:TREN_GARIS_MAKS]].copy()
+        if len(total_kolom) > TREN_GARIS_MAKS:
+            grafik["Lainnya"] = pivot[total_kolom.index[TREN_GARIS_MAKS:]].sum(axis=1)
+        st.line_chart(grafik)
+
+        # Tabel bulan x dimensi + total
+        st.subheader("📋 Tabel Bulanan")
+        tabel = pivot[total_kolom.index].copy()
+        tabel["TOTAL"] = tabel.sum(axis=1)
+        tabel.loc["TOTAL"] = tabel.sum(axis=0)
+        st.dataframe(
+            tabel.apply(format_rupiah) if ukuran == "nilai" else tabel,
+            use_container_width=True
+        )
+
+        st.download_button(
+            label="📥 Download Tren Excel",
+            data=lambda: convert_df_to_excel(df_tren.sort_values(['bulan'] + KUNCI_TREN)),
+            file_name='tren_bulanan.xlsx',
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+    else:
+        st.warning("Tidak ada transaksi pada rentang / filter ini.")
+
+# ==========================================
+# HALAMAN 6: INVENTARIS PER TANGGAL (AUDIT)
+# ==========================================
+elif menu == "🕰️ Inventaris per Tanggal":
+    st.title("🕰️ Inventaris Aset per Tanggal")
+    replika = get_replika()
+
+    with st.sidebar.form("filter_inventaris_form"):
+        st.header("🎛️ Filter Inventaris")
+        today = date.today()
+        tgl_inventaris = st.date_input("Per Tanggal (akhir hari)", value=date(today.year - 1, 12, 31), max_value=today)
+        btn_inventaris = st.form_submit_button("🚀 Tampilkan")
+
+    if pastikan_tabel("master_aset") and pastikan_tabel("riwayat_log"):
+        with st.spinner("Menyusun inventaris dari snapshot & riwayat log..."):
+            replika.pastikan_rentang(tgl_inventaris, None)
+            df_inv = inventaris_pada(
+                tgl_inventaris, replika.versi_lokal.get("master_aset", 0), replika.versi_lokal.get("riwayat_log", 0)
+            )
+    else:
+        df_inv = pd.DataFrame(columns=KOLOM_INVENTARIS)
+    st.caption(
+        f"Kondisi aset aktif pada **{tgl_inventaris:%d-%m-%Y}**, disusun dari Master Aset saat ini dengan membatalkan "
+        "riwayat log sesudah tanggal tersebut. Aset tanpa log 'Input Baru' dianggap sudah ada sejak awal pencatatan."
+    )
+
+    c1, c2 = st.columns(2)
+    sel_lokasi_inv = c1.multiselect("Lokasi (Kosong = Semua)", sorted(df_inv['lokasi_toko'].unique()), key="inv_lokasi")
+    sel_kategori_inv = c2.multiselect("Kategori (Kosong = Semua)", sorted(df_inv['kategori'].unique()), key="inv_kategori")
+    if sel_lokasi_inv:
+        df_inv = df_inv[df_inv['lokasi_toko'].isin(sel_lokasi_inv)]
+    if sel_kategori_inv:
+        df_inv = df_inv[df_inv['kategori'].isin(sel_kategori_inv)]
+
+    if not df_inv.empty:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("📦 Total Unit", f"{len(df_inv)}")
+        m2.metric("💰 Total Nilai", format_rupiah(pd.Series([df_inv['harga_beli'].sum()])).iloc[0])
+        m3.metric("📍 Jumlah Lokasi", f"{df_inv['lokasi_toko'].nunique()}")
+
+        st.download_button(
+            "📥 Download Excel",
+            data=lambda: convert_df_to_excel(df_inv),
+            file_name=f"inventaris_{tgl_inventaris:%Y%m%d}.xlsx",
+            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+
+        # Hanya halaman aktif yang diformat Rupiah
+        c_ukuran, c_hal = st.columns([1, 1])
+        ukuran = c_ukuran.selectbox("Baris / halaman", UKURAN_HALAMAN, index=1, key="inv_ukuran")
+        jumlah_hal = max(1, -(-len(df_inv) // ukuran))
+        if st.session_state.get("inv_hal", 1) > jumlah_hal:
+            st.session_state["inv_hal"] = jumlah_hal
+        hal = c_hal.number_input(f"Halaman (dari {jumlah_hal})", min_value=1, max_value=jumlah_hal, key="inv_hal")
+        tampil = df_inv.iloc[(hal - 1) * ukuran:hal * ukuran].copy()
+        tampil['harga_beli'] = format_rupiah(tampil['harga_beli'])
+        st.dataframe(tampil, use_container_width=True, hide_index=True)
     else:
-        st.warning("Data tidak ditemukan dengan kombinasi filter tersebut.")
\ No newline at end of file
+        st.warning("Tidak ada aset aktif pada tanggal / filter ini.")
+
+profil.tanda(f"Halaman: {menu}")
+profil.laporan()
@@ -1,9 +1,13 @@
 import streamlit as st
-import mysql.connector
-import pandas as pd
+import profil_startup
+profil = profil_startup.mulai()  # PROFIL_STARTUP=1 -> waktu import & per bagian di sidebar
 import os
 import io
+import re
+import json
 import time
+import threading
+from collections import OrderedDict
 from datetime import date, timedelta
 from dotenv import load_dotenv
 
@@ -16,6 +20,7 @@ st.set_page_config(
 
 # Load Environment Variables
 load_dotenv(override=True)
+profil.tanda("Konfigurasi")
 
 # ==========================================
 # 🔐 SISTEM LOGIN (SESSION STATE)
@@ -51,45 +56,364 @@ if not st.session_state['status_login']:
         st.button("Masuk", on_click=proses_login)
     
     # Hentikan program di sini jika belum login (Security Gate)
+    profil.tanda("Form login")
+    profil.laporan()
     st.stop()
 
 # ==========================================
 # APLIKASI UTAMA (Hanya muncul jika Login Sukses)
 # ==========================================
+# Modul berat baru dimuat setelah login (form login tidak membutuhkannya)
+import mysql.connector
+import mysql.connector.pooling
+import pandas as pd
+profil.tanda("Import pandas & mysql")
 
 # --- FUNGSI KONEKSI DATABASE ---
+KONFIG_DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    user=os.getenv("DB_USER", "root"),
+    password=os.getenv("DB_PASS", ""),
+    database="manajemen_aset",
+)
+POOL_TULIS = int(os.getenv("POOL_TULIS", "5"))  # Koneksi transaksi tulis yang boleh berjalan bersamaan
+
 @st.cache_resource
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        user=os.getenv("DB_USER", "root"),
-        password=os.getenv("DB_PASS", ""),
-        database="manajemen_aset"
+    return mysql.connector.connect(**KONFIG_DB)
+
+@st.cache_resource
+def get_db_pool():
+    # Koneksi khusus transaksi: tiap transaksi memakai sesi MySQL sendiri, tidak berbagi dengan sesi lain / load_data
+    return mysql.connector.pooling.MySQLConnectionPool(pool_name="aset_tulis", pool_size=POOL_TULIS, **KONFIG_DB)
+
+# --- TABEL & INDEX PENDUKUNG (dibuat sekali per proses jika belum ada) ---
+TABEL_WAJIB = [
+    # Before-image setiap aksi tulis, kunci ke log & aset -> undo cukup lookup primary key
+    """
+    CREATE TABLE IF NOT EXISTS jurnal_aset (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        log_id INT NOT NULL,
+        aset_id INT NOT NULL,
+        jenis_aksi VARCHAR(50),
+        before_image JSON NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uk_jurnal_log (log_id),
+        KEY idx_jurnal_aset (aset_id, id)
     )
+    """,
+]
 
-# --- FUNGSI SQL EKSEKUTOR ---
-def run_query(query, params=None):
+INDEX_WAJIB = [
+    ("riwayat_log", "idx_log_created", "CREATE INDEX idx_log_created ON riwayat_log (created_at, id)"),
+    # Jejak aset: semua log satu ID System berurutan waktu tanpa scan tabel
+    ("riwayat_log", "idx_log_aset", "CREATE INDEX idx_log_aset ON riwayat_log (no_reg_system, created_at, id)"),
+    ("riwayat_log", "ft_log_aset", "CREATE FULLTEXT INDEX ft_log_aset ON riwayat_log (nama_mesin, no_registrasi, no_reg_system) WITH PARSER ngram"),
+]
+
+@st.cache_resource
+def siapkan_skema():
+    """Buat index yang belum ada. Mengembalikan set nama index yang siap dipakai."""
     conn = get_db_connection()
     cursor = conn.cursor()
+    index_siap = set()
+    try:
+        for ddl in TABEL_WAJIB:
+            try:
+                cursor.execute(ddl)
+            except Exception:
+                pass
+        for tabel, nama_index, ddl in INDEX_WAJIB:
+            try:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                    (tabel, nama_index)
+                )
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute(ddl)
+                index_siap.add(nama_index)
+            except Exception:
+                # User DB tanpa hak ALTER: aplikasi tetap jalan, hanya tanpa index ini
+                pass
+        conn.commit()
+    finally:
+        cursor.close()
+    return index_siap
+
+# --- CACHE HASIL QUERY (LRU + TTL) ---
+CACHE_TTL_DETIK = int(os.getenv("CACHE_TTL_DETIK", "300"))
+CACHE_MAKS_ENTRI = int(os.getenv("CACHE_MAKS_ENTRI", "256"))
+
+# Ambil nama tabel dari SELECT/JOIN/INSERT/UPDATE/DELETE
+POLA_TABEL = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+`?(\w+)`?", re.IGNORECASE)
+
+def tabel_dari_query(query):
+    return {t.lower() for t in POLA_TABEL.findall(query)}
+
+class CacheQuery:
+    """Cache hasil SELECT per (teks SQL, parameter). Dibuang per tabel setiap ada penulisan."""
+
+    def __init__(self, ttl, maks_entri):
+        self.ttl = ttl
+        self.maks_entri = maks_entri
+        self._data = OrderedDict()  # kunci -> (waktu_simpan, set_tabel, dataframe)
+        self._lock = threading.Lock()
+        self.hit = 0
+        self.miss = 0
+        self.dibuang = 0
+
+    def ambil(self, kunci):
+        with self._lock:
+            entri = self._data.get(kunci)
+            if entri is None or time.monotonic() - entri[0] > self.ttl:
+                if entri is not None:
+                    del self._data[kunci]
+                self.miss += 1
+                return None
+            self._data.move_to_end(kunci)
+            self.hit += 1
+            return entri[2].copy()
+
+    def simpan(self, kunci, tabel, df):
+        with self._lock:
+            self._data[kunci] = (time.monotonic(), tabel, df.copy())
+            self._data.move_to_end(kunci)
+            while len(self._data) > self.maks_entri:
+                self._data.popitem(last=False)
+
+    def buang_tabel(self, tabel):
+        with self._lock:
+            kunci_kena = [k for k, v in self._data.items() if v[1] & tabel]
+            for k in kunci_kena:
+                del self._data[k]
+            self.dibuang += len(kunci_kena)
+
+    def kosongkan(self):
+        with self._lock:
+            self._data.clear()
+
+    def statistik(self):
+        with self._lock:
+            total = self.hit + self.miss
+            return {
+                "hit": self.hit,
+                "miss": self.miss,
+                "rasio_hit": (self.hit / total) if total else 0.0,
+                "entri": len(self._data),
+                "dibuang": self.dibuang,
+            }
+
+@st.cache_resource
+def get_query_cache():
+    # Satu cache dipakai bersama oleh semua sesi user
+    return CacheQuery(CACHE_TTL_DETIK, CACHE_MAKS_ENTRI)
+
+# Jumlah baris per halaman untuk mode "All Time" di Riwayat Log
+UKURAN_HALAMAN_LOG = int(os.getenv("UKURAN_HALAMAN_LOG", "100"))
+
+# --- PENCARIAN FULLTEXT (JEJAK ASET) ---
+UKURAN_HALAMAN_JEJAK = 20
+KOLOM_FULLTEXT_LOG = "MATCH(nama_mesin, no_registrasi, no_reg_system) AGAINST (%s IN BOOLEAN MODE)"
+
+def id_jejak(teks):
+    """ID System yang dicari persis: ID aset atau No Registrasi di master, atau ID aset yang sudah dilikuidasi. None jika tidak ada."""
+    teks = teks.strip()
+    if teks.isdigit():
+        df = load_data("SELECT id FROM master_aset WHERE id = %s OR no_registrasi = %s LIMIT 1", (teks, teks))
+    else:
+        df = load_data("SELECT id FROM master_aset WHERE no_registrasi = %s LIMIT 1", (teks,))
+    if not df.empty:
+        return str(df['id'].iloc[0])
+    df = load_data("SELECT 1 AS ada FROM riwayat_log WHERE no_reg_system = %s LIMIT 1", (teks,))
+    return teks if not df.empty else None
+
+def susun_kueri_fulltext(teks):
+    """Ubah input bebas jadi kueri BOOLEAN MODE: setiap kata wajib ada (+"kata")."""
+    # Di dalam tanda kutip operator boolean tidak berlaku, cukup buang tanda kutipnya
+    kata = teks.replace('"', ' ').split()
+    # Parser ngram (token 2 huruf) mengabaikan kata 1 huruf
+    return " ".join(f'+"{k}"' for k in kata if len(k) >= 2)
+
+# --- FUNGSI SQL EKSEKUTOR ---
+def load_data(query, params=None):
+    cache = get_query_cache()
+    kunci = (query, tuple(params) if params else None)
+    df_cache = cache.ambil(kunci)
+    if df_cache is not None:
+        return df_cache
+
+    conn = get_db_connection()
     try:
         if params:
-            cursor.execute(query, params)
+            df = pd.read_sql(query, conn, params=params)
         else:
-            cursor.execute(query)
+            df = pd.read_sql(query, conn)
+        cache.simpan(kunci, tabel_dari_query(query), df)
+        return df
+    except Exception as e:
+        st.error(f"Error Database: {e}")
+        return pd.DataFrame()
+
+# --- UNIT OF WORK (SATU TRANSAKSI PER AKSI ADMIN) ---
+def _nilai_sql(v):
+    # Nilai numpy/pandas -> tipe Python biasa untuk parameter prepared statement
+    if v is None or v is pd.NaT:
+        return None
+    if isinstance(v, float) and v != v:
+        return None
+    if hasattr(v, 'item'):
+        return v.item()
+    return v
+
+def run_transaction(perintah):
+    """Jalankan daftar (query, params) dalam satu transaksi dengan satu commit.
+
+    Satu perintah gagal -> semua dibatalkan (rollback), jadi master & log tidak pernah setengah tersimpan.
+    """
+    try:
+        conn = get_db_pool().get_connection()
+    except Exception as e:
+        return False, str(e)
+    cursor = conn.cursor(prepared=True)
+    try:
+        conn.start_transaction()
+        total_baris = 0
+        for query, params in perintah:
+            cursor.execute(query, tuple(_nilai_sql(v) for v in params) if params else None)
+            total_baris += max(cursor.rowcount, 0)
         conn.commit()
-        return True, cursor.rowcount
+        tabel = set()
+        for query, _ in perintah:
+            tabel |= tabel_dari_query(query)
+        get_query_cache().buang_tabel(tabel)
+        return True, total_baris
     except Exception as e:
+        conn.rollback()
         return False, str(e)
     finally:
         cursor.close()
+        conn.close()  # Kembali ke pool
 
-def load_data(query, params=None):
+# --- JURNAL BEFORE-IMAGE (UNDO) ---
+KOLOM_IMAGE = ['lokasi_toko', 'kategori', 'nama_mesin', 'harga_beli', 'no_registrasi', 'no_reg_system', 'status']
+
+SQL_SIMPAN_LOG_ID = "SET @log_id = LAST_INSERT_ID()"
+SQL_JURNAL_SEBELUM = f"""
+INSERT INTO jurnal_aset (log_id, aset_id, jenis_aksi, before_image)
+SELECT @log_id, id, %s, JSON_OBJECT({', '.join(f"'{k}', {k}" for k in KOLOM_IMAGE)})
+FROM master_aset WHERE id = %s
+"""
+# Tulis balik before-image: update jika baris masih ada, insert ulang (ID sama) jika sudah dihapus
+SQL_TULIS_BEFORE_IMAGE = f"""
+INSERT INTO master_aset (id, {', '.join(KOLOM_IMAGE)})
+VALUES (%s, {', '.join(['%s'] * len(KOLOM_IMAGE))})
+ON DUPLICATE KEY UPDATE {', '.join(f"{k} = VALUES({k})" for k in KOLOM_IMAGE)}
+"""
+SQL_DAFTAR_JURNAL = """
+SELECT j.id AS jurnal_id, j.log_id, j.aset_id, j.jenis_aksi, r.nama_mesin, r.lokasi_asal, r.tanggal_kejadian, r.keterangan
+FROM jurnal_aset j JOIN riwayat_log r ON r.id = j.log_id
+"""
+UKURAN_HALAMAN_UNDO = 10
+
+def perintah_jurnal(jenis_aksi, aset_id):
+    # Dipasang tepat setelah INSERT riwayat_log & sebelum master diubah (dalam transaksi yang sama)
+    return [(SQL_SIMPAN_LOG_ID, None), (SQL_JURNAL_SEBELUM, (jenis_aksi, aset_id))]
+
+def undo_dari_jurnal(jurnal_id):
+    """Batalkan satu aksi dengan menulis balik before-image dari jurnal_aset. Mengembalikan (sukses, pesan).
+
+    Jurnal dibaca di dalam transaksi dengan SELECT ... FOR UPDATE (tanpa cache), jadi dua undo atas jurnal
+    yang sama atau undo yang berbarengan dengan aksi baru pada aset yang sama tidak bisa sama-sama menulis.
+    Koneksi diambil dari pool (sama seperti run_transaction), jadi kunci itu milik transaksi ini saja.
+    """
+    try:
+        conn = get_db_pool().get_connection()
+    except Exception as e:
+        return False, str(e)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cursor.execute("SELECT * FROM jurnal_aset WHERE id = %s FOR UPDATE", (int(jurnal_id),))
+        jurnal = cursor.fetchone()
+        if jurnal is None:
+            conn.rollback()
+            return False, "Jurnal tidak ditemukan (mungkin sudah dibatalkan)."
+        aset_id, log_id = int(jurnal['aset_id']), int(jurnal['log_id'])
+
+        # Kunci baris aset: aksi baru pada aset ini menunggu sampai undo selesai
+        cursor.execute("SELECT id FROM master_aset WHERE id = %s FOR UPDATE", (aset_id,))
+        cursor.fetchall()
+        # Before-image hanya valid jika belum ada aksi yang lebih baru pada aset yang sama
+        cursor.execute(
+            "SELECT id FROM jurnal_aset WHERE aset_id = %s AND id > %s LIMIT 1 FOR UPDATE", (aset_id, int(jurnal_id))
+        )
+        if cursor.fetchall():
+            conn.rollback()
+            return False, "Ada aksi yang lebih baru pada aset ini. Batalkan aksi tersebut terlebih dahulu."
+
+        cursor.execute("DELETE FROM jurnal_aset WHERE id = %s", (int(jurnal_id),))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False, "Jurnal sudah dibatalkan oleh proses lain."
+
+        image = jurnal['before_image']
+        if image is None:
+            # Aset belum ada sebelum aksi ini (Input Baru) -> kebalikannya hapus
+            perintah = [("DELETE FROM master_aset WHERE id = %s", (aset_id,))]
+        else:
+            image = json.loads(image.decode() if isinstance(image, (bytes, bytearray)) else image)
+            perintah = [(SQL_TULIS_BEFORE_IMAGE, (aset_id, *[image.get(k) for k in KOLOM_IMAGE]))]
+        perintah.append(("DELETE FROM riwayat_log WHERE id = %s", (log_id,)))
+        total_baris = 1
+        for query, params in perintah:
+            cursor.execute(query, tuple(_nilai_sql(v) for v in params))
+            total_baris += max(cursor.rowcount, 0)
+        conn.commit()
+        get_query_cache().buang_tabel({"jurnal_aset", "master_aset", "riwayat_log"})
+        return True, total_baris
+    except Exception as e:
+        conn.rollback()
+        return False, str(e)
+    finally:
+        cursor.close()
+        conn.close()  # Kembali ke pool
+
+# --- STREAMING (SERVER-SIDE CURSOR) ---
+def stream_query(query, params=None, ukuran_batch=5000):
+    """Baca hasil query bertahap lewat cursor unbuffered, tanpa menampung semuanya di memori."""
     conn = get_db_connection()
+    cursor = conn.cursor(buffered=False)
     try:
         if params:
-            df = pd.read_sql(query, conn, params=params)
+            cursor.execute(query, params)
         else:
-            df = pd.read_sql(query, conn)
+            cursor.execute(query)
+        kolom = [d[0] for d in cursor.description]
+        while True:
+            baris = cursor.fetchmany(ukuran_batch)
+            if not baris:
+                break
+            yield pd.DataFrame(baris, columns=kolom)
+    finally:
+        # Habiskan sisa baris agar koneksi bisa dipakai query berikutnya
+        try:
+            cursor.fetchall()
+        except Exception:
+            pass
+        cursor.close()
+
+def load_halaman(query, params=None):
+    """Ambil satu halaman (query ber-LIMIT) lewat cursor unbuffered, dengan cache yang sama seperti load_data."""
+    cache = get_query_cache()
+    kunci = (query, tuple(params) if params else None)
+    df_cache = cache.ambil(kunci)
+    if df_cache is not None:
+        return df_cache
+
+    try:
+        potongan = list(stream_query(query, params))
+        df = pd.concat(potongan, ignore_index=True) if potongan else pd.DataFrame()
+        cache.simpan(kunci, tabel_dari_query(query), df)
         return df
     except Exception as e:
         st.error(f"Error Database: {e}")
@@ -103,6 +427,28 @@ def convert_df_to_excel(df):
     processed_data = output.getvalue()
     return processed_data
 
+def convert_query_to_excel(query, params=None):
+    """Export hasil query ke Excel baris demi baris (constant_memory), tanpa membentuk DataFrame penuh."""
+    import xlsxwriter
+
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Sheet1')
+    baris_ke = 0
+    for potongan in stream_query(query, params):
+        if baris_ke == 0:
+            worksheet.write_row(0, 0, potongan.columns.tolist())
+            baris_ke = 1
+        # Tanggal/waktu ditulis sebagai teks, nilai kosong sebagai sel kosong
+        potongan = potongan.astype(object).where(potongan.notna(), None)
+        for baris in potongan.itertuples(index=False, name=None):
+            worksheet.write_row(baris_ke, 0, [str(v) if hasattr(v, 'isoformat') else v for v in baris])
+            baris_ke += 1
+    workbook.close()
+    return output.getvalue()
+
+siapkan_skema()
+
 # --- SIDEBAR NAVIGASI ---
 st.sidebar.title("🎛️ Menu Navigasi")
 st.sidebar.write(f"Login sebagai: **{os.getenv('ADMIN_USER')}**")
@@ -118,6 +464,7 @@ menu = st.sidebar.radio("Pilih Halaman:", [
     "📘 Panduan Pengguna"
 ])
 st.sidebar.markdown("---")
+profil.tanda("Definisi helper & sidebar")
 
 # ==========================================
 # HALAMAN 1: MASTER ASET
@@ -159,10 +506,10 @@ if menu == "Master Aset (Aktif)":
         with col_kiri:
             st.write(f"**Total Data:** {len(df_tampil)} Unit")
         with col_kanan:
-            excel_data = convert_df_to_excel(df_tampil)
+            # File Excel baru disusun saat tombol diklik (xlsxwriter tidak dimuat di setiap rerun)
             st.download_button(
                 label="📥 Download Excel",
-                data=excel_data,
+                data=lambda df=df_tampil: convert_df_to_excel(df),
                 file_name='data_aset_terfilter.xlsx',
                 mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
             )
@@ -193,52 +540,150 @@ elif menu == "Riwayat Log (History)":
         
         query_hist = "SELECT * FROM riwayat_log WHERE tanggal_kejadian BETWEEN %s AND %s ORDER BY created_at DESC"
         df_history = load_data(query_hist, (start_date, end_date))
-    else:
-        df_history = load_data("SELECT * FROM riwayat_log ORDER BY created_at DESC")
-    
-    if not df_history.empty:
-        list_lokasi_hist = sorted(df_history['lokasi_asal'].dropna().unique().tolist())
-        pilih_lokasi_hist = st.sidebar.multiselect("Pilih Lokasi Asal:", list_lokasi_hist)
+
+        if not df_history.empty:
+            list_lokasi_hist = sorted(df_history['lokasi_asal'].dropna().unique().tolist())
+            pilih_lokasi_hist = st.sidebar.multiselect("Pilih Lokasi Asal:", list_lokasi_hist)
         
-        list_kategori_hist = sorted(df_history['kategori'].dropna().unique().tolist())
-        pilih_kategori_hist = st.sidebar.multiselect("Pilih Kategori:", list_kategori_hist)
+            list_kategori_hist = sorted(df_history['kategori'].dropna().unique().tolist())
+            pilih_kategori_hist = st.sidebar.multiselect("Pilih Kategori:", list_kategori_hist)
         
-        list_aksi = sorted(df_history['jenis_aksi'].dropna().unique().tolist())
-        pilih_aksi = st.sidebar.multiselect("Jenis Aksi:", list_aksi)
+            list_aksi = sorted(df_history['jenis_aksi'].dropna().unique().tolist())
+            pilih_aksi = st.sidebar.multiselect("Jenis Aksi:", list_aksi)
         
-        keyword_hist = st.text_input("🔍 Cari History (Nama Mesin):", "")
+            keyword_hist = st.text_input("🔍 Cari History (Nama Mesin):", "")
         
-        df_hist_tampil = df_history.copy()
-        if pilih_lokasi_hist:
-            df_hist_tampil = df_hist_tampil[df_hist_tampil['lokasi_asal'].isin(pilih_lokasi_hist)]
-        if pilih_kategori_hist:
-            df_hist_tampil = df_hist_tampil[df_hist_tampil['kategori'].isin(pilih_kategori_hist)]
-        if pilih_aksi:
-            df_hist_tampil = df_hist_tampil[df_hist_tampil['jenis_aksi'].isin(pilih_aksi)]
-        if keyword_hist:
-            df_hist_tampil = df_hist_tampil[df_hist_tampil['nama_mesin'].str.contains(keyword_hist, case=False, na=False)]
+            df_hist_tampil = df_history.copy()
+            if pilih_lokasi_hist:
+                df_hist_tampil = df_hist_tampil[df_hist_tampil['lokasi_asal'].isin(pilih_lokasi_hist)]
+            if pilih_kategori_hist:
+                df_hist_tampil = df_hist_tampil[df_hist_tampil['kategori'].isin(pilih_kategori_hist)]
+            if pilih_aksi:
+                df_hist_tampil = df_hist_tampil[df_hist_tampil['jenis_aksi'].isin(pilih_aksi)]
+            if keyword_hist:
+                df_hist_tampil = df_hist_tampil[df_hist_tampil['nama_mesin'].str.contains(keyword_hist, case=False, na=False)]
 
-        col_kiri, col_kanan = st.columns([4, 1])
-        with col_kiri:
-            st.info(f"Menampilkan {len(df_hist_tampil)} catatan sejarah.")
-        with col_kanan:
-            excel_hist = convert_df_to_excel(df_hist_tampil)
-            st.download_button(
-                label="📥 Download Excel",
-                data=excel_hist,
-                file_name='data_history.xlsx',
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+            col_kiri, col_kanan = st.columns([4, 1])
+            with col_kiri:
+                st.info(f"Menampilkan {len(df_hist_tampil)} catatan sejarah.")
+            with col_kanan:
+                st.download_button(
+                    label="📥 Download Excel",
+                    data=lambda df=df_hist_tampil: convert_df_to_excel(df),
+                    file_name='data_history.xlsx',
+                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                )
             
-        st.dataframe(df_hist_tampil, use_container_width=True, hide_index=True)
+            st.dataframe(df_hist_tampil, use_container_width=True, hide_index=True)
+        else:
+            st.warning("Tidak ada data sejarah yang ditemukan.")
     else:
-        st.warning("Tidak ada data sejarah yang ditemukan.")
+        # --- MODE ALL TIME: PAGINASI KEYSET (created_at, id) ---
+        # Opsi filter & jumlah dihitung di SQL, tabel hanya memuat satu halaman
+        df_opt_lok = load_data("SELECT DISTINCT lokasi_asal FROM riwayat_log WHERE lokasi_asal IS NOT NULL ORDER BY lokasi_asal ASC")
+        df_opt_kat = load_data("SELECT DISTINCT kategori FROM riwayat_log WHERE kategori IS NOT NULL ORDER BY kategori ASC")
+        df_opt_aksi = load_data("SELECT DISTINCT jenis_aksi FROM riwayat_log WHERE jenis_aksi IS NOT NULL ORDER BY jenis_aksi ASC")
+
+        pilih_lokasi_hist = st.sidebar.multiselect("Pilih Lokasi Asal:", df_opt_lok['lokasi_asal'].tolist() if not df_opt_lok.empty else [])
+        pilih_kategori_hist = st.sidebar.multiselect("Pilih Kategori:", df_opt_kat['kategori'].tolist() if not df_opt_kat.empty else [])
+        pilih_aksi = st.sidebar.multiselect("Jenis Aksi:", df_opt_aksi['jenis_aksi'].tolist() if not df_opt_aksi.empty else [])
+
+        keyword_hist = st.text_input("🔍 Cari History (Nama Mesin):", "")
+
+        # Susun WHERE dari filter
+        kondisi, nilai = [], []
+        for kolom, pilihan in (("lokasi_asal", pilih_lokasi_hist), ("kategori", pilih_kategori_hist), ("jenis_aksi", pilih_aksi)):
+            if pilihan:
+                kondisi.append(f"{kolom} IN ({', '.join(['%s'] * len(pilihan))})")
+                nilai.extend(pilihan)
+        if keyword_hist:
+            kondisi.append("nama_mesin LIKE %s")
+            nilai.append(f"%{keyword_hist}%")
+        where_sql = " AND ".join(kondisi) if kondisi else "1=1"
+
+        # Reset halaman jika filter berubah
+        tanda_filter = (tuple(pilih_lokasi_hist), tuple(pilih_kategori_hist), tuple(pilih_aksi), keyword_hist)
+        if st.session_state.get('log_tanda_filter') != tanda_filter:
+            st.session_state['log_tanda_filter'] = tanda_filter
+            st.session_state['log_kursor'] = [None]
+            st.session_state.pop('log_excel_semua', None)
+
+        # Jumlah per jenis aksi langsung dari SQL
+        df_rekap = load_data(
+            f"SELECT jenis_aksi, COUNT(*) AS jumlah FROM riwayat_log WHERE {where_sql} GROUP BY jenis_aksi ORDER BY jumlah DESC",
+            tuple(nilai)
+        )
+        total_log = int(df_rekap['jumlah'].sum()) if not df_rekap.empty else 0
+
+        if total_log > 0:
+            tumpukan_kursor = st.session_state['log_kursor']
+            kursor = tumpukan_kursor[-1]
+
+            kondisi_hal, nilai_hal = list(kondisi), list(nilai)
+            if kursor is not None:
+                kondisi_hal.append("(created_at < %s OR (created_at = %s AND id < %s))")
+                nilai_hal.extend([kursor[0], kursor[0], kursor[1]])
+            where_hal = " AND ".join(kondisi_hal) if kondisi_hal else "1=1"
+
+            # Ambil 1 baris lebih untuk tahu apakah masih ada halaman berikutnya
+            query_hal = f"SELECT * FROM riwayat_log WHERE {where_hal} ORDER BY created_at DESC, id DESC LIMIT {UKURAN_HALAMAN_LOG + 1}"
+            df_hal = load_halaman(query_hal, tuple(nilai_hal))
+            ada_berikutnya = len(df_hal) > UKURAN_HALAMAN_LOG
+            df_hal = df_hal.head(UKURAN_HALAMAN_LOG)
+
+            col_kiri, col_kanan = st.columns([4, 1])
+            with col_kiri:
+                st.info(f"Total {total_log} catatan sejarah. Halaman {len(tumpukan_kursor)} ({len(df_hal)} baris).")
+                st.caption(" | ".join(f"{r['jenis_aksi']}: {r['jumlah']}" for _, r in df_rekap.iterrows()))
+            with col_kanan:
+                # Export penuh hanya jika diminta
+                if 'log_excel_semua' not in st.session_state:
+                    if st.button("📦 Siapkan Excel"):
+                        with st.spinner("Menyusun file Excel..."):
+                            st.session_state['log_excel_semua'] = convert_query_to_excel(
+                                f"SELECT * FROM riwayat_log WHERE {where_sql} ORDER BY created_at DESC, id DESC",
+                                tuple(nilai)
+                            )
+                        st.rerun()
+                else:
+                    st.download_button(
+                        label="📥 Download Excel",
+                        data=st.session_state['log_excel_semua'],
+                        file_name='data_history.xlsx',
+                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    )
+
+            st.dataframe(df_hal, use_container_width=True, hide_index=True)
+
+            c_prev, c_next = st.columns([1, 1])
+            if c_prev.button("⬅️ Sebelumnya", disabled=len(tumpukan_kursor) == 1):
+                tumpukan_kursor.pop()
+                st.rerun()
+            if c_next.button("Berikutnya ➡️", disabled=not ada_berikutnya):
+                terakhir = df_hal.iloc[-1]
+                tumpukan_kursor.append((pd.Timestamp(terakhir['created_at']).to_pydatetime(), int(terakhir['id'])))
+                st.rerun()
+        else:
+            st.warning("Tidak ada data sejarah yang ditemukan.")
 
 # ==========================================
 # HALAMAN 3: KELOLA ASET (ADMIN)
 # ==========================================
 elif menu == "⚡ Kelola Aset (Admin)":
     st.title("⚡ Menu Admin: Kelola Data Mesin")
+
+    # --- STATISTIK CACHE QUERY ---
+    with st.expander("📈 Statistik Cache Query"):
+        stat_cache = get_query_cache().statistik()
+        s1, s2, s3, s4 = st.columns(4)
+        s1.metric("Hit", stat_cache['hit'])
+        s2.metric("Miss", stat_cache['miss'])
+        s3.metric("Rasio Hit", f"{stat_cache['rasio_hit']:.0%}")
+        s4.metric("Entri Tersimpan", stat_cache['entri'])
+        st.caption(f"TTL {CACHE_TTL_DETIK} detik, maks {CACHE_MAKS_ENTRI} entri. {stat_cache['dibuang']} entri dibuang karena ada perubahan data.")
+        if st.button("🧹 Kosongkan Cache"):
+            get_query_cache().kosongkan()
+            st.rerun()
     
     tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
         "➕ Input Baru", 
@@ -287,7 +732,22 @@ elif menu == "⚡ Kelola Aset (Admin)":
                     INSERT INTO master_aset (lokasi_toko, kategori, nama_mesin, harga_beli, no_registrasi, status)
                     VALUES (%s, %s, %s, %s, %s, 'Aktif')
                     """
-                    sukses, info = run_query(query, (final_lokasi, final_kategori, input_nama.upper(), input_harga, input_noreg))
+                    q_log_input = """
+                    INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, harga_beli, no_registrasi, no_reg_system, keterangan)
+                    VALUES (%s, %s, %s, 'Input Baru', CURDATE(), %s, %s, @aset_id, 'Penambahan aset baru')
+                    """
+                    # Jurnal Input Baru tanpa before-image: undo = hapus aset
+                    q_jurnal_input = """
+                    INSERT INTO jurnal_aset (log_id, aset_id, jenis_aksi, before_image)
+                    VALUES (@log_id, @aset_id, 'Input Baru', NULL)
+                    """
+                    sukses, info = run_transaction([
+                        (query, (final_lokasi, final_kategori, input_nama.upper(), input_harga, input_noreg)),
+                        ("SET @aset_id = LAST_INSERT_ID()", None),
+                        (q_log_input, (final_lokasi, final_kategori, input_nama.upper(), input_harga, input_noreg)),
+                        (SQL_SIMPAN_LOG_ID, None),
+                        (q_jurnal_input, None),
+                    ])
                     if sukses:
                         st.success(f"✅ Berhasil! {input_nama} ditambahkan ke {final_lokasi}.")
                         time.sleep(1)
@@ -313,7 +773,7 @@ elif menu == "⚡ Kelola Aset (Admin)":
         id_edit = st.text_input("Masukkan ID Aset untuk Edit:", placeholder="Contoh: 154")
         
         if id_edit:
-            df_curr = load_data(f"SELECT * FROM master_aset WHERE id = '{id_edit}'")
+            df_curr = load_data("SELECT * FROM master_aset WHERE id = %s", (id_edit,))
             
             if not df_curr.empty:
                 curr_row = df_curr.iloc[0]
@@ -343,14 +803,17 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         SET kategori=%s, nama_mesin=%s, harga_beli=%s, no_registrasi=%s 
                         WHERE id=%s
                         """
-                        sukses_upd, msg = run_query(q_update_detail, (new_kat, new_nama.upper(), new_harga, new_noreg, id_edit))
+                        q_log_edit = """
+                        INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, no_reg_system, keterangan)
+                        VALUES (%s, %s, %s, 'Koreksi Data', CURDATE(), %s, 'Update Detail Mesin (Admin)')
+                        """
+                        sukses_upd, msg = run_transaction([
+                            (q_log_edit, (curr_row['lokasi_toko'], new_kat, new_nama.upper(), id_edit)),
+                            *perintah_jurnal('Koreksi Data', id_edit),
+                            (q_update_detail, (new_kat, new_nama.upper(), new_harga, new_noreg, id_edit)),
+                        ])
                         
                         if sukses_upd:
-                            q_log_edit = """
-                            INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, keterangan)
-                            VALUES (%s, %s, %s, 'Koreksi Data', CURDATE(), 'Update Detail Mesin (Admin)')
-                            """
-                            run_query(q_log_edit, (curr_row['lokasi_toko'], new_kat, new_nama.upper()))
                             st.success("✅ Data berhasil diperbarui!")
                             time.sleep(2)
                             st.rerun()
@@ -366,7 +829,7 @@ elif menu == "⚡ Kelola Aset (Admin)":
         aset_ditemukan = None
         
         if id_cari_mut:
-            df_cek = load_data(f"SELECT * FROM master_aset WHERE id = '{id_cari_mut}'")
+            df_cek = load_data("SELECT * FROM master_aset WHERE id = %s", (id_cari_mut,))
             if not df_cek.empty:
                 aset_ditemukan = df_cek.iloc[0]
                 st.write(f"**Ditemukan:** :blue[{aset_ditemukan['nama_mesin']}] di :red[{aset_ditemukan['lokasi_toko']}]")
@@ -387,18 +850,23 @@ elif menu == "⚡ Kelola Aset (Admin)":
                         st.warning("⚠️ Lokasi baru sama dengan lokasi lama!")
                     else:
                         q_update = "UPDATE master_aset SET lokasi_toko = %s WHERE id = %s"
-                        sukses_up, _ = run_query(q_update, (lokasi_baru, id_cari_mut))
+                        q_hist = """
+                        INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, no_reg_system, keterangan)
+                        VALUES (%s, %s, %s, 'Mutasi', CURDATE(), %s, %s)
+                        """
+                        ket_lengkap = f"Pindah dari {aset_ditemukan['lokasi_toko']} ke {lokasi_baru}. {keterangan_mutasi}"
+                        sukses_up, msg = run_transaction([
+                            (q_hist, (aset_ditemukan['lokasi_toko'], aset_ditemukan['kategori'], aset_ditemukan['nama_mesin'], id_cari_mut, ket_lengkap)),
+                            *perintah_jurnal('Mutasi', id_cari_mut),
+                            (q_update, (lokasi_baru, id_cari_mut)),
+                        ])
                         
                         if sukses_up:
-                            q_hist = """
-                            INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, keterangan)
-                            VALUES (%s, %s, %s, 'Mutasi', CURDATE(), %s)
-                            """
-                            ket_lengkap = f"Pindah dari {aset_ditemukan['lokasi_toko']} ke {lokasi_baru}. {keterangan_mutasi}"
-                            run_query(q_hist, (aset_ditemukan['lokasi_toko'], aset_ditemukan['kategori'], aset_ditemukan['nama_mesin'], ket_lengkap))
                             st.success(f"✅ Sukses! {aset_ditemukan['nama_mesin']} dipindah ke {lokasi_baru}")
                             time.sleep(2)
                             st.rerun()
+                        else:
+                            st.error(f"Gagal Mutasi: {msg}")
 
     # --- TAB 4: LIKUIDASI ---
     with tab4:
@@ -407,7 +875,7 @@ elif menu == "⚡ Kelola Aset (Admin)":
         aset_hapus = None
         
         if id_likuidasi:
-            df_cek_hapus = load_data(f"SELECT * FROM master_aset WHERE id = '{id_likuidasi}'")
+            df_cek_hapus = load_data("SELECT * FROM master_aset WHERE id = %s", (id_likuidasi,))
             if not df_cek_hapus.empty:
                 aset_hapus = df_cek_hapus.iloc[0]
                 st.write(f"**Akan dihapus:** :blue[{aset_hapus['nama_mesin']}] - {aset_hapus['lokasi_toko']}")
@@ -425,87 +893,137 @@ elif menu == "⚡ Kelola Aset (Admin)":
                     n_reg = aset_hapus['no_registrasi'] if aset_hapus['no_registrasi'] else ""
 
                     q_hist_del = """
-                    INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, harga_beli, no_registrasi, keterangan)
-                    VALUES (%s, %s, %s, %s, CURDATE(), %s, %s, %s)
+                    INSERT INTO riwayat_log (lokasi_asal, kategori, nama_mesin, jenis_aksi, tanggal_kejadian, harga_beli, no_registrasi, no_reg_system, keterangan)
+                    VALUES (%s, %s, %s, %s, CURDATE(), %s, %s, %s, %s)
                     """
-                    run_query(q_hist_del, (aset_hapus['lokasi_toko'], aset_hapus['kategori'], aset_hapus['nama_mesin'], alasan.upper(), h_beli, n_reg, ket_hapus))
-                    
                     q_del = "DELETE FROM master_aset WHERE id = %s"
-                    sukses_del, _ = run_query(q_del, (id_likuidasi,))
+                    sukses_del, msg = run_transaction([
+                        (q_hist_del, (aset_hapus['lokasi_toko'], aset_hapus['kategori'], aset_hapus['nama_mesin'], alasan.upper(), h_beli, n_reg, id_likuidasi, ket_hapus)),
+                        *perintah_jurnal(alasan.upper(), id_likuidasi),
+                        (q_del, (id_likuidasi,)),
+                    ])
                     if sukses_del:
                         st.success(f"✅ Data berhasil dilikuidasi.")
                         time.sleep(2)
                         st.rerun()
+                    else:
+                        st.error(f"Gagal Likuidasi: {msg}")
 
     # --- TAB 5: JEJAK ASET ---
     with tab5:
         st.subheader("🕵️ Jejak Pergerakan Data")
-        cari_jejak = st.text_input("Masukkan Nama Mesin (Jejak):", placeholder="Contoh: PUMP IT UP")
+        cari_jejak = st.text_input("Masukkan Nama Mesin / No Registrasi / ID System (Jejak):", placeholder="Contoh: PUMP IT UP")
         
         if cari_jejak:
-            query_trace = "SELECT * FROM riwayat_log WHERE nama_mesin LIKE %s ORDER BY created_at DESC"
-            df_trace = load_data(query_trace, (f"%{cari_jejak}%",))
+            # Reset ke halaman pertama setiap kata kunci berubah
+            if st.session_state.get('jejak_keyword') != cari_jejak:
+                st.session_state['jejak_keyword'] = cari_jejak
+                st.session_state['jejak_hal'] = 0
+            hal_jejak = st.session_state['jejak_hal']
+
+            kueri_ft = susun_kueri_fulltext(cari_jejak)
+            id_aset_jejak = id_jejak(cari_jejak)
+            if id_aset_jejak is not None:
+                # ID System / No Registrasi persis -> seluruh jejak satu aset lewat idx_log_aset, urut waktu
+                df_total = load_data("SELECT COUNT(*) AS total FROM riwayat_log WHERE no_reg_system = %s", (id_aset_jejak,))
+                query_trace = f"""
+                SELECT * FROM riwayat_log WHERE no_reg_system = %s
+                ORDER BY created_at ASC, id ASC
+                LIMIT {UKURAN_HALAMAN_JEJAK} OFFSET {hal_jejak * UKURAN_HALAMAN_JEJAK}
+                """
+                df_trace = load_halaman(query_trace, (id_aset_jejak,))
+            elif 'ft_log_aset' in siapkan_skema() and kueri_ft:
+                # Pencarian lewat FULLTEXT (ngram), diurutkan berdasarkan skor relevansi
+                df_total = load_data(f"SELECT COUNT(*) AS total FROM riwayat_log WHERE {KOLOM_FULLTEXT_LOG}", (kueri_ft,))
+                query_trace = f"""
+                SELECT *, MATCH(nama_mesin, no_registrasi, no_reg_system) AGAINST (%s IN BOOLEAN MODE) AS skor
+                FROM riwayat_log WHERE {KOLOM_FULLTEXT_LOG}
+                ORDER BY skor DESC, created_at DESC, id DESC
+                LIMIT {UKURAN_HALAMAN_JEJAK} OFFSET {hal_jejak * UKURAN_HALAMAN_JEJAK}
+                """
+                df_trace = load_halaman(query_trace, (kueri_ft, kueri_ft))
+            else:
+                # Cadangan jika index FULLTEXT tidak tersedia
+                df_total = load_data("SELECT COUNT(*) AS total FROM riwayat_log WHERE nama_mesin LIKE %s", (f"%{cari_jejak}%",))
+                query_trace = f"""
+                SELECT * FROM riwayat_log WHERE nama_mesin LIKE %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT {UKURAN_HALAMAN_JEJAK} OFFSET {hal_jejak * UKURAN_HALAMAN_JEJAK}
+                """
+                df_trace = load_halaman(query_trace, (f"%{cari_jejak}%",))
+            total_jejak = int(df_total['total'].iloc[0]) if not df_total.empty else 0
             
             if not df_trace.empty:
-                st.write(f"Ditemukan **{len(df_trace)}** catatan untuk: *{cari_jejak}*")
+                jumlah_hal = -(-total_jejak // UKURAN_HALAMAN_JEJAK)
+                if id_aset_jejak is not None:
+                    st.write(f"Jejak lengkap ID System `{id_aset_jejak}`: **{total_jejak}** catatan, urut waktu (halaman {hal_jejak + 1} dari {jumlah_hal})")
+                else:
+                    st.write(f"Ditemukan **{total_jejak}** catatan untuk: *{cari_jejak}* (halaman {hal_jejak + 1} dari {jumlah_hal})")
                 for index, row in df_trace.iterrows():
                     role = "user" if row['jenis_aksi'] == "Mutasi" else "assistant"
                     with st.chat_message(role):
-                        st.markdown(f"**{row['tanggal_kejadian']}** - **{row['jenis_aksi']}**")
+                        st.markdown(f"**{row['tanggal_kejadian']}** - **{row['jenis_aksi']}** - {row['nama_mesin']}")
                         st.markdown(f"📍 Lokasi: `{row['lokasi_asal']}` | Kat: `{row['kategori']}`")
                         st.markdown(f"📝 *{row['keterangan']}*")
+
+                c_prev, c_next = st.columns([1, 1])
+                if c_prev.button("⬅️ Sebelumnya", key="jejak_prev", disabled=hal_jejak == 0):
+                    st.session_state['jejak_hal'] -= 1
+                    st.rerun()
+                if c_next.button("Berikutnya ➡️", key="jejak_next", disabled=hal_jejak + 1 >= jumlah_hal):
+                    st.session_state['jejak_hal'] += 1
+                    st.rerun()
             else:
                 st.warning("Belum ada riwayat.")
 
     # --- TAB 6: UNDO KESALAHAN ---
     with tab6:
-        st.subheader("↩️ Undo Kesalahan Terakhir")
-        st.warning("⚠️ Fitur ini membatalkan aksi terakhir.")
-        
-        df_last = load_data("SELECT * FROM riwayat_log ORDER BY created_at DESC LIMIT 5")
-        
-        if not df_last.empty:
-            st.write("##### 5 Aktivitas Terakhir:")
-            for i, row in df_last.iterrows():
-                label_expander = f"{row['jenis_aksi']} - {row['nama_mesin']} ({row['tanggal_kejadian']})"
+        st.subheader("↩️ Undo Kesalahan")
+        st.warning("⚠️ Undo mengembalikan aset persis ke kondisi sebelum aksi. Aksi yang lebih baru pada aset yang sama harus dibatalkan lebih dulu.")
+
+        cari_log_undo = st.text_input("Cari ID Log (Kosong = Tampilkan dari yang terbaru):", placeholder="Contoh: 1024")
+
+        ada_berikutnya_undo = False
+        if cari_log_undo:
+            df_jurnal = load_data(f"{SQL_DAFTAR_JURNAL} WHERE j.log_id = %s", (cari_log_undo,))
+        else:
+            # Paginasi keyset di atas primary key jurnal -> seluruh riwayat bisa dijangkau
+            if 'undo_kursor' not in st.session_state:
+                st.session_state['undo_kursor'] = [None]
+            kursor_undo = st.session_state['undo_kursor'][-1]
+            if kursor_undo is None:
+                df_jurnal = load_data(f"{SQL_DAFTAR_JURNAL} ORDER BY j.id DESC LIMIT {UKURAN_HALAMAN_UNDO + 1}")
+            else:
+                df_jurnal = load_data(f"{SQL_DAFTAR_JURNAL} WHERE j.id < %s ORDER BY j.id DESC LIMIT {UKURAN_HALAMAN_UNDO + 1}", (kursor_undo,))
+            ada_berikutnya_undo = len(df_jurnal) > UKURAN_HALAMAN_UNDO
+            df_jurnal = df_jurnal.head(UKURAN_HALAMAN_UNDO)
+
+        if not df_jurnal.empty:
+            for i, row in df_jurnal.iterrows():
+                label_expander = f"[Log {row['log_id']}] {row['jenis_aksi']} - {row['nama_mesin']} ({row['tanggal_kejadian']})"
                 with st.expander(label_expander):
                     st.write(f"**Keterangan:** {row['keterangan']}")
-                    col_undo, col_info = st.columns([1, 3])
-                    
-                    if row['jenis_aksi'] == 'Mutasi':
-                        if col_undo.button("↩️ BATALKAN MUTASI", key=f"undo_{row['id']}"):
-                            q_cek = f"SELECT * FROM master_aset WHERE nama_mesin = '{row['nama_mesin']}'"
-                            df_cek_m = load_data(q_cek)
-                            if not df_cek_m.empty:
-                                q_restore = "UPDATE master_aset SET lokasi_toko = %s WHERE nama_mesin = %s"
-                                sukses_undo, msg = run_query(q_restore, (row['lokasi_asal'], row['nama_mesin']))
-                                if sukses_undo:
-                                    run_query("DELETE FROM riwayat_log WHERE id = %s", (row['id'],))
-                                    st.success(f"✅ Mutasi dibatalkan!")
-                                    time.sleep(2)
-                                    st.rerun()
-                                else:
-                                    st.error(f"Gagal restore: {msg}")
-                            else:
-                                st.error("❌ Gagal Undo: Mesin tidak ditemukan di Master.")
-
-                    elif row['jenis_aksi'] in ['LIKUIDASI', 'MUSNAH', 'TERJUAL', 'HILANG']:
-                        if col_undo.button("♻️ RESTORE DATA", key=f"restore_{row['id']}"):
-                            q_restore_ins = """
-                            INSERT INTO master_aset (lokasi_toko, kategori, nama_mesin, harga_beli, no_registrasi, status)
-                            VALUES (%s, %s, %s, %s, %s, 'Aktif')
-                            """
-                            val_h = row.get('harga_beli') if row.get('harga_beli') else None
-                            val_n = row.get('no_registrasi') if row.get('no_registrasi') else None
-
-                            sukses_rest, msg = run_query(q_restore_ins, (row['lokasi_asal'], row['kategori'], row['nama_mesin'], val_h, val_n))
-                            if sukses_rest:
-                                run_query("DELETE FROM riwayat_log WHERE id = %s", (row['id'],))
-                                st.success(f"✅ Data dikembalikan ke Master!")
-                                time.sleep(2)
-                                st.rerun()
+                    st.write(f"**ID Aset:** `{row['aset_id']}` | **Lokasi di Log:** {row['lokasi_asal']}")
+                    if st.button("↩️ BATALKAN AKSI INI", key=f"undo_{row['jurnal_id']}"):
+                        sukses_undo, msg = undo_dari_jurnal(row['jurnal_id'])
+                        if sukses_undo:
+                            st.success(f"✅ {row['jenis_aksi']} dibatalkan!")
+                            time.sleep(2)
+                            st.rerun()
+                        else:
+                            st.error(f"Gagal Undo: {msg}")
+
+            if not cari_log_undo:
+                c_prev, c_next = st.columns([1, 1])
+                if c_prev.button("⬅️ Lebih Baru", key="undo_prev", disabled=len(st.session_state['undo_kursor']) == 1):
+                    st.session_state['undo_kursor'].pop()
+                    st.rerun()
+                if c_next.button("Lebih Lama ➡️", key="undo_next", disabled=not ada_berikutnya_undo):
+                    st.session_state['undo_kursor'].append(int(df_jurnal['jurnal_id'].iloc[-1]))
+                    st.rerun()
         else:
-            st.info("Belum ada aktivitas.")
+            st.info("Belum ada aktivitas yang bisa dibatalkan.")
+        st.caption("Log yang tercatat sebelum fitur jurnal aktif tidak memiliki before-image dan tidak bisa di-undo otomatis.")
 
 # ==========================================
 # HALAMAN 4: USER GUIDE
@@ -525,4 +1043,7 @@ elif menu == "📘 Panduan Pengguna":
         st.markdown("""
         1. **Master Aset:** Pilih lokasi/kategori di Sidebar.
         2. **Riwayat Log:** Centang kotak 'Tampilkan Semua Tanggal' untuk melihat seluruh data.
-        """)
\ No newline at end of file
+        """)
+
+profil.tanda(f"Halaman: {menu}")
+profil.laporan()
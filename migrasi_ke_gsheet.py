@@ -34,7 +34,7 @@ def upload_data(sh, excel_file, tab_name):
         df = pd.read_excel(excel_file)
     except FileNotFoundError:
         print(f"⚠️ File Excel {excel_file} tidak ditemukan. Melewati langkah ini.")
-        return
+        return None
 
     # --- PERBAIKAN: TAMBAH KOLOM ID OTOMATIS ---
     # Cek apakah kolom 'id' sudah ada. Jika belum, buat baru.
@@ -50,6 +50,10 @@ def upload_data(sh, excel_file, tab_name):
     df = df.fillna('')
     df = df.astype(str)
     
+    tulis_tab(sh, tab_name, df)
+    return df
+
+def tulis_tab(sh, tab_name, df):
     # Akses Tab GSheet
     try:
         worksheet = sh.worksheet(tab_name)
@@ -68,9 +72,71 @@ def upload_data(sh, excel_file, tab_name):
     
     print(f"✅ Sukses! Data {tab_name} berhasil dimigrasi.")
 
+def upload_log(sh, excel_file):
+    """Upload riwayat log dipecah per tahun (riwayat_log_YYYY) + tulis manifest di _meta."""
+    print(f"\n📂 Memproses file: {excel_file} ...")
+
+    try:
+        df = pd.read_excel(excel_file)
+    except FileNotFoundError:
+        print(f"⚠️ File Excel {excel_file} tidak ditemukan. Melewati langkah ini.")
+        return None, {}
+
+    df.columns = df.columns.str.lower()
+    if 'id' not in df.columns:
+        print("⚙️ Membuat kolom ID otomatis untuk riwayat_log...")
+        df.insert(0, 'id', range(1, 1 + len(df)))
+
+    tgl = pd.to_datetime(df['tanggal'], errors='coerce') if 'tanggal' in df.columns else pd.Series(pd.NaT, index=df.index)
+    df = df.fillna('').astype(str)
+
+    manifest = {}
+    for tahun in sorted(tgl.dt.year.dropna().astype(int).unique()):
+        mask = tgl.dt.year == tahun
+        tab = f"riwayat_log_{tahun}"
+        tulis_tab(sh, tab, df[mask])
+        manifest[tab] = f"{tgl[mask].min():%Y-%m-%d}|{tgl[mask].max():%Y-%m-%d}"
+
+    # Baris tanpa tanggal valid tetap di tab riwayat_log lama; jika tidak ada, tab lama dihapus
+    tanpa_tgl = df[tgl.isna()]
+    if len(tanpa_tgl):
+        print(f"⚠️ {len(tanpa_tgl)} baris tanpa tanggal valid disimpan di tab 'riwayat_log'.")
+        tulis_tab(sh, 'riwayat_log', tanpa_tgl)
+        manifest['riwayat_log'] = ""
+    else:
+        try:
+            sh.del_worksheet(sh.worksheet('riwayat_log'))
+            print("🧹 Tab 'riwayat_log' lama dihapus (sudah dipecah per tahun).")
+        except gspread.WorksheetNotFound:
+            pass
+    return df, manifest
+
+def tulis_meta(sh, df_master, df_log, manifest):
+    # _meta ditulis ulang: ID terakhir per sheet + daftar partisi riwayat log
+    def id_maks(df):
+        if df is None or df.empty:
+            return 0
+        return int(pd.to_numeric(df['id'], errors='coerce').max() or 0)
+
+    isi = [["kunci", "nilai"]]
+    if df_master is not None:
+        isi.append(["id_terakhir:master_aset", str(id_maks(df_master))])
+    if df_log is not None:
+        isi.append(["id_terakhir:riwayat_log", str(id_maks(df_log))])
+    isi += [[f"partisi:{tab}", rentang] for tab, rentang in manifest.items()]
+
+    try:
+        ws = sh.worksheet('_meta')
+    except gspread.WorksheetNotFound:
+        ws = sh.add_worksheet(title='_meta', rows=100, cols=2)
+    ws.clear()
+    ws.update(isi)
+    print("✅ Tab _meta diperbarui.")
+
 # --- EKSEKUSI UTAMA ---
 if __name__ == "__main__":
     sh = connect_gsheet()
-    upload_data(sh, FILE_MASTER_EXCEL, 'master_aset')
-    upload_data(sh, FILE_LOG_EXCEL, 'riwayat_log')
+    df_master = upload_data(sh, FILE_MASTER_EXCEL, 'master_aset')
+    df_log, manifest = upload_log(sh, FILE_LOG_EXCEL)
+    tulis_meta(sh, df_master, df_log, manifest)
     print("\n🎉 SELESAI! Kolom ID sudah dibuat dan data terupload.")
\ No newline at end of file
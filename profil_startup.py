@@ -0,0 +1,81 @@
+"""Profil waktu startup aplikasi Streamlit (aktif jika env PROFIL_STARTUP=1).
+
+Dipakai oleh app_gsheet.py dan app_sql.py:
+
+    profil = profil_startup.mulai()      # paling awal, sebelum import modul berat
+    profil.tanda("Login")                # akhir setiap bagian script
+    profil.laporan()                     # tampilkan di sidebar + log terminal
+
+Waktu import dicatat per modul level-atas yang benar-benar dimuat (modul yang sudah
+ada di sys.modules tidak dihitung), jadi rerun berikutnya hanya menampilkan waktu per bagian.
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+
+AKTIF = os.getenv("PROFIL_STARTUP") == "1"
+WAKTU_PROSES = time.perf_counter()  # Modul ini di-import sekali per proses
+
+_import_asli = builtins.__import__
+# Profil aktif & kedalaman import per thread: tiap sesi Streamlit menjalankan script di thread sendiri
+_lokal = threading.local()
+
+
+def _import_terukur(name, globals=None, locals=None, fromlist=(), level=0):
+    # Hanya import terluar yang diukur (waktunya sudah termasuk import di dalamnya)
+    profil = getattr(_lokal, "profil", None)
+    if profil is None or getattr(_lokal, "kedalaman", 0) or level or name in sys.modules:
+        return _import_asli(name, globals, locals, fromlist, level)
+    _lokal.kedalaman = 1
+    awal = time.perf_counter()
+    try:
+        return _import_asli(name, globals, locals, fromlist, level)
+    finally:
+        _lokal.kedalaman = 0
+        profil.impor[name] = profil.impor.get(name, 0) + time.perf_counter() - awal
+
+
+class ProfilStartup:
+    def __init__(self, aktif):
+        self.aktif = aktif
+        self.awal = time.perf_counter()
+        self._tanda_terakhir = self.awal
+        self.bagian = []   # [(nama bagian, detik)]
+        self.impor = {}    # {modul: detik}
+
+    def tanda(self, nama):
+        """Tutup bagian script yang sedang berjalan (waktu sejak tanda sebelumnya)."""
+        if not self.aktif:
+            return
+        sekarang = time.perf_counter()
+        self.bagian.append((nama, sekarang - self._tanda_terakhir))
+        self._tanda_terakhir = sekarang
+
+    def laporan(self, judul="⏱️ Profil Startup"):
+        if not self.aktif:
+            return
+        import streamlit as st
+
+        total = time.perf_counter() - self.awal
+        baris = [f"Total script : {total * 1000:8.1f} ms",
+                 f"Sejak proses : {(time.perf_counter() - WAKTU_PROSES) * 1000:8.1f} ms", "", "Per bagian:"]
+        baris += [f"  {nama:<28}{detik * 1000:8.1f} ms" for nama, detik in self.bagian]
+        if self.impor:
+            baris += ["", "Import modul:"]
+            baris += [f"  {nama:<28}{detik * 1000:8.1f} ms"
+                      for nama, detik in sorted(self.impor.items(), key=lambda x: -x[1])]
+        teks = "\n".join(baris)
+        print(f"[profil] {judul}\n{teks}", file=sys.stderr)
+        with st.sidebar.expander(judul):
+            st.code(teks, language=None)
+
+
+def mulai():
+    """Profil baru untuk satu eksekusi script. Tidak melakukan apa-apa jika PROFIL_STARTUP tidak aktif."""
+    profil = ProfilStartup(AKTIF)
+    if AKTIF:
+        _lokal.profil = profil
+        builtins.__import__ = _import_terukur
+    return profil